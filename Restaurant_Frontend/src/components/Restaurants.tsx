@@ -25,26 +25,15 @@ const Restaurants = () => {
 
     useEffect(() => {
         console.log("Fetching restaurant data...");
-        // The file is fetched from the public folder
-        fetch("http://127.0.0.1:8000/restaurants")
+        // One request returns every restaurant together with its items
+        fetch("http://127.0.0.1:8000/menu")
             .then((response) => response.json())
-            .then((data) => {  
+            .then((data) => {
                 console.log("Restaurant data fetched:", data);
 
                 // The restaurant data is nested in the "rest_list" property
                 if (data && data.rest_list) {
-                    const restaurantPromises = data.rest_list.map((restaurant: Restaurant) => {
-                        return fetch(`http://127.0.0.1:8000/items/${restaurant.id}`)
-                            .then(response => response.json())
-                            .then(itemsData => {
-                                return { ...restaurant, items: itemsData.item_list };
-                            });
-                    });
-
-                    Promise.all(restaurantPromises)
-                        .then(restaurantsWithItems => {
-                            setRestaurants(restaurantsWithItems);
-                        });
+                    setRestaurants(data.rest_list);
                 }
             })
             .catch((error) => console.error("Error fetching restaurants:", error));
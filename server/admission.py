@@ -0,0 +1,234 @@
+"""Admission control: bounded concurrency and load shedding per route class.
+
+Requests to the routes main.py lists in ADMISSION_CLASSES are admitted
+into a limited number of in-flight slots: ORDER_WRITE_LIMIT for order
+writes, CATALOG_READ_LIMIT for catalog reads, and IN_FLIGHT_LIMIT for both
+together. A request that finds its class full waits in that class's FIFO
+queue. Whenever a slot frees up, queued order writes are let in before
+catalog reads, so browsing traffic cannot starve checkouts.
+
+A request gets a 503 with Retry-After, without its body being read, if
+the wait for a slot would exceed its class's queue budget: at once when
+the requests already queued ahead of it would take longer than that to
+get through (judged from the class's average service time), otherwise
+when the budget runs out while it waits. It is also shed at once if
+MAX_QUEUED requests are already waiting. Under overload, admitted requests
+keep a bounded latency and the rest fail fast, instead of every request
+slowing down until clients time out and retry.
+
+Other routes, including event streams and admin endpoints, are never
+queued. Limits are per worker process. Queue depth, slots in use, time
+spent queued and shed requests are reported on GET /metrics.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from starlette.routing import Match
+from metrics import Counter, Gauge, Histogram, registry
+
+ORDER_WRITES = "order_write"
+CATALOG_READS = "catalog_read"
+# Queued classes are admitted in this order when a slot frees up
+PRIORITY = (ORDER_WRITES, CATALOG_READS)
+
+ORDER_WRITE_LIMIT = int(os.environ.get("DELIVERY_ORDER_WRITE_LIMIT", "32"))
+CATALOG_READ_LIMIT = int(os.environ.get("DELIVERY_CATALOG_READ_LIMIT", "128"))
+IN_FLIGHT_LIMIT = int(os.environ.get("DELIVERY_IN_FLIGHT_LIMIT", "128"))
+# Longest a request may wait for a slot before it is shed
+ORDER_QUEUE_MS = float(os.environ.get("DELIVERY_ORDER_QUEUE_MS", "1000"))
+CATALOG_QUEUE_MS = float(os.environ.get("DELIVERY_CATALOG_QUEUE_MS", "250"))
+MAX_QUEUED = int(os.environ.get("DELIVERY_MAX_QUEUED", "1000"))
+RETRY_AFTER_SECONDS = int(os.environ.get("DELIVERY_RETRY_AFTER", "1"))
+
+queue_depth = registry.add(Gauge(
+    "delivery_admission_queue_depth", "Requests waiting for an admission slot", ("class",)
+))
+slots_in_use = registry.add(Gauge(
+    "delivery_admission_in_flight", "Admitted requests being served", ("class",)
+))
+queue_seconds = registry.add(Histogram(
+    "delivery_admission_queue_seconds", "Time queued before admission, for requests that had to wait", ("class",)
+))
+shed_total = registry.add(Counter(
+    "delivery_admission_shed_total", "Requests rejected with 503 by admission control", ("class", "reason")
+))
+
+
+class AdmissionController:
+    """In-flight slots and priority queues for the route classes, on one event loop"""
+
+    def __init__(self, limits=None, total: int = IN_FLIGHT_LIMIT, budgets=None, max_queued: int = MAX_QUEUED):
+        self.limits = limits or {ORDER_WRITES: ORDER_WRITE_LIMIT, CATALOG_READS: CATALOG_READ_LIMIT}
+        self.total = total
+        # Queue budgets in seconds
+        self.budgets = budgets or {ORDER_WRITES: ORDER_QUEUE_MS / 1000, CATALOG_READS: CATALOG_QUEUE_MS / 1000}
+        self.max_queued = max_queued
+        self.in_flight = dict.fromkeys(self.limits, 0)
+        self._in_flight_total = 0
+        self._waiters = {name: deque() for name in self.limits}
+        # Moving average of seconds each admitted request holds its slot
+        self._service = dict.fromkeys(self.limits, 0.0)
+
+    def depth(self, name: str) -> int:
+        return len(self._waiters[name])
+
+    async def acquire(self, name: str) -> bool:
+        """Take a slot for a request of class name; False if it has been shed"""
+        waiters = self._waiters[name]
+        if not waiters and self._has_room(name):
+            self._admit(name)
+            return True
+        if len(waiters) >= self.max_queued:
+            shed_total.inc(name, "queue_full")
+            return False
+        if self.expected_wait(name) > self.budgets[name]:
+            shed_total.inc(name, "over_budget")
+            return False
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        waiters.append(waiter)
+        self._report(name)
+        start = loop.time()
+        timer = loop.call_later(self.budgets[name], self._expire, name, waiter)
+        try:
+            admitted = await waiter
+        except asyncio.CancelledError:
+            # Client went away while queued, or just as it was admitted
+            if waiter.cancelled():
+                self._forget(name, waiter)
+            elif waiter.result():
+                self.release(name)
+            raise
+        finally:
+            timer.cancel()
+        if admitted:
+            queue_seconds.observe(loop.time() - start, name)
+        else:
+            shed_total.inc(name, "timeout")
+        return admitted
+
+    def expected_wait(self, name: str) -> float:
+        """Seconds a request queued now would likely wait for a slot"""
+        if not self.limits[name]:
+            return 0.0
+        return (len(self._waiters[name]) + 1) * self._service[name] / self.limits[name]
+
+    def release(self, name: str, seconds: float = None):
+        """Give back a slot; seconds is how long the request held it"""
+        if seconds is not None:
+            average = self._service[name]
+            self._service[name] = seconds if not average else 0.9 * average + 0.1 * seconds
+        self.in_flight[name] -= 1
+        self._in_flight_total -= 1
+        self._dispatch()
+        self._report(name)
+
+    def _has_room(self, name: str) -> bool:
+        return self._in_flight_total < self.total and self.in_flight[name] < self.limits[name]
+
+    def _admit(self, name: str):
+        self.in_flight[name] += 1
+        self._in_flight_total += 1
+        self._report(name)
+
+    def _dispatch(self):
+        for name in PRIORITY:
+            waiters = self._waiters[name]
+            while waiters and self._has_room(name):
+                waiter = waiters.popleft()
+                if waiter.done():
+                    continue
+                self._admit(name)
+                waiter.set_result(True)
+
+    def _expire(self, name: str, waiter):
+        if not waiter.done():
+            self._forget(name, waiter)
+            waiter.set_result(False)
+
+    def _forget(self, name: str, waiter):
+        try:
+            self._waiters[name].remove(waiter)
+        except ValueError:
+            pass
+        self._report(name)
+
+    def _report(self, name: str):
+        queue_depth.set(name, value=len(self._waiters[name]))
+        slots_in_use.set(name, value=self.in_flight[name])
+
+
+admission = AdmissionController()
+
+
+class AdmissionMiddleware:
+    """ASGI middleware holding requests to the classified routes to their class's slots"""
+
+    def __init__(self, app, classes, controller: AdmissionController = None):
+        self.app = app
+        # {class: [(method, path template)]}, resolved to routes on first use
+        self.classes = classes
+        self.controller = controller or admission
+        self._routes = None
+
+    def _resolve(self, router):
+        """({(method, path): (route, class)} for fixed paths, [(route, class)] for the rest)"""
+        wanted = {(method, path): name for name, routes in self.classes.items() for method, path in routes}
+        fixed, patterns = {}, []
+        for route in router.routes:
+            for method in getattr(route, "methods", None) or ():
+                name = wanted.get((method, getattr(route, "path", None)))
+                if name is None:
+                    continue
+                if getattr(route, "param_convertors", None):
+                    patterns.append((route, name))
+                else:
+                    fixed[method, route.path] = (route, name)
+        return fixed, patterns
+
+    def _classify(self, scope):
+        if self._routes is None:
+            self._routes = self._resolve(scope["app"].router)
+        fixed, patterns = self._routes
+        found = fixed.get((scope["method"], scope["path"]))
+        if found is not None:
+            return found
+        for route, name in patterns:
+            if route.matches(scope)[0] == Match.FULL:
+                return route, name
+        return None, None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route, name = self._classify(scope)
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+        if not await self.controller.acquire(name):
+            # Lets the metrics middleware label the 503 with the route
+            scope["route"] = route
+            await self._reject(send)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(name, time.perf_counter() - start)
+
+    @staticmethod
+    async def _reject(send):
+        body = json.dumps({"detail": "Server busy, retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(RETRY_AFTER_SECONDS).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
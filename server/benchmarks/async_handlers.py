@@ -0,0 +1,131 @@
+"""Compare the async order handlers with their blocking equivalents.
+
+Runs POST /orders and PUT /orders/{id}/status at high concurrency against
+the real app (async handlers) and against an app whose handlers are plain
+sync functions, which Starlette runs in its bounded threadpool. Both use
+scratch copies of the data files.
+
+--io-latency adds a fixed delay to every storage write to model a slow
+disk or network volume, which is where blocked threadpool slots hurt.
+
+    python benchmarks/async_handlers.py [--requests 2000] [--concurrency 500] [--io-latency 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+
+from catalog import catalog
+from main import app as async_app
+from order_store import order_store
+from orders import Order, OrderCreate, OrderStatusUpdate, create_order, update_order_status
+from sequences import sequences
+from storage import JsonStorage
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ORDER = {
+    "restaurant_id": 1,
+    "items": [{"item_id": 101, "quantity": 1}],
+    "customer_name": "Bench",
+    "customer_phone": "+1000000000",
+    "delivery_address": "1 Bench Street"
+}
+
+sync_app = FastAPI()
+
+
+@sync_app.post("/orders", response_model=Order)
+def sync_create_order(order: OrderCreate) -> Order:
+    return create_order(order)
+
+
+@sync_app.put("/orders/{order_id}/status", response_model=Order)
+def sync_update_status(order_id: int, status_update: OrderStatusUpdate) -> Order:
+    return update_order_status(order_id, status_update)
+
+
+class SlowJsonStorage(JsonStorage):
+    """JsonStorage whose writes each take at least latency seconds"""
+
+    def __init__(self, *args, latency=0.0):
+        super().__init__(*args)
+        self.latency = latency
+        self._catalog_writer.around_replace = self._slow_replace
+
+    def _slow_replace(self, replace):
+        time.sleep(self.latency)
+        self._record_own_write(replace)
+
+    def add_order(self, order):
+        time.sleep(self.latency)
+        super().add_order(order)
+
+    def update_order(self, order_id, changes, order):
+        time.sleep(self.latency)
+        super().update_order(order_id, changes, order)
+
+
+def fresh_storage(directory, latency):
+    """Point the stores at new scratch data with plenty of stock"""
+    with open(os.path.join(SERVER_DIR, "sample.json")) as file:
+        data = json.load(file)
+    for restaurant in data["rest_list"]:
+        for item in restaurant["items"]:
+            item["available_quantity"] = 10 ** 9
+    with open(os.path.join(directory, "sample.json"), "w") as file:
+        json.dump(data, file)
+    shutil.copy(os.path.join(SERVER_DIR, "orders.json"), directory)
+    storage = SlowJsonStorage(
+        os.path.join(directory, "sample.json"),
+        os.path.join(directory, "orders.json"),
+        os.path.join(directory, "orders.journal"),
+        latency=latency
+    )
+    catalog.reload(storage)
+    order_store.reset(storage)
+    sequences.reset(os.path.join(directory, "sequences.json"))
+
+
+async def drive(app, requests: int, concurrency: int):
+    """Return requests/second for a create + status update per order"""
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                response = await client.post("/orders", json=ORDER)
+                order_id = response.json()["id"]
+                await client.put(f"/orders/{order_id}/status", json={"status": "confirmed"})
+        
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+    return 2 * requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--io-latency", type=float, default=5.0, help="milliseconds per storage write")
+    args = parser.parse_args()
+    
+    for label, app in (("sync handlers", sync_app), ("async handlers", async_app)):
+        with tempfile.TemporaryDirectory() as directory:
+            fresh_storage(directory, args.io_latency / 1000)
+            rate = asyncio.run(drive(app, args.requests, args.concurrency))
+        print(f"{label:>15}: {rate:8.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
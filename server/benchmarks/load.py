@@ -0,0 +1,490 @@
+"""Load test for the API hot paths, with a saved baseline to compare against.
+
+Generates a synthetic catalog of --restaurants restaurants with --items
+items each and an order history of --orders orders, then drives
+
+    restaurants     GET /restaurants
+    items           GET /items/{restaurant_id}        (random restaurant)
+    create_order    POST /orders                      (random restaurant)
+    update_status   PUT /orders/{order_id}/status     (random existing order)
+    search          GET /search?q=...                 (words, prefixes, typos, filters)
+    nearby          GET /restaurants/nearby?lat=..&lon=.. (random point in the city)
+
+with --concurrency clients, either in-process through the ASGI interface
+(--mode inprocess, no network or server overhead) or against a local
+uvicorn started on the generated data (--mode uvicorn, optionally with
+--workers N on SQLite). Reports req/s and p50/p95/p99 latency per scenario.
+A single Python client tops out well below what uvicorn can serve, so in
+uvicorn mode --clients spreads the load over several processes.
+
+JSON storage rewrites all of sample.json on every stock flush, so
+create_order slows down with catalog size; use --storage sqlite for large
+catalogs.
+
+--save writes the results to a JSON file; --compare reads one back and
+prints the change per scenario, exiting with status 1 if any p95 got more
+than --tolerance percent worse. Generating millions of orders takes a
+while, so --data-dir keeps the dataset between runs and reuses it when the
+scale matches.
+
+    python benchmarks/load.py [--restaurants 100] [--items 20] [--orders 10000]
+        [--storage json|sqlite] [--mode inprocess|uvicorn] [--workers 1] [--clients 1]
+        [--requests 2000] [--concurrency 50] [--scenarios restaurants,items]
+        [--save baseline.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import fastjson
+from catalog import catalog
+from main import app
+from order_store import order_store
+from sequences import sequences
+from storage import JsonStorage, SqliteStorage
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("restaurants", "items", "create_order", "update_status", "search", "nearby")
+STATUSES = ("pending", "confirmed", "preparing", "out_for_delivery", "delivered", "cancelled")
+# Large enough that create_order never runs out of stock
+STOCK = 10 ** 9
+ORDER_CHUNK = 100000
+# Bumped when generated data changes shape, so kept datasets are regenerated
+DATASET_VERSION = 3
+
+STYLES = ("spicy", "smoked", "crispy", "tandoori", "butter", "garlic", "masala", "kadai", "creamy", "grilled",
+          "hyderabadi", "chettinad", "malabar", "punjabi", "schezwan", "peri", "honey", "lemon", "pepper", "mint")
+MAINS = ("chicken", "paneer", "mutton", "prawn", "fish", "egg", "mushroom", "potato", "cauliflower", "lamb",
+         "tofu", "corn", "spinach", "lentil", "chickpea", "cottage", "okra", "brinjal", "crab", "duck")
+DISHES = ("biryani", "curry", "tikka", "kebab", "dosa", "roll", "pulao", "noodles", "soup", "salad",
+          "wrap", "burger", "pizza", "momos", "thali", "korma", "vindaloo", "fry", "sandwich", "bowl")
+SIDES = ("rice", "naan", "raita", "salad", "fries", "chutney", "gravy", "bread", "pickle", "papad")
+AREAS = ("banjara", "jubilee", "madhapur", "gachibowli", "kukatpally", "kondapur", "ameerpet", "begumpet",
+         "secunderabad", "miyapur", "manikonda", "tolichowki", "somajiguda", "abids", "uppal", "dilsukhnagar")
+
+
+def words_for(key: str, *vocabularies):
+    """One word from each vocabulary, chosen deterministically from key"""
+    digest = hashlib.blake2b(key.encode(), digest_size=len(vocabularies)).digest()
+    return [words[byte % len(words)] for words, byte in zip(vocabularies, digest)]
+
+
+def dish_name(restaurant_id: int, index: int) -> str:
+    return " ".join(word.title() for word in words_for(f"{restaurant_id}:{index}", STYLES, MAINS, DISHES))
+
+
+def dish_description(restaurant_id: int, index: int) -> str:
+    main, dish, side, style = words_for(f"{restaurant_id}:{index}:about", MAINS, DISHES, SIDES, STYLES)
+    return f"{main} {dish} with {side} and {style} spices"
+
+
+# Synthetic restaurants are spread evenly over this (south, west, north, east) box
+CITY = (17.2, 78.2, 17.65, 78.7)
+
+
+def position(restaurant_id: int):
+    digest = hashlib.blake2b(f"{restaurant_id}:position".encode(), digest_size=8).digest()
+    south, west, north, east = CITY
+    return (
+        round(south + (north - south) * int.from_bytes(digest[:4], "big") / 2 ** 32, 6),
+        round(west + (east - west) * int.from_bytes(digest[4:], "big") / 2 ** 32, 6)
+    )
+
+
+def item_id(restaurant_id: int, index: int, items: int) -> int:
+    return (restaurant_id - 1) * items + index + 1
+
+
+def synthetic_restaurants(restaurants: int, items: int):
+    for rid in range(1, restaurants + 1):
+        style, dish, area = words_for(str(rid), STYLES, DISHES, AREAS)
+        lat, lon = position(rid)
+        yield {
+            "id": rid,
+            "name": f"{style.title()} {dish.title()} House {rid}",
+            "location": f"{area.title()} {rid % 97}",
+            "description": "Synthetic benchmark restaurant",
+            "lat": lat,
+            "lon": lon,
+            "items": [
+                {"id": item_id(rid, index, items), "name": dish_name(rid, index), "price": 50 + (rid + index * 37) % 400,
+                 "description": dish_description(rid, index),
+                 "available_quantity": STOCK}
+                for index in range(items)
+            ]
+        }
+
+
+def synthetic_orders(orders: int, restaurants: int, items: int, seed: int):
+    rng = random.Random(seed)
+    start = time.mktime((2025, 1, 1, 0, 0, 0, 0, 0, -1))
+    for oid in range(1, orders + 1):
+        rid = rng.randint(1, restaurants)
+        lines = [
+            {"item_id": item_id(rid, index, items), "name": dish_name(rid, index), "price": float(50 + (rid + index * 37) % 400), "quantity": quantity}
+            for index, quantity in ((rng.randrange(items), rng.randint(1, 3)) for _ in range(rng.randint(1, 3)))
+        ]
+        for line in lines:
+            line["subtotal"] = line["price"] * line["quantity"]
+        created = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(start + oid * 5))
+        yield {
+            "id": oid, "restaurant_id": rid, "restaurant_name": f"Restaurant {rid}",
+            "items": lines,
+            "customer_name": f"Customer {oid % 5000}", "customer_phone": "+1000000000",
+            "delivery_address": f"{oid % 900} Bench Street", "special_instructions": None,
+            "total_amount": sum(line["subtotal"] for line in lines), "status": rng.choice(STATUSES),
+            "created_at": created, "estimated_delivery_time": created
+        }
+
+
+def write_json_dataset(directory: str, restaurants: int, items: int, orders: int, seed: int):
+    """sample.json and orders.json, streamed so large histories fit in memory"""
+    with open(os.path.join(directory, "sample.json"), "w") as file:
+        file.write('{"rest_list": [')
+        for index, restaurant in enumerate(synthetic_restaurants(restaurants, items)):
+            file.write(("," if index else "") + json.dumps(restaurant))
+        file.write("]}")
+    with open(os.path.join(directory, "orders.json"), "w") as file:
+        file.write('{"orders": [')
+        for order in synthetic_orders(orders, restaurants, items, seed):
+            file.write(("," if order["id"] > 1 else "") + json.dumps(order))
+        file.write("]}")
+
+
+def write_sqlite_dataset(directory: str, restaurants: int, items: int, orders: int, seed: int):
+    """delivery.db, with orders inserted in chunks of ORDER_CHUNK"""
+    storage = SqliteStorage(os.path.join(directory, "delivery.db"))
+    storage.save_catalog({"rest_list": list(synthetic_restaurants(restaurants, items))})
+    generated = synthetic_orders(orders, restaurants, items, seed)
+    insert = "INSERT INTO orders (id, restaurant_id, status, created_at, data) VALUES (?, ?, ?, ?, ?)"
+    while True:
+        chunk = [storage._order_row(order) for order, _ in zip(generated, range(ORDER_CHUNK))]
+        if not chunk:
+            break
+        storage._transaction([(insert, chunk)], [("orders", None, None)])
+    storage.close()
+
+
+def prepare_dataset(directory: str, args) -> dict:
+    """Generate the dataset in directory unless one of the same scale is already there"""
+    scale = {key: getattr(args, key) for key in ("restaurants", "items", "orders", "seed", "storage")}
+    scale["version"] = DATASET_VERSION
+    manifest = os.path.join(directory, "dataset.json")
+    if os.path.exists(manifest):
+        with open(manifest) as file:
+            if json.load(file) == scale:
+                print(f"reusing dataset in {directory}")
+                return scale
+    start = time.perf_counter()
+    stale = ("sample.json", "orders.json", "orders.journal", "sequences.json", "delivery.db", "delivery.db-wal", "delivery.db-shm")
+    for name in os.listdir(directory):
+        # Includes journals switched out for a compaction that never finished
+        if name in stale or name.startswith("orders.journal."):
+            os.remove(os.path.join(directory, name))
+    write = write_sqlite_dataset if args.storage == "sqlite" else write_json_dataset
+    write(directory, args.restaurants, args.items, args.orders, args.seed)
+    with open(manifest, "w") as file:
+        json.dump(scale, file)
+    print(f"generated dataset in {time.perf_counter() - start:.1f} s")
+    return scale
+
+
+def storage_env(directory: str, storage: str) -> dict:
+    env = dict(os.environ, DELIVERY_STORAGE=storage)
+    if storage == "sqlite":
+        env["DELIVERY_DB"] = os.path.join(directory, "delivery.db")
+    return env
+
+
+def load_in_process(directory: str, storage: str):
+    """Point the app's stores at the dataset"""
+    if storage == "sqlite":
+        backend = SqliteStorage(os.path.join(directory, "delivery.db"))
+    else:
+        backend = JsonStorage(
+            os.path.join(directory, "sample.json"),
+            os.path.join(directory, "orders.json"),
+            os.path.join(directory, "orders.journal")
+        )
+    start = time.perf_counter()
+    catalog.reload(backend)
+    order_store.reset(backend)
+    sequences.reset(os.path.join(directory, "sequences.json"))
+    catalog.restaurant_ids()
+    order_store.ids()
+    print(f"loaded dataset in {time.perf_counter() - start:.1f} s")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_uvicorn(directory: str, storage: str, workers: int):
+    """Run uvicorn on the dataset; returns (process, base_url) once it answers"""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", SERVER_DIR,
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=directory, env=storage_env(directory, storage)
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 600
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"uvicorn exited with status {process.returncode}")
+        try:
+            # The first request also loads the dataset
+            httpx.get(base_url + "/restaurants", timeout=600).raise_for_status()
+            return process, base_url
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit("uvicorn did not start")
+
+
+def make_request(scenario: str, scale: dict, rng: random.Random):
+    """(method, path, json body) for one request of scenario"""
+    if scenario == "restaurants":
+        return "GET", "/restaurants", None
+    if scenario == "items":
+        return "GET", f"/items/{rng.randint(1, scale['restaurants'])}", None
+    if scenario == "create_order":
+        rid = rng.randint(1, scale["restaurants"])
+        return "POST", "/orders", {
+            "restaurant_id": rid,
+            "items": [{"item_id": item_id(rid, rng.randrange(scale["items"]), scale["items"]), "quantity": 1}],
+            "customer_name": "Bench",
+            "customer_phone": "+1000000000",
+            "delivery_address": "1 Bench Street"
+        }
+    if scenario == "search":
+        return "GET", "/search?" + urlencode(search_query(rng)), None
+    if scenario == "nearby":
+        south, west, north, east = CITY
+        return "GET", f"/restaurants/nearby?lat={rng.uniform(south, north):.5f}&lon={rng.uniform(west, east):.5f}&radius=5", None
+    return "PUT", f"/orders/{rng.randint(1, scale['orders'])}/status", {"status": rng.choice(STATUSES)}
+
+
+def search_query(rng: random.Random) -> dict:
+    """A search as a customer might type it: words, a prefix or a typo, sometimes a filter"""
+    kind = rng.randrange(5)
+    word = rng.choice(MAINS + DISHES + STYLES)
+    if kind == 0:
+        params = {"q": f"{rng.choice(MAINS)} {rng.choice(DISHES)}"}
+    elif kind == 1:
+        params = {"q": word[:max(2, len(word) - 3)]}
+    elif kind == 2:
+        cut = rng.randrange(1, len(word))
+        params = {"q": word[:cut] + word[cut + 1:] if len(word) > 4 else word}
+    elif kind == 3:
+        params = {"q": f"{rng.choice(STYLES)} {rng.choice(MAINS)} {rng.choice(DISHES)}"}
+    else:
+        params = {"q": rng.choice(AREAS)}
+    if rng.random() < 0.3:
+        params["max_price"] = rng.choice((150, 250, 350))
+        params["in_stock"] = "true"
+    return params
+
+
+def percentile(timings, fraction: float) -> float:
+    """Nearest-rank percentile of sorted timings"""
+    return timings[min(len(timings) - 1, max(0, round(fraction * len(timings)) - 1))]
+
+
+async def drive(client, scenario: str, scale: dict, requests: int, concurrency: int, rng: random.Random):
+    """Issue requests with concurrency workers; returns (timings in ms, errors, start, end)"""
+    timings, errors = [], 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, path, body = make_request(scenario, scale, rng)
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            timings.append((time.perf_counter() - start) * 1000)
+            errors += response.status_code >= 400
+
+    start = time.time()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return timings, errors, start, time.time()
+
+
+async def drive_with_warmup(client, scenario: str, scale: dict, args, seed: int, concurrency: int, requests: int):
+    rng = random.Random(seed)
+    if scenario == "search":
+        # The index builds in the background; searches get 503 until it is ready
+        while (await client.get("/search?q=a")).status_code == 503:
+            await asyncio.sleep(0.1)
+    if args.warmup:
+        await drive(client, scenario, scale, args.warmup, concurrency, rng)
+    return await drive(client, scenario, scale, requests, concurrency, rng)
+
+
+def client_process(base_url: str, scenario: str, scale: dict, args, index: int):
+    """One load-generating process's share of a scenario against a server"""
+    async def run():
+        concurrency = max(1, args.concurrency // args.clients)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            return await drive_with_warmup(client, scenario, scale, args, args.seed + index, concurrency, args.requests // args.clients)
+    return asyncio.run(run())
+
+
+def summarize(parts) -> dict:
+    """Merge (timings, errors, start, end) from one or more clients into a result row"""
+    timings = sorted(timing for part in parts for timing in part[0])
+    wall = max(part[3] for part in parts) - min(part[2] for part in parts)
+    return {
+        "requests": len(timings),
+        "errors": sum(part[1] for part in parts),
+        "rps": round(len(timings) / wall, 1),
+        "p50_ms": round(percentile(timings, 0.50), 3),
+        "p95_ms": round(percentile(timings, 0.95), 3),
+        "p99_ms": round(percentile(timings, 0.99), 3),
+    }
+
+
+def run_in_process(args, scale: dict) -> dict:
+    async def run():
+        results = {}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for scenario in args.scenarios:
+                part = await drive_with_warmup(client, scenario, scale, args, args.seed, args.concurrency, args.requests)
+                results[scenario] = summarize([part])
+                print_result(scenario, results[scenario])
+        return results
+    return asyncio.run(run())
+
+
+def run_against_server(args, scale: dict, base_url: str) -> dict:
+    results = {}
+    with ProcessPoolExecutor(max_workers=args.clients) as pool:
+        for scenario in args.scenarios:
+            parts = pool.map(client_process, *zip(*[(base_url, scenario, scale, args, index) for index in range(args.clients)]))
+            results[scenario] = summarize(list(parts))
+            print_result(scenario, results[scenario])
+    return results
+
+
+def print_result(scenario: str, result: dict):
+    print(
+        f"{scenario:>14}: {result['rps']:9.1f} req/s   p50 {result['p50_ms']:8.2f} ms"
+        f"   p95 {result['p95_ms']:8.2f} ms   p99 {result['p99_ms']:8.2f} ms"
+        + (f"   {result['errors']} errors" if result["errors"] else "")
+    )
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_path: str, report: dict, tolerance: float) -> bool:
+    """Print the change against a saved run; False if a p95 regressed beyond tolerance"""
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    if baseline["scale"] != report["scale"] or baseline["mode"] != report["mode"]:
+        print(f"warning: baseline was run with {baseline['scale']} {baseline['mode']}")
+    print(f"compared with {baseline_path} (commit {baseline.get('commit')}):")
+    ok = True
+    for scenario, result in report["results"].items():
+        before = baseline["results"].get(scenario)
+        if before is None:
+            continue
+        rps = (result["rps"] / before["rps"] - 1) * 100
+        p95 = (result["p95_ms"] / before["p95_ms"] - 1) * 100
+        regressed = p95 > tolerance
+        ok = ok and not regressed
+        print(f"{scenario:>14}: req/s {rps:+6.1f}%   p95 {p95:+6.1f}%" + ("   REGRESSION" if regressed else ""))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--restaurants", type=int, default=100)
+    parser.add_argument("--items", type=int, default=20, help="items per restaurant")
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--storage", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (sqlite only when more than 1)")
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50, help="open requests at any time, across all clients")
+    parser.add_argument("--clients", type=int, default=1, help="load-generating processes (uvicorn mode)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", help="keep the generated dataset here and reuse it")
+    parser.add_argument("--save", metavar="FILE", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="compare with results saved earlier")
+    parser.add_argument("--tolerance", type=float, default=20.0, help="allowed p95 regression, percent")
+    args = parser.parse_args()
+
+    args.scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if min(args.restaurants, args.items, args.orders) < 1:
+        parser.error("--restaurants, --items and --orders must be at least 1")
+    if args.mode == "inprocess" and args.clients != 1:
+        parser.error("--clients needs --mode uvicorn")
+    if args.mode == "uvicorn" and args.workers > 1 and args.storage != "sqlite":
+        parser.error("several workers need --storage sqlite")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = args.data_dir or scratch
+        os.makedirs(directory, exist_ok=True)
+        scale = prepare_dataset(directory, args)
+        print(f"encoder: {'orjson' if fastjson.orjson else 'json (orjson not installed)'}")
+        if args.mode == "inprocess":
+            load_in_process(directory, args.storage)
+            results = run_in_process(args, scale)
+        else:
+            process, base_url = start_uvicorn(directory, args.storage, args.workers)
+            try:
+                results = run_against_server(args, scale, base_url)
+            finally:
+                process.terminate()
+                process.wait()
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "scale": scale,
+        "mode": {"mode": args.mode, "workers": args.workers, "clients": args.clients, "concurrency": args.concurrency},
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"saved {args.save}")
+    if args.compare and not compare(args.compare, report, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Compare the pre-encoded list responses with per-row pydantic models.
+
+Loads a synthetic history of --orders orders and a catalog of
+--restaurants restaurants with --items items each into scratch storage,
+then times GET /orders and GET /menu on the real app against an app with
+the old handlers, which build one model per row and let FastAPI validate
+and serialize the response model again.
+
+The catalog response cache is cleared before every /menu call so both
+sides do the full build; the fast path still reuses its per-entity
+fragments.
+
+    python benchmarks/serialization.py [--orders 20000] [--restaurants 200] [--items 50] [--rounds 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+
+import fastjson
+from catalog import catalog
+from main import app as fast_app, catalog_cache, ItemModel, MenuResponse, MenuRestaurantModel
+from order_store import order_store
+from orders import Order, OrdersResponse
+from sequences import sequences
+from storage import JsonStorage
+
+legacy_app = FastAPI()
+
+
+@legacy_app.get("/orders", response_model=OrdersResponse)
+async def legacy_orders() -> OrdersResponse:
+    return OrdersResponse(orders=[Order(**order) for order in order_store.all()])
+
+
+@legacy_app.get("/menu", response_model=MenuResponse)
+async def legacy_menu() -> MenuResponse:
+    rest_list = []
+    for restaurant in catalog.data()["rest_list"]:
+        item_list = [ItemModel(**item) for item in restaurant["items"]]
+        rest_list.append(MenuRestaurantModel(id=restaurant["id"], name=restaurant["name"], location=restaurant["location"], items=item_list))
+    return MenuResponse(rest_list=rest_list)
+
+
+def synthetic_storage(directory, orders: int, restaurants: int, items: int):
+    rest_list = [
+        {
+            "id": rid,
+            "name": f"Restaurant {rid}",
+            "location": f"Area {rid % 17}",
+            "items": [
+                {"id": rid * 1000 + iid, "name": f"Dish {iid}", "price": 100 + iid,
+                 "description": "House special", "available_quantity": 50}
+                for iid in range(items)
+            ]
+        }
+        for rid in range(1, restaurants + 1)
+    ]
+    history = [
+        {
+            "id": oid, "restaurant_id": 1 + oid % restaurants, "restaurant_name": "Restaurant",
+            "items": [{"item_id": 1000, "name": "Dish 0", "price": 100.0, "quantity": 2, "subtotal": 200.0}],
+            "customer_name": "Customer", "customer_phone": "+1000000000",
+            "delivery_address": "1 Bench Street", "special_instructions": None,
+            "total_amount": 200.0, "status": "pending",
+            "created_at": "2025-07-02T12:00:00", "estimated_delivery_time": "2025-07-02T12:35:00"
+        }
+        for oid in range(1, orders + 1)
+    ]
+    with open(os.path.join(directory, "sample.json"), "w") as file:
+        json.dump({"rest_list": rest_list}, file)
+    with open(os.path.join(directory, "orders.json"), "w") as file:
+        json.dump({"orders": history}, file)
+    storage = JsonStorage(
+        os.path.join(directory, "sample.json"),
+        os.path.join(directory, "orders.json"),
+        os.path.join(directory, "orders.journal")
+    )
+    catalog.reload(storage)
+    order_store.reset(storage)
+    sequences.reset(os.path.join(directory, "sequences.json"))
+
+
+async def time_get(app, path: str, rounds: int) -> float:
+    """Median milliseconds for GET path"""
+    transport = httpx.ASGITransport(app=app)
+    timings = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(rounds):
+            catalog_cache.clear()
+            start = time.perf_counter()
+            response = await client.get(path)
+            timings.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--restaurants", type=int, default=200)
+    parser.add_argument("--items", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"encoder: {'orjson' if fastjson.orjson else 'json (orjson not installed)'}")
+    with tempfile.TemporaryDirectory() as directory:
+        synthetic_storage(directory, args.orders, args.restaurants, args.items)
+        for path in ("/orders", "/menu"):
+            legacy = asyncio.run(time_get(legacy_app, path, args.rounds))
+            fast = asyncio.run(time_get(fast_app, path, args.rounds))
+            print(f"{path:>8}: models {legacy:8.1f} ms   pre-encoded {fast:8.1f} ms   ({legacy / fast:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+import asyncio
+import logging
+import threading
+from bisect import insort
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from geo import GeoIndex
+from search import SearchIndex
+from sequences import sequences
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogStore:
+    """Process-wide in-memory copy of the restaurant catalog.
+
+    The catalog is loaded from the storage backend once and reads are served
+    from memory. Before each access the backend's catalog stamp (the file's
+    inode/mtime/size for JSON, the data version for SQLite) is compared with
+    the one seen at load time, so changes made outside the server are picked
+    up on the next request. All writes go through save().
+
+    Restaurants and items are indexed by ID so lookups cost the same no
+    matter how large the catalog is. The indexes are rebuilt on load and
+    kept up to date by add_restaurant() and add_item(); in-place edits of
+    item fields do not need to touch them.
+
+    In-place edits of a restaurant's items are made under that restaurant's
+    lock (restaurant_lock()), so writers to different restaurants do not
+    serialize. The store-wide lock only guards the indexes and saves.
+
+    The search index is built from the catalog in a background thread,
+    started by the first search after a load, without holding the store
+    lock; search_index() returns None until it is swapped in. It is then
+    updated record by record: add_restaurant() and add_item() index new
+    records, and in-place edits of names, locations or descriptions are
+    followed by reindex(). Records indexed while a build runs are noted and
+    re-indexed into the new index before the swap.
+
+    Restaurants with lat/lon coordinates are also filed in a grid for
+    nearby() lookups. The grid is filled with the other indexes and a
+    restaurant moves cell when it is added, refreshed or reindex()ed.
+
+    version is bumped after every change to the in-memory catalog (loads,
+    additions, in-place edits via touch()), so cached responses built from
+    an older version are never served again.
+
+    With a shared backend other server processes write the same catalog.
+    When the stamp moves, only the restaurants and items named in the
+    backend's change log are re-read, instead of reloading everything.
+    """
+
+    def __init__(self, storage=None):
+        self._storage = storage
+        self.lock = threading.RLock()
+        self._data = None
+        self._stamp = None
+        self._restaurants = {}
+        self._items = {}
+        self._restaurant_ids = []
+        self._restaurant_locks = {}
+        self._version = 0
+        self._change_seq = 0
+        self._search = SearchIndex()
+        # Records to re-index once the build in progress finishes, None if none runs
+        self._search_pending = None
+        # Bumped whenever the index is dropped, so an outdated build is discarded
+        self._search_generation = 0
+        self._search_build = None
+        self._search_builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-index")
+        self._geo = GeoIndex()
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            self._storage = get_storage()
+        return self._storage
+
+    def _load(self):
+        # Log position, then stamp, before reading: a racing write is
+        # either pulled again later or forces a reload
+        self._change_seq = self.storage.last_change()
+        stamp = self.storage.catalog_stamp()
+        self._data = self.storage.load_catalog()
+        self._stamp = stamp
+        self._build_indexes()
+        self._drop_search()
+        self.touch()
+
+    def _build_indexes(self):
+        """Index restaurants by ID and items by (restaurant ID, item ID)"""
+        self._restaurants = {}
+        self._items = {}
+        self._restaurant_ids = []
+        self._geo.clear()
+        for restaurant in self._data["rest_list"]:
+            self._index_restaurant(restaurant)
+
+    def _index_restaurant(self, restaurant):
+        if restaurant["id"] not in self._restaurants:
+            insort(self._restaurant_ids, restaurant["id"])
+        self._restaurants[restaurant["id"]] = restaurant
+        self._geo.place(restaurant)
+        for item in restaurant.setdefault("items", []):
+            self._items[(restaurant["id"], item["id"])] = item
+
+    def data(self):
+        """Return the catalog, reloading it if the file changed on disk"""
+        with self.lock:
+            if self._data is None:
+                self._load()
+            else:
+                stamp = self.storage.catalog_stamp()
+                if stamp != self._stamp:
+                    if self.storage.shared:
+                        self._pull_changes()
+                    else:
+                        self._load()
+            return self._data
+
+    def _pull_changes(self):
+        """Apply other processes' catalog changes from the backend's change log"""
+        stamp, seq, changes = self.storage.changes_since(self._change_seq, ("restaurant", "item", "catalog"))
+        if changes is None or any(kind == "catalog" for kind, _, _ in changes):
+            self._load()
+            return
+        self._stamp = stamp
+        self._change_seq = seq
+        if not changes:
+            return
+        for kind, restaurant_id, row_id in dict.fromkeys(changes):
+            if kind == "restaurant":
+                self._refresh_restaurant(restaurant_id)
+            else:
+                self._refresh_item(restaurant_id, row_id)
+        self.touch()
+
+    def _refresh_restaurant(self, restaurant_id: int):
+        stored = self.storage.load_restaurant(restaurant_id)
+        restaurant = self._restaurants.get(restaurant_id)
+        if stored is None:
+            return
+        if restaurant is None:
+            stored["items"] = []
+            self._data["rest_list"].append(stored)
+            self._index_restaurant(stored)
+            restaurant = stored
+        else:
+            restaurant.update(stored)
+            self._geo.place(restaurant)
+        self._index_search(restaurant)
+
+    def _refresh_item(self, restaurant_id: int, item_id: int):
+        stored = self.storage.load_item(restaurant_id, item_id)
+        if stored is None:
+            return
+        if restaurant_id not in self._restaurants:
+            self._refresh_restaurant(restaurant_id)
+        restaurant = self._restaurants.get(restaurant_id)
+        item = self._items.get((restaurant_id, item_id))
+        if item is not None:
+            item.update(stored)
+            self._index_search(restaurant, item)
+        elif restaurant is not None:
+            restaurant["items"].append(stored)
+            self._items[(restaurant_id, item_id)] = stored
+            self._index_search(restaurant, stored)
+
+    def replace(self, data):
+        """Swap in a whole new catalog and persist it"""
+        with self.lock:
+            data.setdefault("rest_list", [])
+            self._data = data
+            self._build_indexes()
+            self._drop_search()
+            self.touch()
+        self.save()
+
+    def version(self) -> int:
+        """Catalog version, after picking up any change made outside the server"""
+        with self.lock:
+            self.data()
+            return self._version
+
+    def touch(self):
+        """Bump the version after an in-place edit of catalog data"""
+        with self.lock:
+            self._version += 1
+
+    def get_restaurant(self, restaurant_id: int):
+        """Find restaurant by ID, or None"""
+        with self.lock:
+            self.data()
+            return self._restaurants.get(restaurant_id)
+
+    def restaurant_ids(self):
+        """All restaurant IDs in ascending order (shared list, do not modify)"""
+        with self.lock:
+            self.data()
+            return self._restaurant_ids
+
+    def get_item(self, restaurant_id: int, item_id: int):
+        """Find item by restaurant ID and item ID, or None"""
+        with self.lock:
+            self.data()
+            return self._items.get((restaurant_id, item_id))
+
+    def restaurant_lock(self, restaurant_id: int):
+        """Lock guarding in-place edits of one restaurant's items"""
+        lock = self._restaurant_locks.get(restaurant_id)
+        if lock is None:
+            with self.lock:
+                lock = self._restaurant_locks.setdefault(restaurant_id, threading.Lock())
+        return lock
+
+    def add_restaurant(self, restaurant):
+        """Append a restaurant to the catalog and index it (caller saves)"""
+        with self.lock:
+            self.data()["rest_list"].append(restaurant)
+            self._index_restaurant(restaurant)
+            self._index_search(restaurant)
+            self.touch()
+
+    def add_item(self, restaurant, item):
+        """Append an item to a restaurant and index it (caller saves)"""
+        with self.lock:
+            restaurant["items"].append(item)
+            self._items[(restaurant["id"], item["id"])] = item
+            self._index_search(restaurant, item)
+            self.touch()
+
+    def reindex(self, restaurant, item=None):
+        """Update the search and nearby indexes after editing a restaurant or item in place"""
+        with self.lock:
+            self._index_search(restaurant, item)
+            if item is None:
+                self._geo.place(restaurant)
+
+    def _index_search(self, restaurant, item=None):
+        if self._search_pending is not None:
+            self._search_pending.append((restaurant, item))
+        elif item is None:
+            self._search.index_restaurant(restaurant)
+        else:
+            self._search.index_item(restaurant, item)
+
+    def _drop_search(self):
+        self._search = SearchIndex()
+        self._search_pending = None
+        self._search_generation += 1
+
+    def search_index(self, wait: bool = False):
+        """The search index, or None while it is being built in the background
+
+        The first call after a load starts the build. With wait, blocks
+        until the index is ready instead.
+        """
+        with self.lock:
+            self.data()
+            if self._search.built:
+                return self._search
+            if self._search_pending is None:
+                self._search_pending = []
+                # Items lists are only ever appended to, so the builder can
+                # read them while requests edit the catalog
+                restaurants = list(self._data["rest_list"])
+                self._search_build = self._search_builder.submit(
+                    self._build_search, restaurants, self._search_generation
+                )
+            build = self._search_build
+        if not wait:
+            return None
+        build.result()
+        with self.lock:
+            return self._search if self._search.built else None
+
+    def _build_search(self, restaurants, generation: int):
+        index = SearchIndex()
+        try:
+            index.build(restaurants)
+        except Exception:
+            logger.exception("search index build failed")
+            with self.lock:
+                if generation == self._search_generation:
+                    # The next search starts another build
+                    self._search_pending = None
+            return
+        with self.lock:
+            if generation != self._search_generation:
+                # The catalog was reloaded meanwhile
+                return
+            for restaurant, item in self._search_pending:
+                if item is None:
+                    index.index_restaurant(restaurant)
+                else:
+                    index.index_item(restaurant, item)
+            self._search = index
+            self._search_pending = None
+
+    def nearby(self, lat: float, lon: float, radius_km: float, limit: int):
+        """[(distance in km, restaurant)] within radius_km of the point, nearest first"""
+        with self.lock:
+            self.data()
+            return self._geo.nearby(lat, lon, radius_km, limit)
+
+    def max_restaurant_id(self) -> int:
+        """Highest restaurant ID, used to seed the ID allocator"""
+        return max((rest["id"] for rest in self.data()["rest_list"]), default=0)
+
+    def max_item_id(self) -> int:
+        """Highest item ID across all restaurants, used to seed the ID allocator"""
+        return max(
+            (item["id"] for rest in self.data()["rest_list"] for item in rest["items"]),
+            default=0
+        )
+
+    def save(self, restaurants=None, items=None, stock=None):
+        """Persist the catalog; restaurants/items optionally name the changed rows
+        and stock the (restaurant_id, item_id, quantity) levels set outright
+
+        Called without holding the store lock, so concurrent saves can be
+        coalesced by the backend. Returns once the caller's changes are
+        written.
+        """
+        self.storage.save_catalog(self._data, restaurants, items, stock)
+
+    async def save_async(self, restaurants=None, items=None, stock=None):
+        """Async form of save(); waits for the write without blocking the event loop"""
+        await asyncio.wrap_future(self.storage.submit_catalog(self._data, restaurants, items, stock))
+
+    def reload(self, storage=None):
+        """Drop the cached catalog, optionally switching to another backend"""
+        with self.lock:
+            if storage is not None:
+                self._storage = storage
+            self._data = None
+            self._stamp = None
+            self._restaurants = {}
+            self._items = {}
+            self._restaurant_ids = []
+            self._drop_search()
+            self._geo.clear()
+
+    @contextmanager
+    def transaction(self):
+        """Mutate the catalog under the store lock and save everything on success"""
+        with self.lock:
+            data = self.data()
+            yield data
+        self.save()
+
+
+catalog = CatalogStore()
+sequences.register("restaurant", catalog.max_restaurant_id)
+sequences.register("item", catalog.max_item_id)
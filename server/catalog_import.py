@@ -0,0 +1,229 @@
+"""Bulk upsert of restaurants and their items.
+
+A menu import is a list of restaurant rows, each with a list of item rows.
+A row with an id updates the existing restaurant or item (only the fields
+given); a row without one creates a new record. Every row is validated
+first and all problems are reported by row path
+("restaurants[0].items[3]"). Nothing is applied unless the whole import is
+valid. A valid import is applied under the affected restaurants' locks and
+persisted with a single catalog save. dry_run stops after validation and
+reports what would change.
+"""
+from collections import OrderedDict
+from contextlib import ExitStack
+from typing import Any, List, Optional
+from pydantic import BaseModel, Field, ValidationError
+from catalog import catalog
+from inventory import run_locked
+from sequences import sequences
+from storage import run_io
+
+MAX_IMPORT_RESTAURANTS = 1000
+
+
+class ItemUpsert(BaseModel):
+    id: Optional[int] = None
+    name: Optional[str] = None
+    price: Optional[int] = Field(None, ge=0)
+    description: Optional[str] = None
+    available_quantity: Optional[int] = Field(None, ge=0)
+
+
+class RestaurantUpsert(BaseModel):
+    id: Optional[int] = None
+    name: Optional[str] = None
+    location: Optional[str] = None
+    description: Optional[str] = None
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lon: Optional[float] = Field(None, ge=-180, le=180)
+    # Validated row by row so errors can be reported per item
+    items: List[Any] = []
+
+
+class CatalogImportRequest(BaseModel):
+    restaurants: List[Any] = Field(min_length=1, max_length=MAX_IMPORT_RESTAURANTS)
+
+
+class ImportRowResult(BaseModel):
+    path: str
+    action: str
+    id: Optional[int] = None
+
+
+class ImportRowError(BaseModel):
+    path: str
+    detail: str
+
+
+class CatalogImportResponse(BaseModel):
+    dry_run: bool
+    applied: bool
+    restaurants_created: int = 0
+    restaurants_updated: int = 0
+    items_created: int = 0
+    items_updated: int = 0
+    rows: List[ImportRowResult] = []
+    errors: List[ImportRowError] = []
+
+
+def _validation_detail(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in problem['loc']) or 'row'}: {problem['msg']}"
+        for problem in error.errors()
+    )
+
+
+def _changes(row: BaseModel, fields) -> dict:
+    """Fields explicitly given in an update row"""
+    return {field: getattr(row, field) for field in fields if field in row.model_fields_set and getattr(row, field) is not None}
+
+
+def plan_import(rows: List[Any]):
+    """Validate rows against the current catalog
+
+    Returns (plan, errors). plan is a list of
+    (path, restaurant row, existing restaurant or None, [(path, item row), ...]).
+    """
+    plan, errors = [], []
+    seen_restaurants = set()
+    for index, raw in enumerate(rows):
+        path = f"restaurants[{index}]"
+        try:
+            row = RestaurantUpsert.model_validate(raw)
+        except ValidationError as error:
+            errors.append(ImportRowError(path=path, detail=_validation_detail(error)))
+            continue
+
+        existing = None
+        if row.id is not None:
+            existing = catalog.get_restaurant(row.id)
+            if existing is None:
+                errors.append(ImportRowError(path=path, detail="Restaurant not found"))
+            elif row.id in seen_restaurants:
+                errors.append(ImportRowError(path=path, detail="Restaurant appears more than once"))
+            seen_restaurants.add(row.id)
+        elif not row.name or not row.location:
+            errors.append(ImportRowError(path=path, detail="name and location are required for a new restaurant"))
+        if (row.lat is None) != (row.lon is None):
+            errors.append(ImportRowError(path=path, detail="lat and lon must be given together"))
+
+        item_rows = []
+        seen_items = set()
+        for item_index, raw_item in enumerate(row.items):
+            item_path = f"{path}.items[{item_index}]"
+            try:
+                item = ItemUpsert.model_validate(raw_item)
+            except ValidationError as error:
+                errors.append(ImportRowError(path=item_path, detail=_validation_detail(error)))
+                continue
+            if item.id is not None:
+                if row.id is None:
+                    errors.append(ImportRowError(path=item_path, detail="Items of a new restaurant cannot have an id"))
+                elif existing is not None and catalog.get_item(row.id, item.id) is None:
+                    errors.append(ImportRowError(path=item_path, detail="Item not found in this restaurant"))
+                elif item.id in seen_items:
+                    errors.append(ImportRowError(path=item_path, detail="Item appears more than once"))
+                seen_items.add(item.id)
+            elif not item.name or item.price is None:
+                errors.append(ImportRowError(path=item_path, detail="name and price are required for a new item"))
+            item_rows.append((item_path, item))
+
+        plan.append((path, row, existing, item_rows))
+    return plan, errors
+
+
+def _summarize(plan, dry_run: bool) -> CatalogImportResponse:
+    result = CatalogImportResponse(dry_run=dry_run, applied=False)
+    for path, row, existing, item_rows in plan:
+        result.rows.append(ImportRowResult(path=path, action="update" if existing else "create", id=row.id))
+        if existing:
+            result.restaurants_updated += 1
+        else:
+            result.restaurants_created += 1
+        for item_path, item in item_rows:
+            result.rows.append(ImportRowResult(path=item_path, action="update" if item.id is not None else "create", id=item.id))
+            if item.id is not None:
+                result.items_updated += 1
+            else:
+                result.items_created += 1
+    return result
+
+
+def _apply(plan, restaurant_ids, item_ids, result: CatalogImportResponse):
+    """Apply a validated plan in memory; returns (changed restaurants, changed items, stock levels)"""
+    restaurant_ids, item_ids = iter(restaurant_ids), iter(item_ids)
+    results = iter(result.rows)
+    changed_restaurants, changed_items = [], []
+    locked = sorted(row.id for _, row, existing, _ in plan if existing)
+    # (restaurant_id, item_id, quantity) set on existing items, which item
+    # rows do not carry on a shared backend
+    stock = []
+
+    # Same lock order as order reservations: restaurant locks, then the store lock
+    with ExitStack() as stack:
+        for restaurant_id in locked:
+            stack.enter_context(catalog.restaurant_lock(restaurant_id))
+        stack.enter_context(catalog.lock)
+
+        for _, row, existing, item_rows in plan:
+            row_result = next(results)
+            if existing:
+                restaurant = catalog.get_restaurant(row.id)
+                restaurant.update(_changes(row, ("name", "location", "description", "lat", "lon")))
+                catalog.reindex(restaurant)
+            else:
+                restaurant = OrderedDict([
+                    ("id", next(restaurant_ids)),
+                    ("name", row.name),
+                    ("location", row.location),
+                    ("description", row.description or ""),
+                    ("items", [])
+                ])
+                if row.lat is not None:
+                    restaurant["lat"], restaurant["lon"] = row.lat, row.lon
+                catalog.add_restaurant(restaurant)
+                row_result.id = restaurant["id"]
+            changed_restaurants.append(restaurant)
+
+            for _, item in item_rows:
+                item_result = next(results)
+                if item.id is not None:
+                    stored = catalog.get_item(restaurant["id"], item.id)
+                    stored.update(_changes(item, ("name", "price", "description", "available_quantity")))
+                    if item.available_quantity is not None:
+                        stock.append((restaurant["id"], item.id, item.available_quantity))
+                    catalog.reindex(restaurant, stored)
+                else:
+                    stored = OrderedDict([
+                        ("id", next(item_ids)),
+                        ("name", item.name),
+                        ("price", item.price),
+                        ("description", item.description or ""),
+                        ("available_quantity", item.available_quantity or 0)
+                    ])
+                    catalog.add_item(restaurant, stored)
+                    item_result.id = stored["id"]
+                changed_items.append((restaurant["id"], stored))
+        catalog.touch()
+    return changed_restaurants, changed_items, stock
+
+
+async def import_catalog_async(rows: List[Any], dry_run: bool = False) -> CatalogImportResponse:
+    """Validate and, unless dry_run or invalid, apply a menu import with one save"""
+    plan, errors = plan_import(rows)
+    result = _summarize(plan, dry_run)
+    if errors:
+        result.errors = errors
+        return result
+    if dry_run:
+        return result
+
+    # Allocate all new IDs up front, one block per kind
+    restaurant_ids = await run_io(sequences.reserve_block, "restaurant", result.restaurants_created) if result.restaurants_created else []
+    item_ids = await run_io(sequences.reserve_block, "item", result.items_created) if result.items_created else []
+
+    changed_restaurants, changed_items, stock = await run_locked(_apply, plan, restaurant_ids, item_ids, result)
+    # Stock levels go out in the same transaction as the rows
+    await catalog.save_async(restaurants=changed_restaurants, items=changed_items, stock=stock)
+    result.applied = True
+    return result
@@ -0,0 +1,27 @@
+import shutil
+import pytest
+from catalog import catalog
+from sequences import sequences
+from order_store import order_store
+from storage import JsonStorage, get_storage
+from orders import order_idempotency
+
+
+@pytest.fixture(autouse=True)
+def isolated_storage(tmp_path):
+    """Run every test against scratch copies of the server's data files"""
+    shutil.copy("sample.json", tmp_path / "sample.json")
+    shutil.copy("orders.json", tmp_path / "orders.json")
+    storage = JsonStorage(
+        str(tmp_path / "sample.json"),
+        str(tmp_path / "orders.json"),
+        str(tmp_path / "orders.journal")
+    )
+    catalog.reload(storage)
+    order_store.reset(storage)
+    sequences.reset(str(tmp_path / "sequences.json"))
+    order_idempotency.clear()
+    yield storage
+    catalog.reload(get_storage())
+    order_store.reset(get_storage())
+    sequences.reset("sequences.json")
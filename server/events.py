@@ -0,0 +1,123 @@
+"""In-process fan-out of order events to push subscribers.
+
+create_order and update_order_status publish an event once the change has
+been written. Each SSE or WebSocket connection holds a Subscription with
+its own filters and a bounded queue on the event loop that serves it.
+
+Publishers never wait for subscribers. If a subscriber falls more than
+EVENT_BUFFER events behind, its queue is closed with an "overflow" marker
+and the connection ends; the client reconnects and re-reads current state
+from the REST endpoints. That bounds memory per connection and keeps one
+slow client from holding back order processing for everyone else.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+from typing import Optional
+
+EVENT_BUFFER = int(os.environ.get("DELIVERY_EVENT_BUFFER", "100"))
+HEARTBEAT_SECONDS = 15.0
+
+# Sentinel queued when a subscriber has been dropped for falling behind
+OVERFLOW = {"type": "overflow"}
+
+
+def _status_value(status):
+    return getattr(status, "value", status)
+
+
+class Subscription:
+    """One subscriber's filters and bounded event queue"""
+
+    def __init__(self, restaurant_id: Optional[int] = None, order_id: Optional[int] = None,
+                 status: Optional[str] = None, buffer: int = EVENT_BUFFER):
+        self.restaurant_id = restaurant_id
+        self.order_id = order_id
+        self.status = _status_value(status)
+        self.loop = asyncio.get_running_loop()
+        # One slot is kept free for the overflow marker
+        self.queue = asyncio.Queue(maxsize=buffer + 1)
+        self.closed = False
+
+    def matches(self, order) -> bool:
+        if self.restaurant_id is not None and order["restaurant_id"] != self.restaurant_id:
+            return False
+        if self.order_id is not None and order["id"] != self.order_id:
+            return False
+        if self.status is not None and _status_value(order["status"]) != self.status:
+            return False
+        return True
+
+    def _offer(self, event):
+        # Runs on self.loop only
+        if self.closed:
+            return
+        if self.queue.qsize() >= self.queue.maxsize - 1:
+            self.closed = True
+            self.queue.put_nowait(OVERFLOW)
+            return
+        self.queue.put_nowait(event)
+
+    def offer(self, event):
+        """Queue an event from any thread without waiting"""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._offer(event)
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._offer, event)
+
+    async def next(self, timeout: Optional[float] = None):
+        """Next event, OVERFLOW once dropped, or None after timeout"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """Process-wide registry of subscriptions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._sequence = itertools.count(1)
+
+    def subscribe(self, **filters) -> Subscription:
+        subscription = Subscription(**filters)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscriptions)
+
+    def publish(self, event_type: str, order):
+        """Send an order event to every matching subscriber"""
+        with self._lock:
+            subscriptions = [subscription for subscription in self._subscriptions if subscription.matches(order)]
+            if not subscriptions:
+                return
+            event = {"id": next(self._sequence), "type": event_type, "order": dict(order)}
+        for subscription in subscriptions:
+            subscription.offer(event)
+
+
+def format_sse(event) -> str:
+    """Render an event as a text/event-stream message"""
+    if event is OVERFLOW:
+        return "event: overflow\ndata: {}\n\n"
+    data = json.dumps(event["order"], default=str)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+events = EventBus()
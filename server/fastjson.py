@@ -0,0 +1,77 @@
+"""Fast JSON encoding for list responses.
+
+List endpoints used to build one pydantic model per row and then have
+FastAPI validate and serialize the whole response again. Here each entity
+is validated and encoded once and the bytes are kept in a FragmentCache
+next to a shallow snapshot of the record they were made from. Later
+responses compare the record with the snapshot, which is much cheaper than
+rebuilding the model, and join cached fragments into the response body.
+Records edited in place (stock changes, status updates) no longer match
+their snapshot and are re-encoded on the next read.
+
+Fragments are produced by the same pydantic models as before, so the bytes
+are identical to the old responses. Envelopes and ad-hoc dicts go through
+dumps(), which uses orjson when it is installed.
+"""
+import json
+import threading
+from collections import OrderedDict
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+MAX_FRAGMENTS = 100_000
+
+
+def dumps(content) -> bytes:
+    """Encode content compactly, as FastAPI's JSONResponse does"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps()"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def join_list(key: str, fragments, **extra) -> bytes:
+    """Build {"key": [fragments...], **extra} from pre-encoded fragments"""
+    body = b'{"' + key.encode() + b'":[' + b",".join(fragments) + b"]"
+    for name, value in extra.items():
+        body += b',"' + name.encode() + b'":' + dumps(value)
+    return body + b"}"
+
+
+class FragmentCache:
+    """LRU of encoded entities, each valid while its record is unchanged"""
+
+    def __init__(self, max_entries: int = MAX_FRAGMENTS):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, record, encode) -> bytes:
+        """Encoded bytes for record, calling encode(record) if it changed"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == record:
+                self._entries.move_to_end(key)
+                return entry[1]
+        snapshot = dict(record)
+        encoded = encode(snapshot)
+        with self._lock:
+            self._entries[key] = (snapshot, encoded)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return encoded
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
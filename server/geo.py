@@ -0,0 +1,192 @@
+"""Nearby-restaurant lookups on a fixed latitude/longitude grid.
+
+Restaurants with coordinates are bucketed into CELL_DEGREES x CELL_DEGREES
+cells. A query visits cells in rings of growing distance around the cell
+of the search point and computes great-circle distances only for the
+restaurants in them. It stops as soon as the next ring lies beyond the
+radius, or cannot hold anything closer than the limit-th hit found so
+far; cells that cannot hold anything that close are skipped. The cost
+therefore follows the number of restaurants near the point rather than
+the size of the catalog. Candidates are compared by a flat-earth distance
+and only the final few are measured along the great circle.
+
+Moving or adding a restaurant updates its cell in place; nothing is ever
+rebuilt.
+"""
+import heapq
+import math
+import threading
+from typing import List
+from pydantic import BaseModel
+
+MAX_NEARBY_RADIUS_KM = 100.0
+MAX_NEARBY_RESULTS = 100
+# About 1.1 km north-south
+CELL_DEGREES = 0.01
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+COLUMNS = round(360 / CELL_DEGREES)
+# Relative error allowed for the flat-earth distance used to pick candidates
+SLACK = 0.01
+
+
+class NearbyRestaurant(BaseModel):
+    id: int
+    name: str
+    location: str
+    lat: float
+    lon: float
+    distance_km: float
+
+
+class NearbyResponse(BaseModel):
+    rest_list: List[NearbyRestaurant]
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance (haversine)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def coordinates(restaurant):
+    """(lat, lon) of a restaurant, or None if it has no position"""
+    lat, lon = restaurant.get("lat"), restaurant.get("lon")
+    if lat is None or lon is None:
+        return None
+    return float(lat), float(lon)
+
+
+def cell_of(lat: float, lon: float):
+    return math.floor(lat / CELL_DEGREES), math.floor((lon + 180) / CELL_DEGREES) % COLUMNS
+
+
+class GeoIndex:
+    """Grid of restaurant positions, updated one restaurant at a time"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            # Row -> column -> {restaurant ID: (lat, lon, restaurant)}
+            self._rows = {}
+            # Restaurant ID -> (row, column) it is filed under
+            self._placed = {}
+
+    def __len__(self):
+        return len(self._placed)
+
+    def place(self, restaurant):
+        """File a restaurant under its current coordinates, moving or dropping it as needed"""
+        with self._lock:
+            restaurant_id = restaurant["id"]
+            old = self._placed.pop(restaurant_id, None)
+            if old is not None:
+                row, column = old
+                columns = self._rows[row]
+                del columns[column][restaurant_id]
+                if not columns[column]:
+                    del columns[column]
+                    if not columns:
+                        del self._rows[row]
+            position = coordinates(restaurant)
+            if position is None:
+                return
+            row, column = cell_of(*position)
+            self._rows.setdefault(row, {}).setdefault(column, {})[restaurant_id] = (*position, restaurant)
+            self._placed[restaurant_id] = (row, column)
+
+    def nearby(self, lat: float, lon: float, radius_km: float, limit: int):
+        """[(distance in km, restaurant)] within radius_km of the point, nearest first"""
+        with self._lock:
+            row, column = cell_of(lat, lon)
+            # Ring k spans k rows and k x width columns each way, so every
+            # ring adds at least one cell height of distance; width uses the
+            # narrowest cells the search can reach. Near a pole, where cells
+            # narrow to nothing and the shortest way may lead over the pole,
+            # rings take all columns and candidates are measured exactly
+            poleward = abs(lat) + radius_km / KM_PER_DEGREE + CELL_DEGREES
+            polar = poleward >= 89.0
+            width = COLUMNS // 2 if polar else math.ceil(1 / math.cos(math.radians(poleward)))
+            cell_km = CELL_DEGREES * KM_PER_DEGREE
+            reach_km = radius_km * (1 + SLACK)
+            found = []
+            # Negated distances of the limit nearest so far
+            nearest = []
+            ring = 0
+            kth = reach_km
+            while True:
+                # Anything in this ring or beyond is at least this far away
+                if (ring - 1) * cell_km > min(reach_km, kth):
+                    break
+                for other_row, other_column, entries in self._ring(row, column, ring, width):
+                    if ring and not polar and self._gap_km(lat, lon, other_row, other_column) > kth:
+                        continue
+                    for restaurant_id, (other_lat, other_lon, restaurant) in entries.items():
+                        if polar:
+                            distance = distance_km(lat, lon, other_lat, other_lon)
+                        else:
+                            east = other_lon - lon
+                            if east > 180:
+                                east -= 360
+                            elif east < -180:
+                                east += 360
+                            east *= math.cos(math.radians((lat + other_lat) / 2))
+                            distance = KM_PER_DEGREE * math.hypot(east, other_lat - lat)
+                        if distance <= kth:
+                            found.append((distance, restaurant_id, restaurant))
+                            if len(nearest) < limit:
+                                heapq.heappush(nearest, -distance)
+                            elif distance < -nearest[0]:
+                                heapq.heapreplace(nearest, -distance)
+                            kth = -nearest[0] * (1 + SLACK) if len(nearest) == limit else reach_km
+                ring += 1
+            if len(nearest) == limit:
+                cutoff = -nearest[0] * (1 + SLACK)
+                found = [hit for hit in found if hit[0] <= cutoff]
+            exact = []
+            for _, restaurant_id, restaurant in found:
+                distance = distance_km(lat, lon, *coordinates(restaurant))
+                if distance <= radius_km:
+                    exact.append((distance, restaurant_id, restaurant))
+            return [(distance, restaurant) for distance, _, restaurant in heapq.nsmallest(limit, exact)]
+
+    @staticmethod
+    def _gap_km(lat: float, lon: float, row: int, column: int) -> float:
+        """Lower bound on the distance from the point to anywhere in a cell"""
+        south, west = row * CELL_DEGREES, column * CELL_DEGREES - 180
+        north = max(0.0, lat - (south + CELL_DEGREES), south - lat)
+        east = abs(lon - (west + CELL_DEGREES / 2)) % 360
+        east = max(0.0, min(east, 360 - east) - CELL_DEGREES / 2)
+        # East-west degrees are shortest on the most poleward parallel involved
+        poleward = max(abs(lat), abs(south), abs(south + CELL_DEGREES))
+        return KM_PER_DEGREE * max(north, east * math.cos(math.radians(poleward)))
+
+    def _ring(self, row: int, column: int, ring: int, width: int):
+        """Occupied cells of ring number ring around (row, column), as (row, column, entries)"""
+        outer = min(ring * width, COLUMNS // 2)
+        inner = min((ring - 1) * width, COLUMNS // 2) if ring else -1
+        for other_row in range(row - ring, row + ring + 1):
+            columns = self._rows.get(other_row)
+            if not columns:
+                continue
+            # Edge rows of the ring take the whole span, the others only
+            # the columns the previous ring did not cover
+            low = 0 if abs(other_row - row) == ring else inner + 1
+            if low > outer:
+                continue
+            if len(columns) <= 2 * (outer - low + 1):
+                for other_column, entries in columns.items():
+                    offset = abs(other_column - column)
+                    if low <= min(offset, COLUMNS - offset) <= outer:
+                        yield other_row, other_column, entries
+                continue
+            for offset in range(low, outer + 1):
+                for other_column in {(column - offset) % COLUMNS, (column + offset) % COLUMNS}:
+                    entries = columns.get(other_column)
+                    if entries:
+                        yield other_row, other_column, entries
@@ -0,0 +1,114 @@
+"""Idempotency keys for retried requests.
+
+A client sends the same Idempotency-Key header on every retry of one
+logical request. The first request with a key runs normally and its result
+is kept for IDEMPOTENCY_TTL seconds; retries get that result back without
+running again. A retry that arrives while the first request is still
+running waits for it instead of starting a second run. If the first run
+fails, the key is released so a later retry can try again, and requests
+waiting on it get the same error.
+
+Reusing a key for a different request body is a client bug and gets a 422.
+The store is bounded to IDEMPOTENCY_MAX_KEYS entries; the oldest are
+dropped first.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from fastapi import HTTPException
+
+IDEMPOTENCY_TTL = float(os.environ.get("DELIVERY_IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.environ.get("DELIVERY_IDEMPOTENCY_MAX_KEYS", "10000"))
+MAX_KEY_LENGTH = 255
+
+
+def fingerprint(body: str) -> str:
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """Bounded, TTL-evicted map of idempotency key -> result future"""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # key -> [fingerprint, future, expires_at or None while in flight]
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self, now: float):
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            expired = entry[2] is not None and entry[2] <= now
+            if not expired and len(self._entries) < self.max_keys:
+                break
+            del self._entries[key]
+
+    def begin(self, key: str, body_fingerprint: str):
+        """Return (future, owner); the owner must call finish()"""
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[2] is None or entry[2] > now):
+                if entry[0] != body_fingerprint:
+                    raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+                return entry[1], False
+            self._evict(now)
+            future = Future()
+            self._entries[key] = [body_fingerprint, future, None]
+            return future, True
+
+    def finish(self, key: str, future: Future, result=None, error: BaseException = None):
+        """Record the owner's result, or release the key after an error"""
+        with self._lock:
+            entry = self._entries.get(key)
+            owned = entry is not None and entry[1] is future
+            if owned and error is None:
+                entry[2] = time.monotonic() + self.ttl
+                self._entries.move_to_end(key)
+            elif owned:
+                del self._entries[key]
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def run(self, key: str, body_fingerprint: str, function):
+        """Call function() once per key; returns (result, replayed)"""
+        future, owner = self.begin(key, body_fingerprint)
+        if not owner:
+            return future.result(), True
+        try:
+            result = function()
+        except BaseException as error:
+            self.finish(key, future, error=error)
+            raise
+        self.finish(key, future, result)
+        return result, False
+
+    async def run_async(self, key: str, body_fingerprint: str, function):
+        """Async form of run(); function is a coroutine function"""
+        future, owner = self.begin(key, body_fingerprint)
+        if not owner:
+            return await asyncio.wrap_future(future), True
+        try:
+            result = await function()
+        except BaseException as error:
+            self.finish(key, future, error=error)
+            raise
+        self.finish(key, future, result)
+        return result, False
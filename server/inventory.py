@@ -0,0 +1,213 @@
+"""Atomic stock reservation for orders.
+
+All lines of an order are checked and decremented in one step under the
+restaurant's lock from the catalog store. Two orders for the same
+restaurant can therefore never both pass the availability check on the same
+units, while orders for different restaurants do not wait on each other.
+
+The new stock levels are persisted write-behind: the stock writer batches
+the changed items of many orders into one catalog save. With a backend
+shared between server processes the check and decrement instead run inside
+the backend's stock transaction, which re-reads the stored levels first and
+commits the new ones before the restaurant lock is released.
+"""
+import asyncio
+import atexit
+import os
+from typing import List, Tuple
+from fastapi import HTTPException
+from catalog import catalog
+from storage import run_io
+from writebehind import WriteBehind
+
+# Stock changes are flushed in batches: after STOCK_FLUSH_MS, or sooner once
+# STOCK_FLUSH_THRESHOLD items are dirty. With STOCK_DURABILITY "sync" a
+# request waits for the batch holding its change (group commit); with
+# "async" it returns as soon as memory is updated and a crash can lose up
+# to one interval of stock changes.
+STOCK_FLUSH_MS = float(os.environ.get("DELIVERY_STOCK_FLUSH_MS", "10"))
+STOCK_FLUSH_THRESHOLD = int(os.environ.get("DELIVERY_STOCK_FLUSH_THRESHOLD", "256"))
+STOCK_DURABILITY = os.environ.get("DELIVERY_STOCK_DURABILITY", "sync")
+
+stock_writer = WriteBehind(
+    lambda rows: catalog.save(items=rows),
+    interval=STOCK_FLUSH_MS / 1000,
+    threshold=STOCK_FLUSH_THRESHOLD,
+    name="stock-writer"
+)
+atexit.register(stock_writer.flush)
+
+
+def take_stock(restaurant_id: int, lines: List[Tuple[int, int]]):
+    """Reserve (item_id, quantity) lines in memory
+
+    Returns (restaurant, reserved item copies, changed rows to save).
+    Nothing is decremented unless every line can be satisfied. Repeated
+    lines for the same item are added up before checking availability.
+    """
+    with catalog.restaurant_lock(restaurant_id), catalog.storage.stock_transaction(restaurant_id) as stored:
+        restaurant = catalog.get_restaurant(restaurant_id)
+        if not restaurant:
+            raise HTTPException(status_code=404, detail="Restaurant not found")
+        if stored is not None:
+            _refresh(restaurant_id, stored)
+        
+        matched_items = []
+        requested = {}
+        for item_id, quantity in lines:
+            item = catalog.get_item(restaurant_id, item_id)
+            if not item:
+                raise HTTPException(
+                    status_code=404, 
+                    detail=f"Item with ID {item_id} not found in restaurant"
+                )
+            
+            if quantity <= 0:
+                raise HTTPException(
+                    status_code=400, 
+                    detail="Quantity must be greater than 0"
+                )
+            
+            # Check availability - item must have sufficient quantity
+            requested[item_id] = requested.get(item_id, 0) + quantity
+            if item["available_quantity"] < requested[item_id]:
+                raise HTTPException(
+                    status_code=404, 
+                    detail=f"Item not available - available_quantity: {item['available_quantity']}"
+                )
+            
+            matched_items.append(item)
+        
+        # All lines can be satisfied, decrement them together
+        changed = _adjust(restaurant_id, requested, -1)
+        if stored is not None:
+            # Committed with the check; nothing left for the stock writer
+            stored.write(changed)
+            changed = []
+        
+        # Copies so prices and names stay as reserved if the menu is edited
+        return restaurant, [dict(item) for item in matched_items], changed
+
+
+async def run_locked(function, *args):
+    """Call function(*args), which takes restaurant locks, off the event loop
+    when their holders may be waiting on other processes"""
+    if catalog.storage.shared:
+        return await run_io(function, *args)
+    return function(*args)
+
+
+async def take_stock_async(restaurant_id: int, lines: List[Tuple[int, int]]):
+    """take_stock() off the event loop when it may wait on other processes"""
+    return await run_locked(take_stock, restaurant_id, lines)
+
+
+def reserve_stock(restaurant_id: int, lines: List[Tuple[int, int]]):
+    """Reserve lines and persist the new stock; returns (restaurant, reserved items)"""
+    restaurant, reserved, changed = take_stock(restaurant_id, lines)
+    # Persist outside the lock so saves from many orders can be coalesced
+    try:
+        persist_stock(changed)
+    except Exception:
+        # The stock writer retries the failed rows; give the units back
+        # first so the retry does not persist a sale that never happened
+        release_stock(restaurant_id, lines)
+        raise
+    return restaurant, reserved
+
+
+async def reserve_stock_async(restaurant_id: int, lines: List[Tuple[int, int]]):
+    """Async form of reserve_stock()"""
+    restaurant, reserved, changed = await take_stock_async(restaurant_id, lines)
+    try:
+        await persist_stock_async(changed)
+    except Exception:
+        await release_stock_async(restaurant_id, lines)
+        raise
+    return restaurant, reserved
+
+
+def _queue_stock(changed):
+    return stock_writer.submit(((restaurant_id, item["id"]), (restaurant_id, item)) for restaurant_id, item in changed)
+
+
+def persist_stock(changed):
+    """Hand changed (restaurant_id, item) rows to the stock writer"""
+    if not changed:
+        return
+    written = _queue_stock(changed)
+    if STOCK_DURABILITY == "sync":
+        written.result()
+
+
+async def persist_stock_async(changed):
+    """Async form of persist_stock()"""
+    if not changed:
+        return
+    written = _queue_stock(changed)
+    if STOCK_DURABILITY == "sync":
+        await asyncio.wrap_future(written)
+
+
+def _give_back(restaurant_id: int, lines: List[Tuple[int, int]]):
+    requested = {}
+    for item_id, quantity in lines:
+        requested[item_id] = requested.get(item_id, 0) + quantity
+    with catalog.restaurant_lock(restaurant_id), catalog.storage.stock_transaction(restaurant_id) as stored:
+        if stored is not None:
+            _refresh(restaurant_id, stored)
+        changed = _adjust(restaurant_id, requested, 1)
+        if stored is not None:
+            stored.write(changed)
+            changed = []
+        return changed
+
+
+def release_stock(restaurant_id: int, lines: List[Tuple[int, int]]):
+    """Give back stock taken by reserve_stock() for an order that was not placed"""
+    persist_stock(_give_back(restaurant_id, lines))
+
+
+async def release_stock_async(restaurant_id: int, lines: List[Tuple[int, int]]):
+    """Async form of release_stock()"""
+    if catalog.storage.shared:
+        await run_io(_give_back, restaurant_id, lines)
+    else:
+        await persist_stock_async(_give_back(restaurant_id, lines))
+
+
+def set_stock(restaurant_id: int, quantities):
+    """Set {item_id: quantity} levels outright; call with the restaurant lock held
+
+    On a shared backend the new levels are committed here, in the stock
+    transaction, since catalog saves do not write stock for existing items.
+    Otherwise they go out with the caller's catalog save.
+    """
+    with catalog.storage.stock_transaction(restaurant_id) as stored:
+        changed = []
+        for item_id, quantity in quantities.items():
+            item = catalog.get_item(restaurant_id, item_id)
+            item["available_quantity"] = quantity
+            changed.append((restaurant_id, item))
+        catalog.touch()
+        if stored is not None:
+            stored.write(changed)
+
+
+def _refresh(restaurant_id: int, stored):
+    """Adopt stock levels committed by other processes"""
+    for item_id, quantity in stored.quantities.items():
+        item = catalog.get_item(restaurant_id, item_id)
+        if item is not None and item["available_quantity"] != quantity:
+            item["available_quantity"] = quantity
+            catalog.touch()
+
+
+def _adjust(restaurant_id: int, quantities, sign: int):
+    changed = []
+    for item_id, quantity in quantities.items():
+        item = catalog.get_item(restaurant_id, item_id)
+        item["available_quantity"] += sign * quantity
+        changed.append((restaurant_id, item))
+    catalog.touch()
+    return changed
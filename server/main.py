@@ -1,14 +1,33 @@
-import json
 from collections import OrderedDict
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from typing import Optional,List
+import json
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Annotated, Literal, Optional,List
 from fastapi.middleware.cors import CORSMiddleware
+from catalog import catalog
+from sequences import sequences
+from storage import run_io
+from pagination import MAX_LIMIT, page_ids, parse_fields, project
+from events import events, format_sse, HEARTBEAT_SECONDS, OVERFLOW
+from response_cache import ResponseCache, cached_response
+from fastjson import FastJSONResponse, FragmentCache, join_list
+from inventory import run_locked, set_stock
+from catalog_import import CatalogImportRequest, CatalogImportResponse, import_catalog_async
+from search import MAX_SEARCH_RESULTS, SearchResponse
+from metrics import MetricsMiddleware, registry
+from admission import CATALOG_READS, ORDER_WRITES, RETRY_AFTER_SECONDS, AdmissionMiddleware
+from profiler import ProfileSettings, ProfileStatus, ProfilerMiddleware, profiler, require_admin
+from geo import MAX_NEARBY_RADIUS_KM, MAX_NEARBY_RESULTS, NearbyResponse, NearbyRestaurant
 
 
 app = FastAPI()
 
+# Serialized catalog reads, reused until the catalog version changes
+catalog_cache = ResponseCache()
+# Encoded restaurants and items, reused until the record is edited
+catalog_fragments = FragmentCache()
+
 origins = [
     "http://localhost",
     "http://localhost:5174",
@@ -16,13 +35,61 @@ origins = [
     "http://127.0.0.1:5173"
 ]
 
+# Routes held to a bounded number of in-flight requests, shed with 503 under overload
+ADMISSION_CLASSES = {
+    ORDER_WRITES: [("POST", "/orders"), ("POST", "/orders/batch"), ("PUT", "/orders/{order_id}/status")],
+    CATALOG_READS: [
+        ("GET", "/restaurants"), ("GET", "/restaurants/nearby"), ("GET", "/items/{id}"),
+        ("GET", "/menu"), ("GET", "/search"),
+    ],
+}
+
+# Inside CORS, so browsers can read the 503s it sends
+app.add_middleware(AdmissionMiddleware, classes=ADMISSION_CLASSES)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the frontend read Server-Timing on fetch() responses
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(ProfilerMiddleware)
+# Outermost, so the latency it records covers the whole stack
+app.add_middleware(MetricsMiddleware)
+
+
+@registry.collector
+def cache_metrics():
+    return [
+        ("delivery_catalog_cache_hits_total", "counter", "Catalog reads served from the response cache", catalog_cache.hits),
+        ("delivery_catalog_cache_misses_total", "counter", "Catalog reads that built a new response", catalog_cache.misses),
+    ]
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Request, storage and cache metrics in Prometheus text format"""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/admin/profile", response_model=ProfileStatus, include_in_schema=False, dependencies=[Depends(require_admin)])
+async def profile_status() -> ProfileStatus:
+    return profiler.status()
+
+
+@app.put("/admin/profile", response_model=ProfileStatus, include_in_schema=False, dependencies=[Depends(require_admin)])
+async def configure_profile(settings: ProfileSettings) -> ProfileStatus:
+    """Start, adjust or stop sampling without a restart"""
+    profiler.configure(settings)
+    return profiler.status()
+
+
+@app.get("/admin/profile/stacks", include_in_schema=False, dependencies=[Depends(require_admin)])
+async def profile_stacks(reset: bool = False):
+    """Sampled stacks in collapsed format, for flamegraph.pl or speedscope"""
+    return Response(profiler.collapsed(reset), media_type="text/plain; charset=utf-8")
 
 
 
@@ -36,16 +103,19 @@ class ItemModel(BaseModel):
 class ItemsResponse(BaseModel):
     item_list: List[ItemModel]
 
-@app.get("/items/{id}")
-def items(id : int) -> ItemsResponse:
-    with open("sample.json", "r") as file:
-        data = json.load(file)
-    item_list = []
-    for rest in data["rest_list"]:
-        if rest["id"] == id:
-            for item in rest["items"]:
-                item_list.append(ItemModel(id = item["id"], name = item["name"], price = item["price"], description= item["description"], available_quantity=item["available_quantity"]))
-    return ItemsResponse(item_list=item_list)
+def encode_item(item) -> bytes:
+    return ItemModel(id = item["id"], name = item["name"], price = item["price"], description= item["description"], available_quantity=item["available_quantity"]).model_dump_json().encode()
+
+def item_fragments(restaurant):
+    """Encoded items of a restaurant, in menu order"""
+    return [catalog_fragments.get(("item", restaurant["id"], item["id"]), item, encode_item) for item in restaurant["items"]]
+
+@app.get("/items/{id}", response_model=ItemsResponse)
+async def items(id : int, request: Request) -> ItemsResponse:
+    def build():
+        rest = catalog.get_restaurant(id)
+        return join_list("item_list", item_fragments(rest) if rest is not None else [])
+    return cached_response(catalog_cache, request, catalog.version(), build)
 
 
 class RestaurantModel(BaseModel):
@@ -55,58 +125,140 @@ class RestaurantModel(BaseModel):
 
 class RestaurantsResponse(BaseModel):
     rest_list: List[RestaurantModel]
+    next_cursor: Optional[str] = None
+
+def encode_restaurant(restaurant) -> bytes:
+    return RestaurantModel(id = restaurant["id"], name = restaurant["name"], location= restaurant["location"]).model_dump_json().encode()
+
+def restaurant_fragment(restaurant) -> bytes:
+    return catalog_fragments.get(("restaurant", restaurant["id"]), restaurant, encode_restaurant)
+
+# Shared query parameters of the paginated list endpoints
+Limit = Annotated[Optional[int], Query(ge=1, le=MAX_LIMIT, description="Page size; omit for everything")]
+Cursor = Annotated[Optional[str], Query(description="next_cursor from the previous page")]
+Fields = Annotated[Optional[str], Query(description="Comma-separated fields to return")]
+Sort = Annotated[Literal["asc", "desc"], Query(description="Sort by id")]
 
 @app.get("/restaurants", response_model=RestaurantsResponse)
-def restaurants() -> RestaurantsResponse:
-    with open("sample.json", "r") as file:
-        data = json.load(file)
-    rest_list = []
-    for restaurant in data["rest_list"]:
-        rest_list.append(RestaurantModel(id = restaurant["id"], name = restaurant["name"], location= restaurant["location"]))
-    return RestaurantsResponse(rest_list= rest_list)
+async def restaurants(request: Request, limit: Limit = None, cursor: Cursor = None, fields: Fields = None, sort: Sort = "asc") -> RestaurantsResponse:
+    selected = parse_fields(fields, RestaurantModel)
+    def build():
+        page, next_cursor = page_ids(catalog.restaurant_ids(), limit, cursor, sort == "desc")
+        restaurants = [catalog.get_restaurant(restaurant_id) for restaurant_id in page]
+        if selected:
+            return {"rest_list": [project(restaurant, selected) for restaurant in restaurants], "next_cursor": next_cursor}
+        return join_list("rest_list", [restaurant_fragment(restaurant) for restaurant in restaurants], next_cursor=next_cursor)
+    return cached_response(catalog_cache, request, catalog.version(), build)
+
+
+@app.get("/restaurants/nearby", response_model=NearbyResponse)
+async def nearby_restaurants(
+    lat: Annotated[float, Query(ge=-90, le=90)],
+    lon: Annotated[float, Query(ge=-180, le=180)],
+    radius: Annotated[float, Query(gt=0, le=MAX_NEARBY_RADIUS_KM, description="Search radius in km")] = 5,
+    limit: Annotated[int, Query(ge=1, le=MAX_NEARBY_RESULTS)] = 20
+) -> NearbyResponse:
+    """Restaurants with coordinates within radius km of lat/lon, nearest first"""
+    return NearbyResponse(rest_list=[
+        NearbyRestaurant(
+            id=restaurant["id"], name=restaurant["name"], location=restaurant["location"],
+            lat=restaurant["lat"], lon=restaurant["lon"], distance_km=round(distance, 3)
+        )
+        for distance, restaurant in catalog.nearby(lat, lon, radius, limit)
+    ])
+
+
+class MenuRestaurantModel(RestaurantModel):
+    items: List[ItemModel]
+
+class MenuResponse(BaseModel):
+    rest_list: List[MenuRestaurantModel]
+
+@app.get("/menu", response_model=MenuResponse)
+async def menu(request: Request, ids: Optional[List[int]] = Query(None)) -> MenuResponse:
+    """Restaurants together with their items, optionally only the given ids"""
+    def build():
+        if ids is None:
+            selected = catalog.data()["rest_list"]
+        else:
+            selected = [catalog.get_restaurant(id) for id in dict.fromkeys(ids)]
+        rest_list = []
+        for restaurant in selected:
+            if restaurant is None:
+                continue
+            # MenuRestaurantModel is RestaurantModel plus a trailing items list
+            rest_list.append(restaurant_fragment(restaurant)[:-1] + b',"items":[' + b",".join(item_fragments(restaurant)) + b"]}")
+        return join_list("rest_list", rest_list)
+    return cached_response(catalog_cache, request, catalog.version(), build)
+
+
+@app.get("/search", response_model=SearchResponse)
+async def search(
+    request: Request,
+    q: Annotated[str, Query(min_length=1, max_length=200, description="Words to find; prefixes and small typos match")],
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: bool = False,
+    limit: Annotated[int, Query(ge=1, le=MAX_SEARCH_RESULTS)] = 20
+) -> SearchResponse:
+    """Restaurants and items matching q, best first; price and stock filters apply to items"""
+    index = catalog.search_index()
+    if index is None:
+        # Building in the background after a load
+        raise HTTPException(status_code=503, detail="Search index is being built, retry later",
+                            headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    def build():
+        return index.search(q, limit, min_price, max_price, in_stock).model_dump()
+    return cached_response(catalog_cache, request, catalog.version(), build)
 
 
 @app.get("/")
-def home():
+async def home():
     return FileResponse("index.html")
 
 class RestaurantCreateModel(BaseModel):
     name: str
     location: str
     description: Optional[str] = None
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lon: Optional[float] = Field(None, ge=-180, le=180)
 
 @app.post("/restaurants")
-def create_restaurant(restaurant: RestaurantCreateModel) -> RestaurantCreateModel:
-    with open("sample.json", "r") as file:
-        data = json.load(file)
-    
-    # Generate new ID by finding the maximum existing ID and adding 1
-    max_id = 0
-    for rest in data["rest_list"]:
-        if "id" in rest and rest["id"] > max_id:
-            max_id = rest["id"]
-    
-    new_id = max_id + 1
+async def create_restaurant(restaurant: RestaurantCreateModel) -> RestaurantCreateModel:
+    if (restaurant.lat is None) != (restaurant.lon is None):
+        raise HTTPException(status_code=422, detail="lat and lon must be given together")
+    # Allocate the ID outside the catalog lock; the first call may seed
+    # the counter from the catalog
+    new_id = await run_io(sequences.next_id, "restaurant")
     
-    # Create restaurant dict in the correct order using OrderedDict
-    restaurant_dict = OrderedDict([
-        ("id", new_id),
-        ("name", restaurant.name),
-        ("location", restaurant.location),
-        ("description", restaurant.description or ""),
-        ("items", [])
-    ])
-    
-    print(f"Restaurant dict before saving: {restaurant_dict}")
-    print(f"Keys order: {list(restaurant_dict.keys())}")
-    
-    data["rest_list"].append(restaurant_dict)
-    with open("sample.json", "w") as file:
-        json.dump(data, file, indent=4, ensure_ascii=False)
+    with catalog.lock:
+        # Create restaurant dict in the correct order using OrderedDict
+        restaurant_dict = OrderedDict([
+            ("id", new_id),
+            ("name", restaurant.name),
+            ("location", restaurant.location),
+            ("description", restaurant.description or ""),
+            ("items", [])
+        ])
+        if restaurant.lat is not None:
+            restaurant_dict["lat"] = restaurant.lat
+            restaurant_dict["lon"] = restaurant.lon
+        
+        catalog.add_restaurant(restaurant_dict)
+    await catalog.save_async(restaurants=[restaurant_dict], items=[])
     return restaurant
 
 
 
+@app.post("/catalog/import", response_model=CatalogImportResponse)
+async def import_catalog(catalog_import: CatalogImportRequest, dry_run: bool = False) -> CatalogImportResponse:
+    """Create or update many restaurants and items with one save; 422 lists every bad row"""
+    result = await import_catalog_async(catalog_import.restaurants, dry_run)
+    if result.errors:
+        return FastJSONResponse(result.model_dump(), status_code=422)
+    return result
+
+
 # Update existing item endpoint
 class ItemUpdateModel(BaseModel):
     name: Optional[str] = None  # Optional field for name update
@@ -115,44 +267,48 @@ class ItemUpdateModel(BaseModel):
     available_quantity: Optional[int] = None  # Optional field for quantity update
 
 @app.put("/restaurants/{restaurant_id}/items/{item_id}")
-def update_item(restaurant_id: int, item_id: int, item_update: ItemUpdateModel) -> ItemModel:
-    with open("sample.json", "r") as file:
-        data = json.load(file)
-    
-    # Find the restaurant by ID
-    for rest in data["rest_list"]:
-        if rest["id"] == restaurant_id:
+async def update_item(restaurant_id: int, item_id: int, item_update: ItemUpdateModel) -> ItemModel:
+    def apply():
+        # Same lock as order reservations, so a concurrent order cannot lose this write
+        with catalog.restaurant_lock(restaurant_id):
+            # Find the restaurant by ID
+            rest = catalog.get_restaurant(restaurant_id)
+            if rest is None:
+                raise HTTPException(status_code=404, detail="Restaurant not found")
+            
             # Find the item by ID within this restaurant
-            for item in rest["items"]:
-                if item["id"] == item_id:
-                    # Update fields if provided
-                    if item_update.name is not None:
-                        item["name"] = item_update.name
-                    if item_update.price is not None:
-                        item["price"] = item_update.price
-                    if item_update.description is not None:
-                        item["description"] = item_update.description
-                    if item_update.available_quantity is not None:
-                        item["available_quantity"] = item_update.available_quantity
-                    
-                    # Save back to file
-                    with open("sample.json", "w") as file:
-                        json.dump(data, file, indent=4)
-                    
-                    # Return the updated item
-                    return ItemModel(
-                        id=item["id"], 
-                        name=item["name"], 
-                        price=item["price"], 
-                        description=item["description"],
-                        available_quantity=item["available_quantity"]
-                    )
+            item = catalog.get_item(restaurant_id, item_id)
+            if item is None:
+                raise HTTPException(status_code=404, detail="Item not found in this restaurant")
+            
+            # Update fields if provided
+            if item_update.name is not None:
+                item["name"] = item_update.name
+            if item_update.price is not None:
+                item["price"] = item_update.price
+            if item_update.description is not None:
+                item["description"] = item_update.description
+            if item_update.available_quantity is not None:
+                set_stock(restaurant_id, {item_id: item_update.available_quantity})
+            if item_update.name is not None or item_update.description is not None:
+                catalog.reindex(rest, item)
+            catalog.touch()
             
-            # Item not found in this restaurant
-            raise HTTPException(status_code=404, detail="Item not found in this restaurant")
+            return item, ItemModel(
+                id=item["id"], 
+                name=item["name"], 
+                price=item["price"], 
+                description=item["description"],
+                available_quantity=item["available_quantity"]
+            )
+    
+    item, updated = await run_locked(apply)
+    
+    # Save back to storage
+    await catalog.save_async(items=[(restaurant_id, item)])
     
-    # Restaurant not found
-    raise HTTPException(status_code=404, detail="Restaurant not found")
+    # Return the updated item
+    return updated
 
 
 # Add new item to a restaurant
@@ -163,88 +319,134 @@ class ItemCreateModel(BaseModel):
     available_quantity: int = 0
 
 @app.post("/restaurants/{restaurant_id}/items")
-def add_item_to_restaurant(restaurant_id: int, item: ItemCreateModel) -> ItemModel:
-    with open("sample.json", "r") as file:
-        data = json.load(file)
-    
+async def add_item_to_restaurant(restaurant_id: int, item: ItemCreateModel) -> ItemModel:
     # Find the restaurant by ID
-    for rest in data["rest_list"]:
-        if rest["id"] == restaurant_id:
-            # Generate new item ID by finding the maximum existing item ID and adding 1
-            max_item_id = 0
-            for restaurant in data["rest_list"]:
-                for existing_item in restaurant["items"]:
-                    if existing_item["id"] > max_item_id:
-                        max_item_id = existing_item["id"]
-            
-            new_item_id = max_item_id + 1
-            
-            # Create new item dict in correct order
-            new_item = OrderedDict([
-                ("id", new_item_id),
-                ("name", item.name),
-                ("price", float(item.price)),
-                ("description", item.description or ""),
-                ("available_quantity", item.available_quantity)
-            ])
-            
-            # Add item to restaurant's items list
-            rest["items"].append(new_item)
-            
-            # Save back to file
-            with open("sample.json", "w") as file:
-                json.dump(data, file, indent=4, ensure_ascii=False)
-            
-            # Return the created item
-            return ItemModel(
-                id=new_item_id,
-                name=item.name,
-                price=int(item.price),
-                description=item.description,
-                available_quantity=item.available_quantity
-            )
+    rest = catalog.get_restaurant(restaurant_id)
+    if rest is None:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    
+    new_item_id = await run_io(sequences.next_id, "item")
+    
+    with catalog.restaurant_lock(restaurant_id):
+        # Create new item dict in correct order
+        new_item = OrderedDict([
+            ("id", new_item_id),
+            ("name", item.name),
+            ("price", float(item.price)),
+            ("description", item.description or ""),
+            ("available_quantity", item.available_quantity)
+        ])
+        
+        # Add item to restaurant's items list
+        catalog.add_item(rest, new_item)
     
-    # If restaurant not found
-    raise HTTPException(status_code=404, detail="Restaurant not found")
+    # Save back to storage
+    await catalog.save_async(items=[(restaurant_id, new_item)])
+    
+    # Return the created item
+    return ItemModel(
+        id=new_item_id,
+        name=item.name,
+        price=int(item.price),
+        description=item.description,
+        available_quantity=item.available_quantity
+    )
 
 
 # Import orders functionality
 from orders import (
     OrderCreate, Order, OrdersResponse, OrderStatusUpdate, OrderStatus,
-    create_order, get_all_orders, get_order_by_id, update_order_status,
-    get_orders_by_restaurant, get_orders_by_status
+    BatchOrderRequest, BatchOrderResponse, create_orders_batch_async,
+    create_order_async, create_order_once_async, get_order_by_id, update_order_status_async,
+    get_order_ids, get_orders_page, get_orders_page_json
 )
 
+def orders_response(ids, limit, cursor, fields, sort):
+    """Paginated OrdersResponse, or a projected JSON body when fields are selected"""
+    selected = parse_fields(fields, Order)
+    if selected:
+        orders, next_cursor = get_orders_page(ids, limit, cursor, sort == "desc", selected)
+        return FastJSONResponse({"orders": orders, "next_cursor": next_cursor})
+    return Response(get_orders_page_json(ids, limit, cursor, sort == "desc"), media_type="application/json")
+
 # Orders endpoints
 @app.post("/orders", response_model=Order)
-def create_new_order(order: OrderCreate) -> Order:
-    """Create a new order"""
-    return create_order(order)
+async def create_new_order(order: OrderCreate, response: Response,
+                           idempotency_key: Annotated[Optional[str], Header()] = None) -> Order:
+    """Create a new order; retries with the same Idempotency-Key get the first result"""
+    if idempotency_key is None:
+        return await create_order_async(order)
+    created, replayed = await create_order_once_async(order, idempotency_key)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return created
+
+@app.post("/orders/batch", response_model=BatchOrderResponse)
+async def create_orders_batch(batch: BatchOrderRequest) -> BatchOrderResponse:
+    """Create many orders in one request, reporting success or failure per order"""
+    return await create_orders_batch_async(batch.orders)
 
 @app.get("/orders", response_model=OrdersResponse)
-def get_orders() -> OrdersResponse:
-    """Get all orders"""
-    orders = get_all_orders()
-    return OrdersResponse(orders=orders)
+async def get_orders(limit: Limit = None, cursor: Cursor = None, fields: Fields = None, sort: Sort = "asc") -> OrdersResponse:
+    """Get all orders, a page at a time when limit is given"""
+    return orders_response(get_order_ids(), limit, cursor, fields, sort)
+
+# Push channels for order events; filters combine with AND
+@app.get("/orders/events")
+async def order_events(restaurant_id: Optional[int] = None, order_id: Optional[int] = None, status: Optional[OrderStatus] = None):
+    """Server-sent events stream of order creations and status changes"""
+    async def stream():
+        subscription = events.subscribe(restaurant_id=restaurant_id, order_id=order_id, status=status)
+        try:
+            yield ": connected\n\n"
+            while True:
+                event = await subscription.next(HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+                if event is OVERFLOW:
+                    break
+        finally:
+            events.unsubscribe(subscription)
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.websocket("/orders/ws")
+async def order_events_socket(websocket: WebSocket, restaurant_id: Optional[int] = None, order_id: Optional[int] = None, status: Optional[OrderStatus] = None):
+    """WebSocket stream of order creations and status changes"""
+    await websocket.accept()
+    subscription = events.subscribe(restaurant_id=restaurant_id, order_id=order_id, status=status)
+    try:
+        while True:
+            event = await subscription.next(HEARTBEAT_SECONDS)
+            if event is None:
+                event = {"type": "heartbeat"}
+            await websocket.send_text(json.dumps(event, default=str))
+            if event is OVERFLOW:
+                # 1013 "try again later": the client fell too far behind
+                await websocket.close(code=1013)
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        events.unsubscribe(subscription)
 
 @app.get("/orders/{order_id}", response_model=Order)
-def get_order(order_id: int) -> Order:
+async def get_order(order_id: int) -> Order:
     """Get a specific order by ID"""
     return get_order_by_id(order_id)
 
 @app.put("/orders/{order_id}/status", response_model=Order)
-def update_order_status_endpoint(order_id: int, status_update: OrderStatusUpdate) -> Order:
+async def update_order_status_endpoint(order_id: int, status_update: OrderStatusUpdate) -> Order:
     """Update order status"""
-    return update_order_status(order_id, status_update)
+    return await update_order_status_async(order_id, status_update)
 
 @app.get("/restaurants/{restaurant_id}/orders", response_model=OrdersResponse)
-def get_restaurant_orders(restaurant_id: int) -> OrdersResponse:
+async def get_restaurant_orders(restaurant_id: int, limit: Limit = None, cursor: Cursor = None, fields: Fields = None, sort: Sort = "asc") -> OrdersResponse:
     """Get all orders for a specific restaurant"""
-    orders = get_orders_by_restaurant(restaurant_id)
-    return OrdersResponse(orders=orders)
+    return orders_response(get_order_ids(restaurant_id=restaurant_id), limit, cursor, fields, sort)
 
 @app.get("/orders/status/{status}", response_model=OrdersResponse)
-def get_orders_by_status_endpoint(status: OrderStatus) -> OrdersResponse:
+async def get_orders_by_status_endpoint(status: OrderStatus, limit: Limit = None, cursor: Cursor = None, fields: Fields = None, sort: Sort = "asc") -> OrdersResponse:
     """Get all orders with a specific status"""
-    orders = get_orders_by_status(status)
-    return OrdersResponse(orders=orders)
\ No newline at end of file
+    return orders_response(get_order_ids(status=status), limit, cursor, fields, sort)
\ No newline at end of file
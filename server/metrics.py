@@ -0,0 +1,241 @@
+"""Request and storage metrics, exposed in Prometheus text format.
+
+MetricsMiddleware counts every HTTP request by method, route template and
+status and records its latency in a histogram. Storage and order code
+wrap their steps in span(operation) to record how long file reads, JSON
+parsing and dumping, writes, SQLite queries, lock waits and building
+response models take, and add_bytes() counts bytes read and written.
+
+Spans that run for a request, including storage calls handed to the I/O
+executor with run_io(), also add up per request. The total goes into
+that request's Server-Timing header, e.g.
+
+    Server-Timing: lock_wait;dur=0.012, query;dur=0.4, app;dur=1.9
+
+so a browser's developer tools show where the time went. Work done for
+many requests at once by the batching writer threads only shows in the
+histograms.
+
+Recording costs two clock reads and a bucket increment per span. Nothing
+is kept per request beyond the header, so this can stay on in
+production. DELIVERY_METRICS=0 turns it off.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+METRICS_ENABLED = os.environ.get("DELIVERY_METRICS", "1") != "0"
+# Upper bounds in seconds, from 100 µs to 10 s
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Span durations of the request being served, or None outside requests
+_request_spans = ContextVar("request_spans", default=None)
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic counter family with fixed label names"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+class Gauge(Counter):
+    """Value that goes up and down"""
+
+    kind = "gauge"
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    """Latency histogram family with fixed label names and BUCKETS"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # Labels -> [per-bucket counts (last is +Inf), sum]
+        self._series = {}
+
+    def observe(self, seconds: float, *labels):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += seconds
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        names = self.label_names + ("le",)
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+
+
+class Registry:
+    """Metric families in exposition order"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, function):
+        """Register function() -> [(name, kind, help, value)] read at scrape time"""
+        self._collectors.append(function)
+        return function
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collect in self._collectors:
+            for name, kind, help, value in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+requests_total = registry.add(Counter(
+    "delivery_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+))
+request_seconds = registry.add(Histogram(
+    "delivery_request_duration_seconds", "HTTP request latency by route template", ("method", "route")
+))
+requests_in_flight = registry.add(Gauge("delivery_requests_in_flight", "HTTP requests being served"))
+operation_seconds = registry.add(Histogram(
+    "delivery_operation_duration_seconds", "Time spent in storage and serialization steps", ("operation",)
+))
+storage_bytes = registry.add(Counter(
+    "delivery_storage_bytes_total", "Bytes read from and written to storage files", ("direction",)
+))
+
+
+@contextmanager
+def span(operation: str):
+    """Time the block as operation, for the histograms and the request's Server-Timing"""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        operation_seconds.observe(elapsed, operation)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans[operation] = spans.get(operation, 0.0) + elapsed
+
+
+@contextmanager
+def locked(lock, operation: str = "lock_wait"):
+    """Acquire lock, recording how long that took"""
+    with span(operation):
+        lock.acquire()
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def add_bytes(direction: str, amount: int):
+    if METRICS_ENABLED:
+        storage_bytes.inc(direction, amount=amount)
+
+
+def server_timing(spans, total: float) -> bytes:
+    """Server-Timing header value, durations in milliseconds"""
+    parts = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in spans.items()]
+    parts.append(f"app;dur={total * 1000:.3f}")
+    return ", ".join(parts).encode()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route counts and latency and adding Server-Timing"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        spans = {}
+        token = _request_spans.set(spans)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", ()))
+                headers.append((b"server-timing", server_timing(spans, time.perf_counter() - start)))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        requests_in_flight.inc(amount=1)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            requests_in_flight.inc(amount=-1)
+            _request_spans.reset(token)
+            route = scope.get("route")
+            # Templates rather than raw paths keep the label set bounded
+            template = getattr(route, "path", None) or "unmatched"
+            requests_total.inc(scope["method"], template, str(status))
+            request_seconds.observe(time.perf_counter() - start, scope["method"], template)
@@ -0,0 +1,289 @@
+import asyncio
+import threading
+from bisect import bisect_left, insort
+from concurrent.futures import Future, ThreadPoolExecutor
+from storage import get_storage
+
+# Stands in for a field the order did not have before an update
+_MISSING = object()
+
+
+class OrderStore:
+    """Process-wide in-memory order history.
+
+    Orders are loaded from the storage backend on first use and kept in an
+    insertion-ordered dict keyed by ID. Every create or status change is
+    handed to the backend as a single-record write; JsonStorage appends it
+    to its journal, SqliteStorage writes one row.
+
+    Record writes are queued in the order the changes were made in memory
+    and flushed by a single writer thread. Everything queued while a flush
+    is running goes out in the next one (group commit), so one append or
+    transaction covers many requests. The plain methods wait for their
+    write; the *_async methods await it without blocking the event loop.
+
+    Besides the ascending list of all IDs, the store keeps secondary indexes
+    status -> IDs and restaurant_id -> IDs (both ascending lists) that are
+    updated as orders are added or change status, so filtered listings cost
+    time in proportion to the result rather than the whole history.
+
+    If a flush fails, the changes it carried are taken back out of memory
+    before the waiting requests see the error: new orders are removed and
+    changed fields restored, unless a later change has overwritten them.
+
+    With a shared backend other server processes add and update orders
+    too. Whenever the backend's stamp moves, the orders named in its change
+    log are re-read and re-indexed before the store answers.
+    """
+
+    def __init__(self, storage=None):
+        self._storage = storage
+        self.lock = threading.RLock()
+        self._orders = None
+        self._ids = []
+        self._by_status = {}
+        self._by_restaurant = {}
+        self._stamp = None
+        self._change_seq = 0
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="order-writer")
+        self._queue_lock = threading.Lock()
+        self._queue = []
+        # How to take each queued write back out of memory if its flush fails
+        self._undo = []
+        self._pending = None
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            self._storage = get_storage()
+        return self._storage
+
+    def reset(self, storage=None):
+        """Drop in-memory state, optionally switching to another backend"""
+        with self.lock:
+            if storage is not None:
+                self._storage = storage
+            self._orders = None
+            self._stamp = None
+
+    def _ensure_loaded(self):
+        if self._orders is None:
+            self._load()
+        elif self.storage.shared:
+            stamp = self.storage.orders_stamp()
+            if stamp != self._stamp:
+                self._pull_changes()
+        return self._orders
+
+    def _load(self):
+        # Log position and stamp first, so writes racing the load are pulled later
+        self._change_seq = self.storage.last_change()
+        self._stamp = self.storage.orders_stamp()
+        self._build_indexes(self.storage.load_orders())
+
+    def _pull_changes(self):
+        """Apply other processes' order writes from the backend's change log"""
+        stamp, seq, changes = self.storage.changes_since(self._change_seq, ("order", "orders"))
+        if changes is None or any(kind == "orders" for kind, _, _ in changes):
+            self._load()
+            return
+        self._stamp = stamp
+        self._change_seq = seq
+        for _, _, order_id in dict.fromkeys(changes):
+            stored = self.storage.load_order(order_id)
+            if stored is None:
+                continue
+            order = self._orders.get(order_id)
+            if order is None:
+                self._orders[order_id] = stored
+                insort(self._ids, order_id)
+                self._index(stored)
+            else:
+                self._unindex(order)
+                order.clear()
+                order.update(stored)
+                self._index(order)
+
+    def _build_indexes(self, orders):
+        self._orders = orders
+        self._ids = sorted(orders)
+        self._by_status = {}
+        self._by_restaurant = {}
+        for order_id in self._ids:
+            self._index(orders[order_id])
+
+    @staticmethod
+    def _status_key(status):
+        # OrderStatus members and their string values must share a bucket
+        return getattr(status, "value", status)
+
+    def _index(self, order):
+        order_id = order["id"]
+        insort(self._by_status.setdefault(self._status_key(order["status"]), []), order_id)
+        insort(self._by_restaurant.setdefault(order["restaurant_id"], []), order_id)
+
+    def _unindex(self, order):
+        order_id = order["id"]
+        for bucket in (self._by_status.get(self._status_key(order["status"])),
+                       self._by_restaurant.get(order["restaurant_id"])):
+            if bucket:
+                position = bisect_left(bucket, order_id)
+                if position < len(bucket) and bucket[position] == order_id:
+                    del bucket[position]
+
+    def ids(self, status=None, restaurant_id=None):
+        """Ascending IDs of the orders matching the filters
+
+        With at most one filter this is a shared index list; do not modify.
+        """
+        with self.lock:
+            self._ensure_loaded()
+            if status is None and restaurant_id is None:
+                return self._ids
+            by_restaurant = self._by_restaurant.get(restaurant_id, [])
+            if status is None:
+                return by_restaurant
+            by_status = self._by_status.get(self._status_key(status), [])
+            if restaurant_id is None:
+                return by_status
+            # Walk the smaller bucket and check the other attribute
+            if len(by_status) <= len(by_restaurant):
+                return [order_id for order_id in by_status if self._orders[order_id]["restaurant_id"] == restaurant_id]
+            status = self._status_key(status)
+            return [order_id for order_id in by_restaurant if self._status_key(self._orders[order_id]["status"]) == status]
+
+    def all(self):
+        """All order dicts in insertion order"""
+        with self.lock:
+            return list(self._ensure_loaded().values())
+
+    def get(self, order_id: int):
+        """Order dict by ID, or None"""
+        with self.lock:
+            return self._ensure_loaded().get(order_id)
+
+    def get_many(self, order_ids):
+        """Order dicts for the given IDs, skipping unknown ones"""
+        with self.lock:
+            orders = self._ensure_loaded()
+            return [orders[order_id] for order_id in order_ids if order_id in orders]
+
+    def _enqueue(self, writes, undo) -> Future:
+        """Queue writes for the next flush; call with self.lock held"""
+        with self._queue_lock:
+            self._queue.extend(writes)
+            self._undo.extend(undo)
+            if self._pending is None:
+                self._pending = Future()
+                self._writer.submit(self._flush)
+            return self._pending
+
+    def _flush(self):
+        with self._queue_lock:
+            writes, self._queue = self._queue, []
+            undo, self._undo = self._undo, []
+            future, self._pending = self._pending, None
+        try:
+            self.storage.write_orders(writes)
+        except BaseException as error:
+            self._roll_back(undo)
+            future.set_exception(error)
+            return
+        future.set_result(None)
+
+    def _roll_back(self, undo):
+        """Take the changes of a failed flush back out of memory, newest first"""
+        with self.lock:
+            if self._orders is None:
+                return
+            for op, order, *args in reversed(undo):
+                order_id = order["id"]
+                if op == "add":
+                    if self._orders.get(order_id) is not order:
+                        continue
+                    del self._orders[order_id]
+                    position = bisect_left(self._ids, order_id)
+                    if position < len(self._ids) and self._ids[position] == order_id:
+                        del self._ids[position]
+                    self._unindex(order)
+                    continue
+                changes, previous = args
+                # Fields changed again since are left to the later write
+                restore = {field: value for field, value in previous.items() if order.get(field, _MISSING) == changes[field]}
+                if not restore:
+                    continue
+                self._unindex(order)
+                for field, value in restore.items():
+                    if value is _MISSING:
+                        del order[field]
+                    else:
+                        order[field] = value
+                self._index(order)
+
+    def _submit_add(self, orders):
+        with self.lock:
+            loaded = self._ensure_loaded()
+            for order in orders:
+                loaded[order["id"]] = order
+                insort(self._ids, order["id"])
+                self._index(order)
+            # Queued together so they share one flush
+            return self._enqueue([("add", order) for order in orders], [("add", order) for order in orders])
+
+    def _submit_update(self, order_id: int, changes):
+        with self.lock:
+            order = self._ensure_loaded().get(order_id)
+            if order is None:
+                return None, None
+            # Move the order between index buckets if a key field changes
+            reindex = any(field in changes and changes[field] != order[field] for field in ("status", "restaurant_id"))
+            previous = {field: order.get(field, _MISSING) for field in changes}
+            if reindex:
+                self._unindex(order)
+            order.update(changes)
+            if reindex:
+                self._index(order)
+            changes = dict(changes)
+            return order, self._enqueue([("update", order_id, changes, order)], [("update", order, changes, previous)])
+
+    def add(self, order):
+        """Record a new order"""
+        self._submit_add([order]).result()
+
+    async def add_async(self, order):
+        """Record a new order without blocking the event loop"""
+        await asyncio.wrap_future(self._submit_add([order]))
+
+    def add_many(self, orders):
+        """Record several new orders with a single storage write"""
+        if orders:
+            self._submit_add(orders).result()
+
+    async def add_many_async(self, orders):
+        """Async form of add_many()"""
+        if orders:
+            await asyncio.wrap_future(self._submit_add(orders))
+
+    def update(self, order_id: int, changes):
+        """Apply field changes to an order and return it, or None if unknown"""
+        order, written = self._submit_update(order_id, changes)
+        if written is not None:
+            written.result()
+        return order
+
+    async def update_async(self, order_id: int, changes):
+        """Async form of update()"""
+        order, written = self._submit_update(order_id, changes)
+        if written is not None:
+            await asyncio.wrap_future(written)
+        return order
+
+    def replace(self, data):
+        """Swap in a whole order history"""
+        with self.lock:
+            self._build_indexes({order["id"]: order for order in data.get("orders", [])})
+            written = self._writer.submit(self.storage.replace_orders, self._orders)
+        written.result()
+
+
+order_store = OrderStore()
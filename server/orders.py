@@ -1,9 +1,21 @@
-import json
 from fastapi import HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
+from catalog import catalog
+from sequences import sequences
+from order_store import order_store
+from inventory import (
+    reserve_stock, release_stock, reserve_stock_async, release_stock_async,
+    take_stock_async, persist_stock_async
+)
+from storage import run_io
+from metrics import span
+from pagination import page_ids, project
+from events import events
+from fastjson import FragmentCache, join_list
+from idempotency import IdempotencyStore, fingerprint
 
 class OrderStatus(str, Enum):
     PENDING = "pending"
@@ -48,97 +60,84 @@ class Order(BaseModel):
 
 class OrdersResponse(BaseModel):
     orders: List[Order]
+    next_cursor: Optional[str] = None
 
 class OrderStatusUpdate(BaseModel):
     status: OrderStatus
     estimated_delivery_time: Optional[str] = None
 
+MAX_BATCH_ORDERS = 1000
+
+class BatchOrderRequest(BaseModel):
+    orders: List[OrderCreate] = Field(min_length=1, max_length=MAX_BATCH_ORDERS)
+
+class BatchOrderError(BaseModel):
+    status_code: int
+    detail: str
+
+class BatchOrderResult(BaseModel):
+    index: int
+    order: Optional[Order] = None
+    error: Optional[BatchOrderError] = None
+
+class BatchOrderResponse(BaseModel):
+    results: List[BatchOrderResult]
+    created: int
+    failed: int
+
+# Results of POST /orders by Idempotency-Key, for safe client retries
+order_idempotency = IdempotencyStore()
+
 def load_restaurant_data():
-    """Load restaurant data from sample.json"""
-    try:
-        with open("sample.json", "r") as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {"rest_list": []}
+    """Load restaurant data from the in-memory catalog"""
+    return catalog.data()
 
 def save_restaurant_data(data):
-    """Save restaurant data to sample.json"""
-    with open("sample.json", "w") as file:
-        json.dump(data, file, indent=4)
+    """Save restaurant data through the catalog store"""
+    catalog.replace(data)
 
 def load_orders_data():
-    """Load orders data from orders.json"""
-    try:
-        with open("orders.json", "r") as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {"orders": []}
+    """Load orders data from the order store"""
+    return {"orders": order_store.all()}
 
 def save_orders_data(data):
-    """Save orders data to orders.json"""
-    with open("orders.json", "w") as file:
-        json.dump(data, file, indent=4)
+    """Replace the whole order history and snapshot it to orders.json"""
+    order_store.replace(data)
+
+def max_order_id() -> int:
+    """Highest order ID in the order store, used to seed the allocator"""
+    data = load_orders_data()
+    return max((order["id"] for order in data.get("orders", [])), default=0)
+
+sequences.register("order", max_order_id)
 
 def get_next_order_id():
     """Get the next available order ID"""
-    data = load_orders_data()
-    if "orders" not in data:
-        data["orders"] = []
-        save_orders_data(data)
-        return 1
-    
-    if not data["orders"]:
-        return 1
-    
-    return max(order["id"] for order in data["orders"]) + 1
+    return sequences.next_id("order")
 
 def find_restaurant_by_id(restaurant_id: int):
     """Find restaurant by ID"""
-    data = load_restaurant_data()
-    for restaurant in data["rest_list"]:
-        if restaurant["id"] == restaurant_id:
-            return restaurant
-    return None
+    return catalog.get_restaurant(restaurant_id)
 
 def find_item_in_restaurant(restaurant, item_id: int):
     """Find item in restaurant by ID"""
-    for item in restaurant["items"]:
-        if item["id"] == item_id:
-            return item
-    return None
+    return catalog.get_item(restaurant["id"], item_id)
 
-def create_order(order_data: OrderCreate) -> Order:
-    """Create a new order"""
-    # Find restaurant
-    restaurant = find_restaurant_by_id(order_data.restaurant_id)
-    if not restaurant:
-        raise HTTPException(status_code=404, detail="Restaurant not found")
-    
-    # Validate items and calculate total
+def order_lines(order_data: OrderCreate):
+    """(item_id, quantity) pairs of an order request"""
+    return [(order_item.item_id, order_item.quantity) for order_item in order_data.items]
+
+def build_order(order_data: OrderCreate, order_id: int, restaurant, reserved_items) -> Order:
+    """Build the order record from reserved items"""
+    with span("model"):
+        return _build_order(order_data, order_id, restaurant, reserved_items)
+
+def _build_order(order_data: OrderCreate, order_id: int, restaurant, reserved_items) -> Order:
+    # Calculate total from the reserved items
     order_items = []
     total_amount = 0.0
     
-    for order_item in order_data.items:
-        item = find_item_in_restaurant(restaurant, order_item.item_id)
-        if not item:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Item with ID {order_item.item_id} not found in restaurant"
-            )
-        
-        if order_item.quantity <= 0:
-            raise HTTPException(
-                status_code=400, 
-                detail="Quantity must be greater than 0"
-            )
-        
-        # Check availability - item must have sufficient quantity
-        if item["available_quantity"] < order_item.quantity:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Item not available - available_quantity: {item['available_quantity']}"
-            )
-        
+    for item, order_item in zip(reserved_items, order_data.items):
         subtotal = item["price"] * order_item.quantity
         total_amount += subtotal
         
@@ -150,30 +149,12 @@ def create_order(order_data: OrderCreate) -> Order:
             subtotal=subtotal
         ))
     
-    # All validations passed, now update inventory
-    # Load fresh restaurant data and update available quantities
-    restaurant_data = load_restaurant_data()
-    for order_item in order_data.items:
-        for restaurant in restaurant_data["rest_list"]:
-            if restaurant["id"] == order_data.restaurant_id:
-                for item in restaurant["items"]:
-                    if item["id"] == order_item.item_id:
-                        item["available_quantity"] -= order_item.quantity
-                        break
-                break
-    
-    # Save updated restaurant data
-    save_restaurant_data(restaurant_data)
-    
-    # Create order
-    order_id = get_next_order_id()
     created_at = datetime.now().isoformat()
     
     # Estimate delivery time (30-45 minutes from now)
-    from datetime import timedelta
     estimated_delivery = datetime.now() + timedelta(minutes=35)
     
-    new_order = Order(
+    return Order(
         id=order_id,
         restaurant_id=restaurant["id"],
         restaurant_name=restaurant["name"],
@@ -187,87 +168,173 @@ def create_order(order_data: OrderCreate) -> Order:
         created_at=created_at,
         estimated_delivery_time=estimated_delivery.isoformat()
     )
+
+def create_order(order_data: OrderCreate) -> Order:
+    """Create a new order"""
+    # Check and reserve stock for every line in one atomic step
+    lines = order_lines(order_data)
+    restaurant, reserved_items = reserve_stock(order_data.restaurant_id, lines)
     
-    # Add order to orders data
-    orders_data = load_orders_data()
-    if "orders" not in orders_data:
-        orders_data["orders"] = []
+    # Append order to the order journal, handing the stock back if that fails
+    try:
+        new_order = build_order(order_data, get_next_order_id(), restaurant, reserved_items)
+        order_store.add(new_order.model_dump())
+    except Exception:
+        release_stock(order_data.restaurant_id, lines)
+        raise
     
-    orders_data["orders"].append(new_order.model_dump())
+    events.publish("order.created", order_store.get(new_order.id))
+    return new_order
+
+async def create_order_async(order_data: OrderCreate) -> Order:
+    """Create a new order without blocking the event loop on storage"""
+    lines = order_lines(order_data)
+    with span("stock"):
+        restaurant, reserved_items = await reserve_stock_async(order_data.restaurant_id, lines)
     
-    # Save updated orders data
-    save_orders_data(orders_data)
+    try:
+        order_id = await run_io(get_next_order_id)
+        new_order = build_order(order_data, order_id, restaurant, reserved_items)
+        with span("order_write"):
+            await order_store.add_async(new_order.model_dump())
+    except Exception:
+        await release_stock_async(order_data.restaurant_id, lines)
+        raise
     
+    events.publish("order.created", order_store.get(new_order.id))
     return new_order
 
+async def create_orders_batch_async(batch: List[OrderCreate]) -> BatchOrderResponse:
+    """Create many orders with one stock write, one ID block and one order write
+
+    Each order is checked and reserved on its own, so one bad order does not
+    fail the rest; the response reports every order by its index.
+    """
+    results = [None] * len(batch)
+    reserved = []
+    changed = []
+    new_orders = []
+    
+    # Check and reserve stock order by order, collecting the touched items,
+    # then one stock write, ID block and journal write for the whole batch;
+    # if anything but a rejected order fails every reservation is given back
+    try:
+        for index, order_data in enumerate(batch):
+            try:
+                lines = order_lines(order_data)
+                restaurant, reserved_items, order_changed = await take_stock_async(order_data.restaurant_id, lines)
+            except HTTPException as error:
+                results[index] = BatchOrderResult(index=index, error=BatchOrderError(status_code=error.status_code, detail=str(error.detail)))
+                continue
+            reserved.append((index, order_data, lines, restaurant, reserved_items))
+            changed.extend(order_changed)
+        
+        if reserved:
+            await persist_stock_async(changed)
+            order_ids = await run_io(sequences.reserve_block, "order", len(reserved))
+            new_orders = [
+                build_order(order_data, order_id, restaurant, reserved_items)
+                for order_id, (_, order_data, _, restaurant, reserved_items) in zip(order_ids, reserved)
+            ]
+            await order_store.add_many_async([new_order.model_dump() for new_order in new_orders])
+    except Exception:
+        for _, order_data, lines, _, _ in reserved:
+            await release_stock_async(order_data.restaurant_id, lines)
+        raise
+    
+    for (index, *_), new_order in zip(reserved, new_orders):
+        events.publish("order.created", order_store.get(new_order.id))
+        results[index] = BatchOrderResult(index=index, order=new_order)
+    
+    return BatchOrderResponse(results=results, created=len(reserved), failed=len(batch) - len(reserved))
+
+async def create_order_once_async(order_data: OrderCreate, idempotency_key: str):
+    """Create an order at most once per idempotency key; returns (order, replayed)"""
+    return await order_idempotency.run_async(idempotency_key, fingerprint(order_data.model_dump_json()),
+                                             lambda: create_order_async(order_data))
+
 def get_all_orders() -> List[Order]:
     """Get all orders"""
-    data = load_orders_data()
-    if "orders" not in data:
-        return []
-    
     orders = []
-    for order_data in data["orders"]:
+    for order_data in order_store.all():
         orders.append(Order(**order_data))
     
     return orders
 
 def get_order_by_id(order_id: int) -> Order:
     """Get order by ID"""
-    data = load_orders_data()
-    if "orders" not in data:
+    order_data = order_store.get(order_id)
+    if order_data is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    for order_data in data["orders"]:
-        if order_data["id"] == order_id:
-            return Order(**order_data)
+    return Order(**order_data)
+
+def status_changes(status_update: OrderStatusUpdate):
+    """Fields to change for a status update"""
+    # Update status
+    changes = {"status": status_update.status.value}
+    
+    # Update estimated delivery time if provided
+    if status_update.estimated_delivery_time:
+        changes["estimated_delivery_time"] = status_update.estimated_delivery_time
     
-    raise HTTPException(status_code=404, detail="Order not found")
+    return changes
 
 def update_order_status(order_id: int, status_update: OrderStatusUpdate) -> Order:
     """Update order status"""
-    data = load_orders_data()
-    if "orders" not in data:
+    # Append the change to the order journal
+    order_data = order_store.update(order_id, status_changes(status_update))
+    if order_data is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    for i, order_data in enumerate(data["orders"]):
-        if order_data["id"] == order_id:
-            # Update status
-            order_data["status"] = status_update.status.value
-            
-            # Update estimated delivery time if provided
-            if status_update.estimated_delivery_time:
-                order_data["estimated_delivery_time"] = status_update.estimated_delivery_time
-            
-            # Save changes
-            save_orders_data(data)
-            
-            return Order(**order_data)
+    events.publish("order.status_changed", order_data)
+    return Order(**order_data)
+
+async def update_order_status_async(order_id: int, status_update: OrderStatusUpdate) -> Order:
+    """Update order status without blocking the event loop on storage"""
+    order_data = await order_store.update_async(order_id, status_changes(status_update))
+    if order_data is None:
+        raise HTTPException(status_code=404, detail="Order not found")
     
-    raise HTTPException(status_code=404, detail="Order not found")
+    events.publish("order.status_changed", order_data)
+    return Order(**order_data)
 
 def get_orders_by_restaurant(restaurant_id: int) -> List[Order]:
     """Get all orders for a specific restaurant"""
-    data = load_orders_data()
-    if "orders" not in data:
-        return []
-    
-    orders = []
-    for order_data in data["orders"]:
-        if order_data["restaurant_id"] == restaurant_id:
-            orders.append(Order(**order_data))
-    
-    return orders
+    return [Order(**order_store.get(order_id)) for order_id in order_store.ids(restaurant_id=restaurant_id)]
 
 def get_orders_by_status(status: OrderStatus) -> List[Order]:
     """Get all orders with a specific status"""
-    data = load_orders_data()
-    if "orders" not in data:
-        return []
-    
-    orders = []
-    for order_data in data["orders"]:
-        if order_data["status"] == status.value:
-            orders.append(Order(**order_data))
-    
-    return orders
\ No newline at end of file
+    return [Order(**order_store.get(order_id)) for order_id in order_store.ids(status=status)]
+
+def get_order_ids(status: Optional[OrderStatus] = None, restaurant_id: Optional[int] = None) -> List[int]:
+    """Ascending IDs of the orders matching the filters"""
+    return order_store.ids(status=status, restaurant_id=restaurant_id)
+
+def get_orders_page(ids: List[int], limit: Optional[int] = None, cursor: Optional[str] = None,
+                    descending: bool = False, fields: Optional[List[str]] = None):
+    """One page of orders cut from ascending ids
+
+    Returns (orders, next_cursor). Orders are Order models, or plain dicts
+    with just the selected fields when fields is given.
+    """
+    page, next_cursor = page_ids(ids, limit, cursor, descending)
+    records = order_store.get_many(page)
+    if fields:
+        return [project(order_data, fields) for order_data in records], next_cursor
+    return [Order(**order_data) for order_data in records], next_cursor
+
+# Encoded orders, reused until the order changes
+order_fragments = FragmentCache()
+
+def encode_order(order_data) -> bytes:
+    """Validate and encode one order exactly as the Order response model does"""
+    with span("encode"):
+        return Order(**order_data).model_dump_json().encode()
+
+def get_orders_page_json(ids: List[int], limit: Optional[int] = None, cursor: Optional[str] = None,
+                         descending: bool = False) -> bytes:
+    """Encoded OrdersResponse body for one page, built from cached order fragments"""
+    page, next_cursor = page_ids(ids, limit, cursor, descending)
+    fragments = [order_fragments.get(order["id"], order, encode_order) for order in order_store.get_many(page)]
+    return join_list("orders", fragments, next_cursor=next_cursor)
@@ -0,0 +1,66 @@
+"""Keyset pagination and field projection for list endpoints.
+
+Pages are cut from an ascending list of IDs with bisect, and the cursor
+carries the last ID returned plus the sort direction. Because the position
+is a key rather than an offset, a cursor stays correct while new records
+are appended: in ascending order they show up on later pages, in
+descending order they sort before the cursor and are never repeated.
+"""
+import base64
+import json
+from bisect import bisect_left, bisect_right
+from typing import List, Optional
+from fastapi import HTTPException
+
+MAX_LIMIT = 1000
+
+
+def encode_cursor(last_id: int, descending: bool) -> str:
+    payload = json.dumps({"after": last_id, "desc": descending}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, descending: bool) -> int:
+    """Return the last ID of the previous page, or raise 400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        last_id, cursor_descending = int(payload["after"]), bool(payload["desc"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_descending != descending:
+        raise HTTPException(status_code=400, detail="Cursor was issued for a different sort order")
+    return last_id
+
+
+def page_ids(ids: List[int], limit: Optional[int], cursor: Optional[str], descending: bool):
+    """Cut one page from ascending ids; returns (page ids, next cursor or None)"""
+    after = decode_cursor(cursor, descending) if cursor else None
+    if descending:
+        end = bisect_left(ids, after) if after is not None else len(ids)
+        start = max(0, end - limit) if limit else 0
+        page = ids[start:end][::-1]
+        more = start > 0
+    else:
+        start = bisect_right(ids, after) if after is not None else 0
+        end = start + limit if limit else len(ids)
+        page = ids[start:end]
+        more = end < len(ids)
+    next_cursor = encode_cursor(page[-1], descending) if more and page else None
+    return page, next_cursor
+
+
+def parse_fields(fields: Optional[str], model) -> Optional[List[str]]:
+    """Split a comma-separated field list and check it against model, or raise 400"""
+    if not fields:
+        return None
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(unknown)}")
+    return selected
+
+
+def project(record, fields: List[str]):
+    """Keep only the selected fields of a record dict"""
+    return {field: record.get(field) for field in fields}
@@ -0,0 +1,214 @@
+"""Opt-in sampling profiler for diagnosing slow requests in a live server.
+
+Nothing is sampled until an admin turns profiling on with
+PUT /admin/profile, giving the fraction of requests to follow, for how
+long, and how often to sample them. ProfilerMiddleware picks requests at
+that rate; while any are in flight a background thread wakes every
+interval and records where each of them is: the chain of coroutines it
+is awaiting, from the route handler in main.py through the orders.py
+functions below it, plus the plain function calls under the innermost
+one when the request is running right then. A request waiting on a
+future (storage work on the I/O executor, a batched flush) ends in an
+"<await Future>" frame, so time spent waiting shows up as well as time
+spent computing.
+
+Samples are added up per stack and GET /admin/profile/stacks returns
+them in the collapsed format flamegraph.pl and speedscope read, one
+"route;frame;frame count" line per stack. Each worker process keeps its
+own profile.
+
+The admin endpoints answer only when DELIVERY_ADMIN_TOKEN is set and the
+X-Admin-Token header matches it.
+"""
+import asyncio
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+from fastapi import Header, HTTPException
+from pydantic import BaseModel, Field
+
+ADMIN_TOKEN = os.environ.get("DELIVERY_ADMIN_TOKEN", "")
+MAX_PROFILE_SECONDS = 3600
+# Frames above the first one from this module are framework code
+HANDLER_MODULE = "main"
+
+
+class ProfileSettings(BaseModel):
+    rate: float = Field(..., ge=0, le=1, description="Fraction of requests to sample; 0 stops profiling")
+    duration_seconds: float = Field(60, gt=0, le=MAX_PROFILE_SECONDS)
+    interval_ms: float = Field(5, ge=1, le=1000)
+
+
+class ProfileStatus(BaseModel):
+    active: bool
+    rate: float
+    interval_ms: float
+    remaining_seconds: float
+    sampled_requests: int
+    samples: int
+    stacks: int
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency for admin endpoints: 404 unless enabled, 403 on a wrong token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}"
+
+
+def task_stack(task, thread_id: int):
+    """Frame names of a task from its outermost coroutine down, innermost last"""
+    frames = []
+    awaiting = task.get_coro()
+    leaf = None
+    while awaiting is not None:
+        frame = getattr(awaiting, "cr_frame", None) or getattr(awaiting, "gi_frame", None)
+        if frame is None:
+            # A future, or a coroutine that has just finished
+            if not hasattr(awaiting, "cr_frame") and not hasattr(awaiting, "gi_frame"):
+                kind = type(awaiting).__name__
+                leaf = "<await Future>" if kind == "FutureIter" else f"<await {kind}>"
+            break
+        frames.append(frame)
+        awaiting = getattr(awaiting, "cr_await", None) or getattr(awaiting, "gi_yieldfrom", None)
+    names = [frame_name(frame) for frame in frames]
+    if leaf is not None:
+        names.append(leaf)
+    elif frames:
+        # Running now: add the plain calls under the innermost coroutine
+        running = sys._current_frames().get(thread_id)
+        calls = []
+        while running is not None and running is not frames[-1]:
+            calls.append(frame_name(running))
+            running = running.f_back
+        if running is not None:
+            names.extend(reversed(calls))
+    for index, name in enumerate(names):
+        if name.startswith(HANDLER_MODULE + "."):
+            return names[index:]
+    return ["(framework)"]
+
+
+class Profiler:
+    """Picks requests to follow and samples their stacks on a background thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stacks = Counter()
+        # Request number -> (task, ASGI scope, thread ID) of sampled requests in flight
+        self._active = {}
+        self._next_request = 0
+        self._sampled_requests = 0
+        self._thread = None
+        self._wake = threading.Event()
+        self.rate = 0.0
+        self.interval = 0.005
+        self.deadline = 0.0
+
+    @property
+    def active(self) -> bool:
+        return self.rate > 0 and time.monotonic() < self.deadline
+
+    def configure(self, settings: ProfileSettings):
+        """Start, adjust or (rate 0) stop profiling; samples so far are kept"""
+        with self._lock:
+            self.rate = settings.rate
+            self.interval = settings.interval_ms / 1000
+            self.deadline = time.monotonic() + settings.duration_seconds if settings.rate else 0.0
+            if self.rate and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def status(self) -> ProfileStatus:
+        with self._lock:
+            return ProfileStatus(
+                active=self.active,
+                rate=self.rate,
+                interval_ms=self.interval * 1000,
+                remaining_seconds=max(0.0, self.deadline - time.monotonic()),
+                sampled_requests=self._sampled_requests,
+                samples=sum(self._stacks.values()),
+                stacks=len(self._stacks),
+            )
+
+    def collapsed(self, reset: bool = False) -> str:
+        """Samples per stack in flamegraph.pl's collapsed format, optionally starting afresh"""
+        with self._lock:
+            stacks = sorted(self._stacks.items())
+            if reset:
+                self._stacks.clear()
+                self._sampled_requests = 0
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def start_request(self, scope):
+        """Follow the current request if it is picked; returns a key for finish_request"""
+        if not self.active or random.random() >= self.rate:
+            return None
+        task = asyncio.current_task()
+        if task is None:
+            return None
+        with self._lock:
+            self._next_request += 1
+            key = self._next_request
+            self._active[key] = (task, scope, threading.get_ident())
+            self._sampled_requests += 1
+        return key
+
+    def finish_request(self, key):
+        with self._lock:
+            self._active.pop(key, None)
+
+    def sample(self):
+        """Record one sample of every followed request"""
+        with self._lock:
+            requests = list(self._active.values())
+        stacks = []
+        for task, scope, thread_id in requests:
+            route = scope.get("route")
+            name = f"{scope['method']} {getattr(route, 'path', None) or scope['path']}"
+            stacks.append(";".join([name] + task_stack(task, thread_id)))
+        with self._lock:
+            self._stacks.update(stacks)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self.active:
+                    self._thread = None
+                    return
+                interval = self.interval
+            self._wake.wait(interval)
+            self._wake.clear()
+            self.sample()
+
+
+profiler = Profiler()
+
+
+class ProfilerMiddleware:
+    """ASGI middleware handing requests to the profiler while it is on"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.active:
+            await self.app(scope, receive, send)
+            return
+        key = profiler.start_request(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if key is not None:
+                profiler.finish_request(key)
@@ -0,0 +1,84 @@
+"""Serialized responses for catalog reads, revalidated with ETags.
+
+The catalog store carries a version number that every mutation bumps.
+Catalog read endpoints build their body once per version and key, and later
+requests reuse the stored bytes until the version moves on. The ETag is a
+hash of the body, so it identifies the bytes themselves and stays valid
+across restarts and between workers; clients and any CDN in front of the
+server revalidate with If-None-Match and get an empty 304 when nothing
+changed.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastjson import dumps
+from metrics import span
+
+CACHE_CONTROL = os.environ.get("DELIVERY_CATALOG_CACHE_CONTROL", "public, no-cache")
+MAX_ENTRIES = 1024
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """RFC 9110 weak comparison of an If-None-Match header against etag"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class ResponseCache:
+    """LRU of (version, body, etag) per request key"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version: int, build):
+        """Return (body, etag) for key at version, calling build() on a miss
+
+        build() returns the encoded body, or content to be serialized the
+        way FastAPI would serialize it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+        with span("encode"):
+            body = build()
+            if not isinstance(body, bytes):
+                body = dumps(jsonable_encoder(body))
+        etag = make_etag(body)
+        with self._lock:
+            self._entries[key] = (version, body, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body, etag
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def cached_response(cache: ResponseCache, request: Request, version: int, build) -> Response:
+    """Serve a cached body for this request, or 304 if the client already has it"""
+    key = (request.url.path, request.url.query)
+    body, etag = cache.get(key, version, build)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,365 @@
+"""Full-text search over restaurants and menu items.
+
+An inverted index maps every word of item names and descriptions and of
+restaurant names and locations to the documents containing it, with
+separate postings for the name (weighted higher) and the other text.
+Words are case- and accent-folded. Each query word matches
+
+    the same word                      weight 1.0
+    longer words it is a prefix of     weight 0.8   ("chick" -> "chicken")
+    words one edit away                weight 0.6   ("biryni" -> "biryani"),
+                                                    only if the word itself
+                                                    is not in the index
+
+and a document must match every query word. Matches are ranked by the sum
+over query words of weight x field weight x inverse document frequency.
+One-edit neighbours come from a deletion index: every word is stored
+under each of its one-letter deletions, so a query word finds them with
+a handful of dictionary lookups instead of a scan of the vocabulary.
+
+Matches are found with set intersections of the postings, rarest word
+first. When there are more than RANK_LIMIT of them, scoring each one
+would cost more than the query budget, so they are taken best tier first
+instead (documents with every word in the name, then the rest) and only
+the returned page is scored.
+
+Price and stock filters read the live item records, so stock changes
+need no reindexing. The catalog store keeps the index up to date as
+restaurants and items are added or edited and builds it in the
+background on first use after a load.
+"""
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from typing import List, Optional
+from pydantic import BaseModel
+
+MAX_SEARCH_RESULTS = 100
+MIN_PREFIX = 2
+MIN_FUZZY = 4
+MAX_EXPANSIONS = 50
+# Above this many matches, rank by tier instead of scoring each one
+RANK_LIMIT = 500
+NAME_WEIGHT = 2.0
+PREFIX_WEIGHT = 0.8
+FUZZY_WEIGHT = 0.6
+
+WORD = re.compile(r"\w+")
+
+
+class RestaurantHit(BaseModel):
+    id: int
+    name: str
+    location: str
+    score: float
+
+
+class ItemHit(BaseModel):
+    id: int
+    restaurant_id: int
+    restaurant_name: str
+    name: str
+    price: float
+    description: Optional[str] = None
+    available_quantity: int = 0
+    score: float
+
+
+class SearchResponse(BaseModel):
+    restaurants: List[RestaurantHit]
+    items: List[ItemHit]
+
+
+def words(text) -> List[str]:
+    """Case- and accent-folded words of text"""
+    if not text:
+        return []
+    folded = unicodedata.normalize("NFKD", str(text).casefold())
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+    return WORD.findall(folded)
+
+
+def deletions(word: str):
+    return {word[:index] + word[index + 1:] for index in range(len(word))}
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """True if a and b differ by one insertion, deletion, substitution or transposition"""
+    if abs(len(a) - len(b)) > 1 or a == b:
+        return a == b
+    start = 0
+    while start < min(len(a), len(b)) and a[start] == b[start]:
+        start += 1
+    if len(a) == len(b):
+        return a[start + 1:] == b[start + 1:] or (
+            a[start + 2:] == b[start + 2:] and a[start:start + 2] == b[start:start + 2][::-1]
+        )
+    longer, shorter = (a, b) if len(a) > len(b) else (b, a)
+    return longer[start + 1:] == shorter[start:]
+
+
+class SearchIndex:
+    """Inverted index of restaurant and item documents with prefix and typo matching"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Drop everything; the catalog store rebuilds on the next search"""
+        with self._lock:
+            self.built = False
+            # Document number -> [kind, restaurant, item or None, name words, other words]
+            self._docs = []
+            self._doc_numbers = {}
+            # Kind -> (name postings, other postings), each word -> document numbers
+            self._fields = {"restaurant": ({}, {}), "item": ({}, {})}
+            self._document_frequency = {}
+            # Sorted vocabulary for prefix lookups, deletion variants for typos
+            self._terms = []
+            self._deletions = {}
+
+    def build(self, restaurants):
+        """Index a whole catalog"""
+        with self._lock:
+            for restaurant in restaurants:
+                self._add(restaurant, None)
+                for item in restaurant["items"]:
+                    self._add(restaurant, item)
+            # Sorted once here rather than kept sorted term by term
+            self._terms = sorted(self._document_frequency)
+            self.built = True
+
+    def index_restaurant(self, restaurant):
+        """Add or re-index a restaurant's own name and location"""
+        with self._lock:
+            if self.built:
+                self._add(restaurant, None)
+
+    def index_item(self, restaurant, item):
+        """Add or re-index an item's name and description"""
+        with self._lock:
+            if self.built:
+                self._add(restaurant, item)
+
+    def _add(self, restaurant, item):
+        if item is None:
+            key = ("restaurant", restaurant["id"])
+            name, text = words(restaurant.get("name")), words(restaurant.get("location"))
+        else:
+            key = ("item", restaurant["id"], item["id"])
+            name, text = words(item.get("name")), words(item.get("description"))
+        number = self._doc_numbers.get(key)
+        before = set()
+        if number is not None:
+            before = self._unpost(number)
+        else:
+            number = len(self._docs)
+            self._docs.append(None)
+            self._doc_numbers[key] = number
+        self._docs[number] = [key[0], restaurant, item, name, text]
+        for postings, terms in zip(self._fields[key[0]], (name, text)):
+            for term in terms:
+                postings.setdefault(term, set()).add(number)
+        after = set(name) | set(text)
+        for term in after - before:
+            self._count(term, 1)
+        for term in before - after:
+            self._count(term, -1)
+
+    def _unpost(self, number):
+        """Remove a document from the postings; returns the words it had"""
+        kind, _, _, name, text = self._docs[number]
+        for postings, terms in zip(self._fields[kind], (name, text)):
+            for term in terms:
+                documents = postings.get(term)
+                if documents is not None:
+                    documents.discard(number)
+                    if not documents:
+                        del postings[term]
+        return set(name) | set(text)
+
+    def _count(self, term, delta):
+        count = self._document_frequency.get(term, 0) + delta
+        if count > 0:
+            if term not in self._document_frequency:
+                if self.built:
+                    insort(self._terms, term)
+                if len(term) >= MIN_FUZZY:
+                    for variant in deletions(term):
+                        self._deletions.setdefault(variant, set()).add(term)
+            self._document_frequency[term] = count
+            return
+        self._document_frequency.pop(term, None)
+        index = bisect_left(self._terms, term)
+        if index < len(self._terms) and self._terms[index] == term:
+            del self._terms[index]
+        if len(term) >= MIN_FUZZY:
+            for variant in deletions(term):
+                similar = self._deletions.get(variant)
+                if similar is not None:
+                    similar.discard(term)
+                    if not similar:
+                        del self._deletions[variant]
+
+    def _expand(self, word):
+        """[(term, weight)] matched by one query word"""
+        expansions = []
+        if word in self._document_frequency:
+            expansions.append((word, 1.0))
+        if len(word) >= MIN_PREFIX:
+            start = bisect_left(self._terms, word)
+            end = bisect_left(self._terms, word + "\U0010ffff", start)
+            longer = [term for term in self._terms[start:end] if term != word]
+            if len(longer) > MAX_EXPANSIONS:
+                longer = heapq.nlargest(MAX_EXPANSIONS, longer, key=self._document_frequency.__getitem__)
+            expansions.extend((term, PREFIX_WEIGHT) for term in longer)
+        if len(word) >= MIN_FUZZY and word not in self._document_frequency:
+            similar = set(self._deletions.get(word, ()))
+            for variant in deletions(word):
+                similar.update(self._deletions.get(variant, ()))
+                if variant in self._document_frequency:
+                    similar.add(variant)
+            matched = {term for term, _ in expansions}
+            expansions.extend(
+                (term, FUZZY_WEIGHT) for term in sorted(similar)
+                if term not in matched and within_one_edit(word, term)
+            )
+        return expansions
+
+    def _groups(self, kind, query):
+        """Per query word, [(documents, weight x field weight x idf, in name)] best first"""
+        name_postings, text_postings = self._fields[kind]
+        groups = []
+        for expansions in query:
+            sets = [
+                (postings[term], weight * field * math.log(1 + len(self._docs) / self._document_frequency[term]),
+                 postings is name_postings)
+                for term, weight in expansions
+                for postings, field in ((name_postings, NAME_WEIGHT), (text_postings, 1.0)) if term in postings
+            ]
+            groups.append(sorted(sets, key=lambda entry: -entry[1]))
+        return groups
+
+    def _score(self, number, groups):
+        score = 0.0
+        for sets in groups:
+            # Sets are best first, so the first match scores the word
+            score += next((weight for documents, weight, _ in sets if number in documents), 0.0)
+        return score
+
+    def _ranked(self, kind, query, accept, limit):
+        """Top documents of a kind matching every query word that pass accept()"""
+        groups = self._groups(kind, query)
+        if not all(groups):
+            return []
+        all_sets = [[entry[0] for entry in sets] for sets in groups]
+        sizes = sorted(sum(map(len, sets)) for sets in all_sets)
+        if sizes[0] <= RANK_LIMIT:
+            return self._best(self._intersect(all_sets), groups, accept, limit)
+        # Too many matches to score each one: take them best tier first
+        if len(groups) == 1:
+            # A single word's postings are already best first
+            return self._sorted(self._first(all_sets[0], accept, limit), groups)
+        # Documents whose name has every query word come first
+        hits = self._first([self._intersect([[entry[0] for entry in sets if entry[2]] for sets in groups])], accept, limit)
+        if len(hits) == limit:
+            return self._sorted(hits, groups)
+        if self._dense(sizes, limit):
+            # Matches are common enough that walking the rarest word's
+            # postings finds them sooner than intersecting
+            driving, *others = sorted(all_sets, key=lambda sets: sum(map(len, sets)))
+            return self._sorted(self._first(driving, lambda number: all(
+                any(number in documents for documents in sets) for sets in others
+            ) and accept(number), limit, hits), groups)
+        candidates = self._intersect(all_sets)
+        if len(candidates) <= RANK_LIMIT:
+            return self._best(candidates, groups, accept, limit)
+        return self._sorted(self._first([candidates], accept, limit, hits), groups)
+
+    def _best(self, candidates, groups, accept, limit):
+        scored = ((self._score(number, groups), -number) for number in candidates if accept(number))
+        return [(score, -negative) for score, negative in heapq.nlargest(limit, scored)]
+
+    def _sorted(self, hits, groups):
+        return sorted(((self._score(number, groups), number) for number in hits), key=lambda hit: (-hit[0], hit[1]))
+
+    def _dense(self, sizes, limit):
+        """True if limit matches are expected within the first quarter of the rarest word's postings"""
+        expected = limit
+        for size in sizes[1:]:
+            expected *= len(self._docs) / size
+        return expected * 4 < sizes[0]
+
+    @staticmethod
+    def _first(sources, accept, limit, hits=None):
+        """hits extended with documents from sources that pass accept(), up to limit"""
+        hits = list(hits or ())
+        seen = set(hits)
+        for documents in sources:
+            for number in documents:
+                if number not in seen and accept(number):
+                    seen.add(number)
+                    hits.append(number)
+                    if len(hits) == limit:
+                        return hits
+        return hits
+
+    @staticmethod
+    def _intersect(groups):
+        """Documents in at least one set of every group
+
+        Built as a union of pairwise intersections, smallest groups first,
+        so large posting sets are never copied or walked in Python.
+        """
+        if not groups or not all(groups):
+            return set()
+        groups = sorted(groups, key=lambda sets: sum(len(documents) for documents in sets))
+        if len(groups) == 1:
+            return set().union(*groups[0])
+        matched = set().union(*(left & right for left in groups[0] for right in groups[1]))
+        for sets in groups[2:]:
+            if not matched:
+                break
+            matched = set().union(*(matched & documents for documents in sets))
+        return matched
+
+    def search(self, text: str, limit: int = 20, min_price: Optional[float] = None,
+               max_price: Optional[float] = None, in_stock: bool = False) -> SearchResponse:
+        """Best restaurants and items for text; price and stock filters only apply to items"""
+        with self._lock:
+            query = [self._expand(word) for word in dict.fromkeys(words(text))]
+            if not query or not all(query):
+                return SearchResponse(restaurants=[], items=[])
+
+            def is_wanted_item(number):
+                item = self._docs[number][2]
+                return (
+                    (min_price is None or item["price"] >= min_price)
+                    and (max_price is None or item["price"] <= max_price)
+                    and (not in_stock or item.get("available_quantity", 0) > 0)
+                )
+
+            restaurants = []
+            if min_price is None and max_price is None and not in_stock:
+                restaurants = self._ranked("restaurant", query, lambda number: True, limit)
+            items = self._ranked("item", query, is_wanted_item, limit)
+            return SearchResponse(
+                restaurants=[self._restaurant_hit(number, score) for score, number in restaurants],
+                items=[self._item_hit(number, score) for score, number in items]
+            )
+
+    def _restaurant_hit(self, number, score):
+        restaurant = self._docs[number][1]
+        return RestaurantHit(id=restaurant["id"], name=restaurant["name"], location=restaurant["location"], score=round(score, 4))
+
+    def _item_hit(self, number, score):
+        _, restaurant, item, _, _ = self._docs[number]
+        return ItemHit(
+            id=item["id"], restaurant_id=restaurant["id"], restaurant_name=restaurant["name"],
+            name=item["name"], price=item["price"], description=item.get("description"),
+            available_quantity=item.get("available_quantity", 0), score=round(score, 4)
+        )
@@ -0,0 +1,98 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from filewriter import atomic_write_json
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+SEQUENCES_FILE = "sequences.json"
+ID_BLOCK_SIZE = int(os.environ.get("DELIVERY_ID_BLOCK_SIZE", "1"))
+
+
+class SequenceAllocator:
+    """Hands out unique, monotonically increasing IDs per entity type.
+
+    The high-water mark of every counter ("restaurant", "item", "order") is
+    persisted in sequences.json, so allocating an ID is O(1) no matter how
+    much data exists. A counter missing from the file is seeded once from the
+    callable registered for it, typically a max() over existing records.
+
+    IDs are claimed in blocks of block_size with one locked read-modify-write
+    of the file and then handed out from memory. Several workers can share
+    the file this way without colliding; IDs left over in a block when a
+    worker stops are simply skipped.
+    """
+
+    def __init__(self, path: str = SEQUENCES_FILE, block_size: int = ID_BLOCK_SIZE):
+        self.path = path
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._blocks = {}
+        self._seeds = {}
+
+    def register(self, name: str, seed):
+        """Set the callable used to seed a counter not yet in the file"""
+        self._seeds[name] = seed
+
+    def reset(self, path: str = None, block_size: int = None):
+        """Forget in-memory blocks, optionally switching file or block size"""
+        with self._lock:
+            if path is not None:
+                self.path = path
+            if block_size is not None:
+                self.block_size = block_size
+            self._blocks = {}
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialize read-modify-write of the file across processes"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _read_counters(self):
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def _write_counters(self, counters):
+        atomic_write_json(self.path, counters, indent=4)
+
+    def reserve_block(self, name: str, size: int = None) -> range:
+        """Claim the next size IDs for name and persist the new high-water mark"""
+        size = size or self.block_size
+        with self._file_lock():
+            counters = self._read_counters()
+            if name in counters:
+                current = counters[name]
+            else:
+                seed = self._seeds.get(name)
+                current = seed() if seed else 0
+            counters[name] = current + size
+            self._write_counters(counters)
+        return range(current + 1, current + size + 1)
+
+    def next_id(self, name: str) -> int:
+        """Get the next unique ID for name"""
+        with self._lock:
+            block = self._blocks.get(name)
+            if block is None or block[0] >= block[1]:
+                claimed = self.reserve_block(name)
+                block = self._blocks[name] = [claimed.start, claimed.stop]
+            block[0] += 1
+            return block[0] - 1
+
+
+sequences = SequenceAllocator()
@@ -0,0 +1,831 @@
+"""Persistence backends for the catalog and order stores.
+
+CatalogStore and OrderStore keep the working set in memory; a Storage
+backend is only responsible for loading it and persisting changes.
+JsonStorage keeps the original sample.json / orders.json files and is what
+the tests run against. SqliteStorage keeps indexed tables in a WAL-mode
+database. The backend is chosen with DELIVERY_STORAGE ("json" or "sqlite").
+
+Only SqliteStorage may be shared by several server processes (uvicorn
+--workers N). Every write also records what it touched in a change log,
+and each process pulls the other processes' changes into its in-memory
+stores before serving from them. JsonStorage takes an exclusive lock on
+its files on first write, so a second process fails fast instead of
+silently overwriting the first one's data.
+
+Migrate existing JSON data into SQLite once with:
+
+    python storage.py migrate [delivery.db]
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from filewriter import CoalescingWriter, fsync_directory, atomic_write_json
+from metrics import add_bytes, locked, span
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+CATALOG_FILE = "sample.json"
+ORDERS_FILE = "orders.json"
+JOURNAL_FILE = "orders.journal"
+DATABASE_FILE = "delivery.db"
+# Compact once the journal reaches this fraction of the snapshot's size...
+COMPACT_RATIO = float(os.environ.get("DELIVERY_ORDERS_COMPACT_RATIO", "1.0"))
+# ...but not before it holds this many bytes
+COMPACT_MIN_BYTES = int(os.environ.get("DELIVERY_ORDERS_COMPACT_MIN_BYTES", str(4 << 20)))
+IO_THREADS = int(os.environ.get("DELIVERY_IO_THREADS", "4"))
+CHANGE_LOG_SIZE = int(os.environ.get("DELIVERY_CHANGE_LOG_SIZE", "100000"))
+BUSY_TIMEOUT = 30.0
+
+logger = logging.getLogger(__name__)
+
+# Blocking storage work requested by async handlers runs here rather than in
+# the event loop's default threadpool, so waiting requests hold no thread.
+io_executor = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="storage-io")
+
+
+async def run_io(function, *args):
+    """Run a blocking storage call on the I/O executor and await it"""
+    # In the caller's context, so its storage time counts towards the request
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(io_executor, context.run, function, *args)
+
+
+class Storage:
+    """Interface the in-memory stores use to load and persist data"""
+
+    def load_catalog(self):
+        """Return the catalog as {"rest_list": [...]}"""
+        raise NotImplementedError
+
+    def catalog_stamp(self):
+        """Token that changes when the catalog is modified outside this process"""
+        raise NotImplementedError
+
+    def save_catalog(self, data, restaurants=None, items=None, stock=None):
+        """Persist the catalog.
+
+        restaurants and items optionally name what changed, as restaurant
+        dicts and (restaurant_id, item) pairs, so a backend can write just
+        those rows. None means "anything may have changed". stock lists
+        (restaurant_id, item_id, quantity) levels set outright, which a
+        backend that leaves stock out of item rows writes along with them.
+        """
+        raise NotImplementedError
+
+    def submit_catalog(self, data, restaurants=None, items=None, stock=None) -> Future:
+        """Start save_catalog() without blocking and return its future"""
+        return io_executor.submit(contextvars.copy_context().run, self.save_catalog, data, restaurants, items, stock)
+
+    def load_orders(self):
+        """Return all orders as an insertion-ordered {id: order} dict"""
+        raise NotImplementedError
+
+    def add_order(self, order):
+        raise NotImplementedError
+
+    def update_order(self, order_id: int, changes, order):
+        """Persist field changes; order is the already-updated dict"""
+        raise NotImplementedError
+
+    def replace_orders(self, orders):
+        """Persist a whole new {id: order} history"""
+        raise NotImplementedError
+
+    def write_orders(self, writes):
+        """Persist a batch of ("add", order) / ("update", order_id, changes, order)
+        writes in order; backends override this to commit a batch at once"""
+        for op, *args in writes:
+            if op == "add":
+                self.add_order(*args)
+            else:
+                self.update_order(*args)
+
+    # True when other processes may write the same data. The stores then
+    # poll the stamps below and pull those changes with changes_since().
+    shared = False
+
+    def orders_stamp(self):
+        """Token that changes when orders are modified outside this process"""
+        return None
+
+    def last_change(self) -> int:
+        """Position in the change log to start pulling other processes' changes from"""
+        return 0
+
+    def changes_since(self, seq: int, kinds):
+        """Other processes' changes after seq as (stamp, new seq, [(kind, restaurant_id, row_id)])
+
+        kinds are "restaurant", "item", "order", plus "catalog" and "orders"
+        for whole rewrites. stamp is the stamp as of the same point in time
+        as new seq. The list is None if the log no longer reaches back to
+        seq and everything must be reloaded.
+        """
+        return None, seq, []
+
+    def load_restaurant(self, restaurant_id: int):
+        """One restaurant without its items, or None"""
+        raise NotImplementedError
+
+    def load_item(self, restaurant_id: int, item_id: int):
+        raise NotImplementedError
+
+    def load_order(self, order_id: int):
+        raise NotImplementedError
+
+    @contextmanager
+    def stock_transaction(self, restaurant_id: int):
+        """Cross-process critical section for one restaurant's stock
+
+        Backends that are not shared yield None and inventory persists
+        through the write-behind stock writer as usual. Shared backends
+        yield a StockTransaction holding the stored quantities; the changes
+        recorded on it are committed when the block exits.
+        """
+        yield None
+
+
+class StockTransaction:
+    """Stored stock levels of one restaurant and the changes to commit"""
+
+    def __init__(self, quantities):
+        self.quantities = quantities
+        self.changed = []
+
+    def write(self, changed):
+        """Queue (restaurant_id, item) pairs whose available_quantity changed"""
+        self.changed.extend(changed)
+
+
+def _read_json(path: str):
+    """Parsed JSON file, or {} if it does not exist"""
+    try:
+        with span("read"), open(path, "rb") as file:
+            raw = file.read()
+    except FileNotFoundError:
+        return {}
+    add_bytes("read", len(raw))
+    with span("parse"):
+        return json.loads(raw)
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+# Files this process holds the single-writer lock for, by absolute path
+_owned_files = {}
+_owned_files_lock = threading.Lock()
+
+
+def claim_file(path: str):
+    """Take this process's exclusive lock on path, or raise if another process has it"""
+    if fcntl is None:
+        return
+    path = os.path.abspath(path)
+    with _owned_files_lock:
+        if path in _owned_files:
+            return
+        lock_file = open(path + ".lock", "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(
+                f"{path} is in use by another process. JSON storage supports a single "
+                "server process; run several workers with DELIVERY_STORAGE=sqlite."
+            ) from None
+        _owned_files[path] = lock_file
+
+
+class JsonStorage(Storage):
+    """sample.json for the catalog, orders.json plus an append-only journal for orders.
+
+    Creating an order or changing its status appends one JSON line to the
+    journal instead of rewriting orders.json, which keeps its existing
+    {"orders": [...]} layout and acts as the snapshot. Each batch of
+    appends is fsynced once before its writes are acknowledged. On load the
+    journal is replayed over the snapshot.
+
+    Once the journal has grown to compact_ratio times the snapshot (and at
+    least compact_min_bytes), it is renamed to orders.journal.<n> and new
+    records go to a fresh journal, while a background thread writes a
+    snapshot of the state at the switch and then deletes the renamed
+    journal. Order writes never wait for a snapshot, and each write pays
+    an amortised constant share of the compaction cost however long the
+    history is. On load, renamed journals left by a crash or a failed
+    compaction are replayed before the live one. Replaying a record already
+    in the snapshot is harmless, so a crash at any step loses nothing.
+
+    Stored order dicts are never modified in place: an update replaces the
+    dict, so a snapshot can be written from a shallow copy while appends
+    continue. The stores get copies of their own from load_orders().
+
+    Whole-file writes are atomic (see filewriter), and concurrent catalog
+    saves are coalesced into one write. The catalog stamp is a generation
+    number that only moves when the file changes for a reason other than
+    our own writes, so saving never makes the catalog store reload.
+    """
+
+    def __init__(self, catalog_path: str = CATALOG_FILE, orders_path: str = ORDERS_FILE,
+                 journal_path: str = JOURNAL_FILE, compact_ratio: float = COMPACT_RATIO,
+                 compact_min_bytes: int = COMPACT_MIN_BYTES):
+        self.catalog_path = catalog_path
+        self.orders_path = orders_path
+        self.journal_path = journal_path
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self._orders = {}
+        self._journal_bytes = 0
+        self._snapshot_bytes = 0
+        self._next_journal = 1
+        self._compactor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="orders-compactor")
+        # Future of the background compaction in progress, if any
+        self.compaction = None
+        self._stamp_lock = threading.Lock()
+        self._known_stat = None
+        self._catalog_generation = 0
+        self._catalog_writer = CoalescingWriter(
+            catalog_path, self._record_own_write, indent=4, ensure_ascii=False
+        )
+        self._claimed = False
+
+    def _claim(self):
+        # Taken on first write so read-only users (migrate) can run alongside
+        if not self._claimed:
+            claim_file(self.catalog_path)
+            claim_file(self.orders_path)
+            self._claimed = True
+
+    def _catalog_stat(self):
+        try:
+            stat = os.stat(self.catalog_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _record_own_write(self, replace):
+        with self._stamp_lock:
+            replace()
+            self._known_stat = self._catalog_stat()
+
+    def catalog_stamp(self):
+        with self._stamp_lock:
+            stat = self._catalog_stat()
+            if stat != self._known_stat:
+                self._known_stat = stat
+                self._catalog_generation += 1
+            return self._catalog_generation
+
+    def load_catalog(self):
+        data = _read_json(self.catalog_path)
+        data.setdefault("rest_list", [])
+        return data
+
+    def save_catalog(self, data, restaurants=None, items=None, stock=None):
+        self._claim()
+        self._catalog_writer.write(data)
+
+    def submit_catalog(self, data, restaurants=None, items=None, stock=None) -> Future:
+        self._claim()
+        return self._catalog_writer.submit(data)
+
+    def _renamed_journals(self):
+        """(number, path) of journals switched out for compaction, oldest first"""
+        directory, prefix = os.path.split(os.path.abspath(self.journal_path))
+        renamed = []
+        for name in os.listdir(directory):
+            number = name[len(prefix) + 1:]
+            if name.startswith(prefix + ".") and number.isdigit():
+                renamed.append((int(number), os.path.join(directory, name)))
+        return sorted(renamed)
+
+    def _replay(self, path: str) -> bool:
+        """Apply a journal's records; False if it ends in a torn record"""
+        try:
+            with span("read"), open(path, "rb") as journal:
+                lines = journal.read()
+        except FileNotFoundError:
+            return True
+        add_bytes("read", len(lines))
+        with span("parse"):
+            for line in lines.splitlines():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-append
+                    return False
+                self._apply(record)
+        return True
+
+    def load_orders(self):
+        self._wait_for_compaction()
+        data = _read_json(self.orders_path)
+        self._orders = {order["id"]: order for order in data.get("orders", [])}
+        self._snapshot_bytes = _file_size(self.orders_path)
+        renamed = self._renamed_journals()
+        self._next_journal = renamed[-1][0] + 1 if renamed else 1
+        intact = True
+        for path in [path for _, path in renamed] + [self.journal_path]:
+            intact = self._replay(path) and intact
+        self._journal_bytes = _file_size(self.journal_path)
+        # Compacting also drops a torn tail so later appends start clean
+        if not intact or renamed or self._compaction_due():
+            self.compact()
+        return {order_id: dict(order) for order_id, order in self._orders.items()}
+
+    def _apply(self, record):
+        if record["op"] == "create":
+            order = record["order"]
+            self._orders[order["id"]] = order
+        elif record["op"] == "update":
+            order = self._orders.get(record["id"])
+            if order is not None:
+                self._orders[record["id"]] = {**order, **record["changes"]}
+
+    def _append(self, records):
+        self._claim()
+        with span("dump"):
+            lines = "".join(
+                json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n" for record in records
+            ).encode()
+        # Unbuffered, so nothing of a failed write is left to reach the file on close
+        with open(self.journal_path, "ab", buffering=0) as journal:
+            start = journal.seek(0, os.SEEK_END)
+            try:
+                with span("write"):
+                    written = 0
+                    while written < len(lines):
+                        written += journal.write(lines[written:])
+                # Once per group commit, before any of its writes is acknowledged
+                with span("fsync"):
+                    os.fsync(journal.fileno())
+            except BaseException:
+                # Cut off whatever part of the records got in, so the records
+                # appended after them are not lost behind an unreadable line
+                journal.truncate(start)
+                os.fsync(journal.fileno())
+                raise
+        add_bytes("written", len(lines))
+        self._journal_bytes += len(lines)
+
+    def add_order(self, order):
+        self.write_orders([("add", order)])
+
+    def update_order(self, order_id: int, changes, order):
+        self.write_orders([("update", order_id, changes, order)])
+
+    def write_orders(self, writes):
+        records = []
+        for op, *args in writes:
+            if op == "add":
+                records.append({"op": "create", "order": args[0]})
+            else:
+                order_id, changes, _ = args
+                records.append({"op": "update", "id": order_id, "changes": changes})
+        self._append(records)
+        # Only once the records are on disk, so a failed write leaves no trace
+        for record in records:
+            if record["op"] == "create":
+                record["order"] = dict(record["order"])
+            self._apply(record)
+        if self._compaction_due() and (self.compaction is None or self.compaction.done()):
+            self.compaction = self._compactor.submit(self._write_snapshot, *self._switch_journal())
+
+    def replace_orders(self, orders):
+        self._wait_for_compaction()
+        self._orders = {order_id: dict(order) for order_id, order in orders.items()}
+        self.compact()
+
+    def _compaction_due(self) -> bool:
+        return self._journal_bytes >= max(self.compact_min_bytes, self._snapshot_bytes * self.compact_ratio)
+
+    def _switch_journal(self):
+        """Start a fresh journal; returns (current orders, journals the snapshot will cover)"""
+        self._claim()
+        if os.path.exists(self.journal_path):
+            os.replace(self.journal_path, f"{self.journal_path}.{self._next_journal}")
+            self._next_journal += 1
+            fsync_directory(self.journal_path)
+        self._journal_bytes = 0
+        return list(self._orders.values()), [path for _, path in self._renamed_journals()]
+
+    def _write_snapshot(self, orders, journals):
+        try:
+            atomic_write_json(self.orders_path, {"orders": orders}, indent=4, ensure_ascii=False)
+        except BaseException:
+            # The renamed journals stay and are folded into the next snapshot
+            logger.exception("orders snapshot failed")
+            raise
+        self._snapshot_bytes = _file_size(self.orders_path)
+        for path in journals:
+            os.remove(path)
+
+    def _wait_for_compaction(self):
+        if self.compaction is not None:
+            wait([self.compaction])
+
+    def compact(self):
+        """Write the current state to the snapshot and drop the journal, waiting for it"""
+        self._wait_for_compaction()
+        self._write_snapshot(*self._switch_journal())
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS restaurants (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    location TEXT NOT NULL,
+    description TEXT,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    restaurant_id INTEGER NOT NULL REFERENCES restaurants(id),
+    name TEXT NOT NULL,
+    price REAL NOT NULL,
+    description TEXT,
+    available_quantity INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS items_restaurant ON items(restaurant_id);
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY,
+    restaurant_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_restaurant ON orders(restaurant_id, id);
+CREATE INDEX IF NOT EXISTS orders_status ON orders(status, id);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    restaurant_id INTEGER,
+    row_id INTEGER,
+    origin TEXT NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS restaurants_inserted AFTER INSERT ON restaurants BEGIN
+    INSERT INTO changes (kind, restaurant_id, row_id, origin) VALUES ('restaurant', NEW.id, NEW.id, '');
+END;
+CREATE TRIGGER IF NOT EXISTS restaurants_updated AFTER UPDATE ON restaurants BEGIN
+    INSERT INTO changes (kind, restaurant_id, row_id, origin) VALUES ('restaurant', NEW.id, NEW.id, '');
+END;
+CREATE TRIGGER IF NOT EXISTS items_inserted AFTER INSERT ON items BEGIN
+    INSERT INTO changes (kind, restaurant_id, row_id, origin) VALUES ('item', NEW.restaurant_id, NEW.id, '');
+END;
+CREATE TRIGGER IF NOT EXISTS items_updated AFTER UPDATE ON items BEGIN
+    INSERT INTO changes (kind, restaurant_id, row_id, origin) VALUES ('item', NEW.restaurant_id, NEW.id, '');
+END;
+CREATE TRIGGER IF NOT EXISTS orders_inserted AFTER INSERT ON orders BEGIN
+    INSERT INTO changes (kind, restaurant_id, row_id, origin) VALUES ('order', NEW.restaurant_id, NEW.id, '');
+END;
+CREATE TRIGGER IF NOT EXISTS orders_updated AFTER UPDATE ON orders BEGIN
+    INSERT INTO changes (kind, restaurant_id, row_id, origin) VALUES ('order', NEW.restaurant_id, NEW.id, '');
+END;
+"""
+
+RESTAURANT_COLUMNS = ("id", "name", "location", "description")
+ITEM_COLUMNS = ("id", "name", "price", "description", "available_quantity")
+
+
+def _extra(record, columns, skip=()):
+    """JSON of the keys that have no column of their own, or None"""
+    extra = {key: value for key, value in record.items() if key not in columns and key not in skip}
+    return json.dumps(extra, ensure_ascii=False) if extra else None
+
+
+class SqliteStorage(Storage):
+    """Indexed restaurants, items and orders tables in a WAL-mode SQLite file.
+
+    Catalog saves only touch the rows named by the caller. Saving an
+    existing item leaves its available_quantity column alone, so a menu edit
+    cannot overwrite a sale another process has committed; stock levels are
+    only written inside stock_transaction() or when a save names them in
+    stock. Each order
+    write is a single-row statement, each in its own transaction. Fields
+    without a dedicated column are kept in an "extra" JSON column so the
+    dicts handed back have the same shape as the JSON files. Orders keep the
+    full record in "data" next to the indexed restaurant_id and status.
+
+    The database may be shared by several server processes. Triggers
+    append a (kind, restaurant_id, row_id) entry to the changes table for
+    every inserted or updated row, including edits made outside the server.
+    Our own transactions tag their entries with this instance's origin, and
+    other processes re-read just the rows named after the origin when their
+    data_version moves. The log is trimmed to the last CHANGE_LOG_SIZE
+    entries.
+
+    Writes go through a second connection so that a write waiting for
+    another process's transaction never holds up reads. Stock reservations
+    hold that connection's BEGIN IMMEDIATE transaction while they check and
+    take stock, which serializes them across processes.
+    """
+
+    shared = True
+
+    def __init__(self, path: str = DATABASE_FILE):
+        self.path = path
+        self.origin = uuid.uuid4().hex
+        self._lock = threading.RLock()
+        self._conn = self._connect()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        # Lock order: _write_lock, then _lock
+        self._write_lock = threading.RLock()
+        self._write_conn = self._connect()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=BUSY_TIMEOUT)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def close(self):
+        with locked(self._write_lock), locked(self._lock):
+            self._conn.close()
+            self._write_conn.close()
+
+    def _change_rows(self, changes):
+        return [(kind, restaurant_id, row_id, self.origin) for kind, restaurant_id, row_id in changes]
+
+    @contextmanager
+    def _writing(self):
+        """BEGIN IMMEDIATE on the write connection; claims the logged changes on COMMIT"""
+        with locked(self._write_lock):
+            conn = self._write_conn
+            # Waits for other processes' write transactions
+            with span("db_lock_wait"):
+                conn.execute("BEGIN IMMEDIATE")
+            try:
+                before = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+                yield conn
+                conn.execute("UPDATE changes SET origin = ? WHERE seq > ? AND origin = ''", (self.origin, before))
+                conn.execute("DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?", (CHANGE_LOG_SIZE,))
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            with span("commit"):
+                conn.execute("COMMIT")
+
+    def _transaction(self, statements, changes=()):
+        """Run statements in one write transaction; changes are extra log entries"""
+        statements = list(statements)
+        if changes:
+            statements.append((
+                "INSERT INTO changes (kind, restaurant_id, row_id, origin) VALUES (?, ?, ?, ?)",
+                self._change_rows(changes)
+            ))
+        with self._writing() as conn, span("query"):
+            for sql, params in statements:
+                if isinstance(params, list):
+                    conn.executemany(sql, params)
+                else:
+                    conn.execute(sql, params)
+
+    def catalog_stamp(self):
+        # data_version only moves when another connection (or our own
+        # write connection) commits; our own changes are skipped in the log
+        with locked(self._lock), span("query"):
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    orders_stamp = catalog_stamp
+
+    def last_change(self) -> int:
+        with locked(self._lock), span("query"):
+            return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def changes_since(self, seq: int, kinds):
+        placeholders = ", ".join("?" for _ in kinds)
+        with locked(self._lock), span("query"):
+            # One read transaction, so the stamp matches the log it is returned with
+            self._conn.execute("BEGIN")
+            try:
+                # Separate queries: SQLite only answers a lone MIN or MAX from the index
+                latest = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+                oldest = self._conn.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+                stamp = self._conn.execute("PRAGMA data_version").fetchone()[0]
+                if latest <= seq:
+                    return stamp, seq, []
+                if oldest is None or oldest > seq + 1:
+                    return stamp, latest, None
+                rows = self._conn.execute(
+                    "SELECT kind, restaurant_id, row_id FROM changes"
+                    f" WHERE seq > ? AND seq <= ? AND origin != ? AND kind IN ({placeholders}) ORDER BY seq",
+                    (seq, latest, self.origin, *kinds)
+                ).fetchall()
+                return stamp, latest, rows
+            finally:
+                self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _restaurant_from_row(rest_id, name, location, description, extra):
+        restaurant = {"id": rest_id, "name": name, "location": location}
+        if description is not None:
+            restaurant["description"] = description
+        if extra:
+            restaurant.update(json.loads(extra))
+        return restaurant
+
+    @staticmethod
+    def _item_from_row(row):
+        item = dict(zip(ITEM_COLUMNS, row[:-1]))
+        if row[-1]:
+            item.update(json.loads(row[-1]))
+        return item
+
+    def load_catalog(self):
+        with locked(self._lock), span("query"):
+            restaurants = self._conn.execute(
+                "SELECT id, name, location, description, extra FROM restaurants ORDER BY id"
+            ).fetchall()
+            items = self._conn.execute(
+                "SELECT restaurant_id, id, name, price, description, available_quantity, extra"
+                " FROM items ORDER BY id"
+            ).fetchall()
+        with span("parse"):
+            by_restaurant = {}
+            for restaurant_id, *row in items:
+                by_restaurant.setdefault(restaurant_id, []).append(self._item_from_row(row))
+            rest_list = []
+            for row in restaurants:
+                restaurant = self._restaurant_from_row(*row)
+                restaurant["items"] = by_restaurant.get(restaurant["id"], [])
+                rest_list.append(restaurant)
+        return {"rest_list": rest_list}
+
+    def load_restaurant(self, restaurant_id: int):
+        with locked(self._lock), span("query"):
+            row = self._conn.execute(
+                "SELECT id, name, location, description, extra FROM restaurants WHERE id = ?", (restaurant_id,)
+            ).fetchone()
+        return self._restaurant_from_row(*row) if row else None
+
+    def load_item(self, restaurant_id: int, item_id: int):
+        with locked(self._lock), span("query"):
+            row = self._conn.execute(
+                "SELECT id, name, price, description, available_quantity, extra FROM items"
+                " WHERE id = ? AND restaurant_id = ?", (item_id, restaurant_id)
+            ).fetchone()
+        return self._item_from_row(row) if row else None
+
+    def _restaurant_row(self, restaurant):
+        return (
+            restaurant["id"], restaurant["name"], restaurant["location"],
+            restaurant.get("description"), _extra(restaurant, RESTAURANT_COLUMNS, skip=("items",))
+        )
+
+    def _item_row(self, restaurant_id, item):
+        return (
+            item["id"], restaurant_id, item["name"], item["price"], item.get("description"),
+            item.get("available_quantity", 0), _extra(item, ITEM_COLUMNS)
+        )
+
+    def save_catalog(self, data, restaurants=None, items=None, stock=None):
+        # Rows are built under the lock so the last commit carries the
+        # newest values even when saves of the same row overlap
+        with locked(self._write_lock):
+            self._save_catalog(data, restaurants, items, stock)
+
+    def _save_catalog(self, data, restaurants, items, stock):
+        if restaurants is None and items is None:
+            restaurants = data["rest_list"]
+            items = [(rest["id"], item) for rest in restaurants for item in rest["items"]]
+            statements = [("DELETE FROM items", ()), ("DELETE FROM restaurants", ())]
+            changes = [("catalog", None, None)]
+        else:
+            statements = []
+            changes = []
+        with span("dump"):
+            statements.append((
+                "INSERT OR REPLACE INTO restaurants (id, name, location, description, extra)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [self._restaurant_row(rest) for rest in restaurants or ()]
+            ))
+            statements.append((
+                "INSERT INTO items"
+                " (id, restaurant_id, name, price, description, available_quantity, extra)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (id) DO UPDATE SET restaurant_id = excluded.restaurant_id, name = excluded.name,"
+                " price = excluded.price, description = excluded.description, extra = excluded.extra",
+                [self._item_row(restaurant_id, item) for restaurant_id, item in items or ()]
+            ))
+            statements.append((
+                "UPDATE items SET available_quantity = ? WHERE id = ? AND restaurant_id = ?",
+                [(quantity, item_id, restaurant_id) for restaurant_id, item_id, quantity in stock or ()]
+            ))
+        self._transaction(statements, changes)
+
+    @contextmanager
+    def stock_transaction(self, restaurant_id: int):
+        with self._writing() as conn:
+            quantities = dict(conn.execute(
+                "SELECT id, available_quantity FROM items WHERE restaurant_id = ?", (restaurant_id,)
+            ).fetchall())
+            transaction = StockTransaction(quantities)
+            yield transaction
+            conn.executemany(
+                "UPDATE items SET available_quantity = ? WHERE id = ? AND restaurant_id = ?",
+                [(item["available_quantity"], item["id"], rid) for rid, item in transaction.changed]
+            )
+
+    def load_orders(self):
+        with locked(self._lock), span("query"):
+            rows = self._conn.execute("SELECT data FROM orders ORDER BY id").fetchall()
+        orders = {}
+        with span("parse"):
+            for (data,) in rows:
+                order = json.loads(data)
+                orders[order["id"]] = order
+        return orders
+
+    def load_order(self, order_id: int):
+        with locked(self._lock), span("query"):
+            row = self._conn.execute("SELECT data FROM orders WHERE id = ?", (order_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _order_row(self, order):
+        return (
+            order["id"], order["restaurant_id"], order["status"], order["created_at"],
+            json.dumps(order, ensure_ascii=False)
+        )
+
+    def add_order(self, order):
+        self.write_orders([("add", order)])
+
+    def update_order(self, order_id: int, changes, order):
+        self.write_orders([("update", order_id, changes, order)])
+
+    def write_orders(self, writes):
+        statements = []
+        with span("dump"):
+            for op, *args in writes:
+                if op == "add":
+                    order = args[0]
+                    statements.append((
+                        "INSERT INTO orders (id, restaurant_id, status, created_at, data)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        self._order_row(order)
+                    ))
+                else:
+                    order_id, changes_made, order = args
+                    statements.append((
+                        "UPDATE orders SET status = ?, data = ? WHERE id = ?",
+                        (order["status"], json.dumps(order, ensure_ascii=False), order_id)
+                    ))
+        self._transaction(statements)
+
+    def replace_orders(self, orders):
+        self._transaction([
+            ("DELETE FROM orders", ()),
+            ("INSERT INTO orders (id, restaurant_id, status, created_at, data) VALUES (?, ?, ?, ?, ?)",
+             [self._order_row(order) for order in orders.values()]),
+        ], [("orders", None, None)])
+
+
+def migrate_json_to_sqlite(source: JsonStorage, target: SqliteStorage):
+    """Copy the catalog and order history from the JSON files into SQLite"""
+    target.save_catalog(source.load_catalog())
+    target.replace_orders(source.load_orders())
+
+
+_default_storage = None
+
+
+def create_storage() -> Storage:
+    """Build the backend selected by DELIVERY_STORAGE"""
+    backend = os.environ.get("DELIVERY_STORAGE", "json")
+    if backend == "sqlite":
+        return SqliteStorage(os.environ.get("DELIVERY_DB", DATABASE_FILE))
+    if backend == "json":
+        return JsonStorage()
+    raise ValueError(f"Unknown DELIVERY_STORAGE backend: {backend}")
+
+
+def get_storage() -> Storage:
+    """Process-wide backend, created on first use"""
+    global _default_storage
+    if _default_storage is None:
+        _default_storage = create_storage()
+    return _default_storage
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        sys.exit("usage: python storage.py migrate [database]")
+    database = sys.argv[2] if len(sys.argv) > 2 else DATABASE_FILE
+    migrate_json_to_sqlite(JsonStorage(), SqliteStorage(database))
+    print(f"Migrated {CATALOG_FILE} and {ORDERS_FILE} into {database}")
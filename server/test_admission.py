@@ -0,0 +1,127 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from admission import CATALOG_READS, ORDER_WRITES, AdmissionController, admission, shed_total
+
+client = TestClient(app)
+
+
+def controller(order_writes=1, catalog_reads=1, total=2, budget=1.0, max_queued=10):
+    return AdmissionController(
+        limits={ORDER_WRITES: order_writes, CATALOG_READS: catalog_reads},
+        total=total,
+        budgets={ORDER_WRITES: budget, CATALOG_READS: budget},
+        max_queued=max_queued,
+    )
+
+
+class TestAdmissionController:
+    """Test cases for slots, queues and shedding"""
+
+    def test_queued_requests_wait_for_a_slot_in_order(self):
+        async def scenario():
+            gate = controller(catalog_reads=2, total=2)
+            assert await gate.acquire(CATALOG_READS)
+            assert await gate.acquire(CATALOG_READS)
+            first = asyncio.create_task(gate.acquire(CATALOG_READS))
+            second = asyncio.create_task(gate.acquire(CATALOG_READS))
+            await asyncio.sleep(0)
+            assert gate.depth(CATALOG_READS) == 2 and not first.done()
+
+            gate.release(CATALOG_READS)
+            assert await first and not second.done()
+            gate.release(CATALOG_READS)
+            assert await second
+            assert gate.in_flight[CATALOG_READS] == 2 and gate.depth(CATALOG_READS) == 0
+
+        asyncio.run(scenario())
+
+    def test_order_writes_are_admitted_before_catalog_reads(self):
+        async def scenario():
+            gate = controller(order_writes=2, catalog_reads=2, total=2)
+            assert await gate.acquire(CATALOG_READS)
+            assert await gate.acquire(CATALOG_READS)
+            read = asyncio.create_task(gate.acquire(CATALOG_READS))
+            await asyncio.sleep(0)
+            write = asyncio.create_task(gate.acquire(ORDER_WRITES))
+            await asyncio.sleep(0)
+
+            gate.release(CATALOG_READS)
+            assert await write and not read.done()
+            gate.release(ORDER_WRITES)
+            assert await read
+
+        asyncio.run(scenario())
+
+    def test_requests_past_the_budget_or_queue_are_shed(self):
+        async def scenario():
+            gate = controller(budget=0.01, max_queued=1)
+            timeouts = shed_total.value(ORDER_WRITES, "timeout")
+            full = shed_total.value(ORDER_WRITES, "queue_full")
+            assert await gate.acquire(ORDER_WRITES)
+            waiting = asyncio.create_task(gate.acquire(ORDER_WRITES))
+            await asyncio.sleep(0)
+            assert await gate.acquire(ORDER_WRITES) is False
+            assert await waiting is False
+            assert gate.depth(ORDER_WRITES) == 0 and gate.in_flight[ORDER_WRITES] == 1
+            assert shed_total.value(ORDER_WRITES, "timeout") == timeouts + 1
+            assert shed_total.value(ORDER_WRITES, "queue_full") == full + 1
+
+        asyncio.run(scenario())
+
+    def test_requests_that_cannot_make_the_budget_are_shed_at_once(self):
+        async def scenario():
+            gate = controller(budget=0.5)
+            assert await gate.acquire(ORDER_WRITES)
+            gate.release(ORDER_WRITES, 1.0)
+            assert await gate.acquire(ORDER_WRITES)
+            assert gate.expected_wait(ORDER_WRITES) == 1.0
+            shed = shed_total.value(ORDER_WRITES, "over_budget")
+            assert await asyncio.wait_for(gate.acquire(ORDER_WRITES), 0.1) is False
+            assert shed_total.value(ORDER_WRITES, "over_budget") == shed + 1
+
+        asyncio.run(scenario())
+
+    def test_cancelled_waiters_leave_the_queue(self):
+        async def scenario():
+            gate = controller()
+            assert await gate.acquire(ORDER_WRITES)
+            waiting = asyncio.create_task(gate.acquire(ORDER_WRITES))
+            await asyncio.sleep(0)
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+            assert gate.depth(ORDER_WRITES) == 0
+            gate.release(ORDER_WRITES)
+            assert gate.in_flight[ORDER_WRITES] == 0
+
+        asyncio.run(scenario())
+
+
+class TestAdmissionMiddleware:
+    """Test cases for shedding through the API"""
+
+    def test_full_class_gets_503_with_retry_after(self, monkeypatch):
+        monkeypatch.setitem(admission.limits, CATALOG_READS, 0)
+        monkeypatch.setitem(admission.budgets, CATALOG_READS, 0.01)
+        response = client.get("/restaurants")
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+        assert response.json() == {"detail": "Server busy, retry later"}
+
+        # Other classes and unclassified routes are unaffected
+        assert client.get("/orders").status_code == 200
+        assert client.put("/orders/999999/status", json={"status": "confirmed"}).status_code == 404
+        metrics = client.get("/metrics").text
+        assert 'delivery_requests_total{method="GET",route="/restaurants",status="503"}' in metrics
+        assert 'delivery_admission_shed_total{class="catalog_read",reason="timeout"}' in metrics
+
+    def test_slots_are_released_after_each_request(self):
+        for _ in range(3):
+            assert client.get("/items/1").status_code == 200
+        assert admission.in_flight == {ORDER_WRITES: 0, CATALOG_READS: 0}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
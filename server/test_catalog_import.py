@@ -0,0 +1,77 @@
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from catalog import catalog
+
+client = TestClient(app)
+
+new_menu = {
+    "name": "Dosa Corner",
+    "location": "Jubilee Hills",
+    "items": [
+        {"name": "Masala Dosa", "price": 90, "available_quantity": 20},
+        {"name": "Filter Coffee", "price": 30}
+    ]
+}
+
+
+class TestCatalogImport:
+    """Test cases for the bulk menu import endpoint"""
+
+    def test_creates_restaurant_and_items_with_one_save(self, isolated_storage):
+        saves = []
+        original = isolated_storage.submit_catalog
+        isolated_storage.submit_catalog = lambda *args: (saves.append(args), original(*args))[1]
+
+        response = client.post("/catalog/import", json={"restaurants": [new_menu]})
+        assert response.status_code == 200
+
+        body = response.json()
+        assert body["applied"] is True
+        assert (body["restaurants_created"], body["items_created"]) == (1, 2)
+        restaurant_id = body["rows"][0]["id"]
+        assert len(saves) == 1
+
+        items = client.get(f"/items/{restaurant_id}").json()["item_list"]
+        assert [item["name"] for item in items] == ["Masala Dosa", "Filter Coffee"]
+        assert items[1]["available_quantity"] == 0
+        assert [row["id"] for row in body["rows"][1:]] == [item["id"] for item in items]
+
+    def test_updates_price_and_quantity_of_existing_items(self):
+        update = {"id": 1, "items": [{"id": 101, "price": 199, "available_quantity": 7}]}
+        body = client.post("/catalog/import", json={"restaurants": [update]}).json()
+        assert (body["restaurants_updated"], body["items_updated"]) == (1, 1)
+
+        item = catalog.get_item(1, 101)
+        assert (item["price"], item["available_quantity"]) == (199, 7)
+        assert catalog.get_restaurant(1)["name"]
+
+    def test_reports_every_bad_row_and_applies_nothing(self):
+        before = len(catalog.restaurant_ids())
+        rows = [
+            new_menu,
+            {"id": 999, "name": "Ghost"},
+            {"name": "No Location"},
+            {"id": 1, "items": [{"id": 424242, "price": 1}, {"name": "Free lunch", "price": -5}]}
+        ]
+        response = client.post("/catalog/import", json={"restaurants": rows})
+        assert response.status_code == 422
+
+        errors = {error["path"]: error["detail"] for error in response.json()["errors"]}
+        assert set(errors) == {"restaurants[1]", "restaurants[2]", "restaurants[3].items[0]", "restaurants[3].items[1]"}
+        assert "not found" in errors["restaurants[1]"]
+        assert "price" in errors["restaurants[3].items[1]"]
+        assert len(catalog.restaurant_ids()) == before
+
+    def test_dry_run_reports_without_applying(self):
+        before = len(catalog.restaurant_ids())
+        response = client.post("/catalog/import", params={"dry_run": True}, json={"restaurants": [new_menu]})
+        body = response.json()
+        assert response.status_code == 200
+        assert (body["dry_run"], body["applied"]) == (True, False)
+        assert [row["action"] for row in body["rows"]] == ["create", "create", "create"]
+        assert len(catalog.restaurant_ids()) == before
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
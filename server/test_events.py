@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import pytest
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+from main import app
+from events import EventBus, OVERFLOW, format_sse
+
+client = TestClient(app)
+
+order_data = {
+    "restaurant_id": 1,
+    "items": [{"item_id": 101, "quantity": 1}],
+    "customer_name": "John Doe",
+    "customer_phone": "+1234567890",
+    "delivery_address": "123 Main St, City, State 12345"
+}
+
+
+def make_order(order_id, restaurant_id=1, status="pending"):
+    return {"id": order_id, "restaurant_id": restaurant_id, "status": status}
+
+
+class TestEventBus:
+    """Test cases for order event fan-out"""
+
+    def test_filters_select_matching_orders(self):
+        """Subscribers only receive events for orders matching their filters"""
+        async def scenario():
+            bus = EventBus()
+            by_restaurant = bus.subscribe(restaurant_id=2)
+            by_status = bus.subscribe(status="confirmed")
+            bus.publish("order.created", make_order(1, restaurant_id=1))
+            bus.publish("order.created", make_order(2, restaurant_id=2))
+            bus.publish("order.status_changed", make_order(1, status="confirmed"))
+            return (await by_restaurant.next(1))["order"]["id"], (await by_status.next(1))["order"]["id"], by_restaurant.queue.qsize()
+
+        assert asyncio.run(scenario()) == (2, 1, 0)
+
+    def test_slow_subscriber_overflows(self):
+        """A subscriber that falls behind gets an overflow marker and nothing more"""
+        async def scenario():
+            bus = EventBus()
+            subscription = bus.subscribe(buffer=2)
+            for order_id in range(5):
+                bus.publish("order.created", make_order(order_id))
+            return [await subscription.next(1) for _ in range(3)], subscription.queue.qsize()
+
+        received, remaining = asyncio.run(scenario())
+        assert [event["order"]["id"] for event in received[:2]] == [0, 1]
+        assert received[2] is OVERFLOW
+        assert remaining == 0
+
+    def test_publish_from_another_thread(self):
+        """Events published off the subscriber's loop are delivered to it"""
+        async def scenario():
+            bus = EventBus()
+            subscription = bus.subscribe()
+            thread = threading.Thread(target=bus.publish, args=("order.created", make_order(7)))
+            thread.start()
+            thread.join()
+            return await subscription.next(1)
+
+        assert asyncio.run(scenario())["order"]["id"] == 7
+
+    def test_sse_format(self):
+        """Events render as id/event/data blocks"""
+        message = format_sse({"id": 3, "type": "order.created", "order": {"id": 9}})
+        assert message == 'id: 3\nevent: order.created\ndata: {"id": 9}\n\n'
+
+
+class TestOrderEventEndpoints:
+    """Test cases for the push endpoints"""
+
+    def test_websocket_receives_creation_and_status_change(self):
+        """A WebSocket subscriber sees a new order and its status change"""
+        with client.websocket_connect("/orders/ws?restaurant_id=1") as websocket:
+            order = client.post("/orders", json=order_data).json()
+            client.put(f"/orders/{order['id']}/status", json={"status": "confirmed"})
+
+            created = websocket.receive_json()
+            changed = websocket.receive_json()
+
+        assert created["type"] == "order.created"
+        assert created["order"]["id"] == order["id"]
+        assert changed["type"] == "order.status_changed"
+        assert changed["order"]["status"] == "confirmed"
+
+    def test_websocket_rejects_bad_status_filter(self):
+        """Filters are validated like query parameters"""
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect("/orders/ws?status=lost") as websocket:
+                websocket.receive_json()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,94 @@
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+import fastjson
+from fastjson import FragmentCache, dumps, join_list
+from main import app, ItemModel, MenuResponse, MenuRestaurantModel
+from catalog import catalog
+from order_store import order_store
+from orders import Order, OrdersResponse, get_orders_page_json
+
+client = TestClient(app)
+
+order_data = {
+    "restaurant_id": 1,
+    "items": [{"item_id": 101, "quantity": 2}],
+    "customer_name": "John Doe",
+    "customer_phone": "+1234567890",
+    "delivery_address": "123 Main St, City, State 12345"
+}
+
+
+def model_body(model) -> bytes:
+    """Bytes the response_model path produced before the fast path"""
+    return JSONResponse(jsonable_encoder(model)).body
+
+
+class TestFastPath:
+    """Test that pre-encoded responses match the pydantic response models"""
+
+    def test_orders_match_response_model(self):
+        """Order list bytes are identical to OrdersResponse serialization"""
+        client.post("/orders", json=order_data)
+        orders = [Order(**order) for order in order_store.all()]
+        expected = model_body(OrdersResponse(orders=orders))
+        assert get_orders_page_json(order_store.ids()) == expected
+        assert client.get("/orders").content == expected
+
+    def test_menu_matches_response_model(self):
+        """Menu bytes are identical to MenuResponse serialization"""
+        rest_list = [
+            MenuRestaurantModel(
+                id=rest["id"], name=rest["name"], location=rest["location"],
+                items=[ItemModel(**item) for item in rest["items"]]
+            )
+            for rest in catalog.data()["rest_list"]
+        ]
+        assert client.get("/menu").content == model_body(MenuResponse(rest_list=rest_list))
+
+    def test_status_change_reencodes_order(self):
+        """A cached order fragment is replaced once the order changes"""
+        order = client.post("/orders", json=order_data).json()
+        client.get("/orders")
+        client.put(f"/orders/{order['id']}/status", json={"status": "confirmed"})
+        orders = client.get("/orders").json()["orders"]
+        assert [o["status"] for o in orders if o["id"] == order["id"]] == ["confirmed"]
+
+
+class TestFragmentCache:
+    """Test cases for the encoded-fragment cache"""
+
+    def test_reuses_until_record_changes(self):
+        """encode() runs once per distinct record state"""
+        calls = []
+        def encode(record):
+            calls.append(record)
+            return dumps(record)
+        cache = FragmentCache()
+        record = {"id": 1, "price": 10}
+        assert cache.get(1, record, encode) == b'{"id":1,"price":10}'
+        cache.get(1, record, encode)
+        record["price"] = 12
+        assert cache.get(1, record, encode) == b'{"id":1,"price":12}'
+        assert len(calls) == 2
+
+    def test_evicts_least_recently_used(self):
+        cache = FragmentCache(max_entries=2)
+        for key in range(3):
+            cache.get(key, {"id": key}, dumps)
+        assert list(cache._entries) == [1, 2]
+
+    def test_join_list(self):
+        assert join_list("rows", [b"1", b"2"], next_cursor=None) == b'{"rows":[1,2],"next_cursor":null}'
+
+    def test_dumps_without_orjson(self, monkeypatch):
+        """The stdlib fallback produces the same compact UTF-8 output"""
+        content = {"name": "Café", "price": 2.5, "tags": [None, True]}
+        with_orjson = dumps(content)
+        monkeypatch.setattr(fastjson, "orjson", None)
+        assert dumps(content) == with_orjson == '{"name":"Café","price":2.5,"tags":[null,true]}'.encode()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
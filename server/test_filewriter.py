@@ -0,0 +1,52 @@
+import json
+import os
+import threading
+import time
+import pytest
+from filewriter import CoalescingWriter, atomic_write_json
+
+
+def test_failed_write_keeps_previous_file(tmp_path):
+    """A write that fails midway leaves the old file intact and no temp file"""
+    path = str(tmp_path / "data.json")
+    atomic_write_json(path, {"rest_list": [1, 2, 3]})
+    
+    with pytest.raises(TypeError):
+        atomic_write_json(path, {"rest_list": [object()]})
+    
+    with open(path) as file:
+        assert json.load(file) == {"rest_list": [1, 2, 3]}
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_concurrent_writes_are_coalesced(tmp_path):
+    """A burst of writes costs far fewer disk writes and none are lost"""
+    path = str(tmp_path / "data.json")
+    
+    def slow_replace(replace):
+        time.sleep(0.02)
+        replace()
+    
+    writer = CoalescingWriter(path, slow_replace)
+    state = {"counter": 0}
+    lock = threading.Lock()
+    seen = []
+    
+    def mutate():
+        with lock:
+            state["counter"] += 1
+            mine = state["counter"]
+        writer.write(state)
+        with open(path) as file:
+            seen.append(json.load(file)["counter"] >= mine)
+    
+    threads = [threading.Thread(target=mutate) for _ in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert all(seen)
+    assert writer.writes < 10
+    with open(path) as file:
+        assert json.load(file) == {"counter": 40}
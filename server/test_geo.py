@@ -0,0 +1,125 @@
+import random
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from catalog import catalog
+from geo import GeoIndex, distance_km
+
+client = TestClient(app)
+
+# Around Hyderabad
+CHARMINAR = (17.3616, 78.4747)
+HITECH_CITY = (17.4435, 78.3772)
+SECUNDERABAD = (17.4399, 78.4983)
+
+
+def create(name, position):
+    lat, lon = position
+    response = client.post("/restaurants", json={"name": name, "location": "Hyderabad", "lat": lat, "lon": lon})
+    assert response.status_code == 200
+    return catalog.restaurant_ids()[-1]
+
+
+def nearby(position, **params):
+    lat, lon = position
+    response = client.get("/restaurants/nearby", params={"lat": lat, "lon": lon, **params})
+    assert response.status_code == 200
+    return response.json()["rest_list"]
+
+
+class TestNearby:
+    """Test cases for GET /restaurants/nearby"""
+
+    def test_sorted_by_distance_within_radius(self):
+        create("Old City", CHARMINAR)
+        create("Cyber Cafe", HITECH_CITY)
+        create("Station Bites", SECUNDERABAD)
+
+        hits = nearby((17.36, 78.47), radius=20)
+        assert [hit["name"] for hit in hits] == ["Old City", "Station Bites", "Cyber Cafe"]
+        assert hits[0]["distance_km"] < 1
+        assert hits == sorted(hits, key=lambda hit: hit["distance_km"])
+        assert [hit["name"] for hit in nearby((17.36, 78.47), radius=2)] == ["Old City"]
+        assert len(nearby((17.36, 78.47), radius=20, limit=2)) == 2
+
+    def test_restaurants_without_coordinates_are_left_out(self):
+        assert nearby(CHARMINAR, radius=100) == []
+
+    def test_coordinates_are_validated(self):
+        response = client.post("/restaurants", json={"name": "Half", "location": "Somewhere", "lat": 17.4})
+        assert response.status_code == 422
+        response = client.post("/restaurants", json={"name": "Off", "location": "Somewhere", "lat": 91, "lon": 0})
+        assert response.status_code == 422
+        assert client.get("/restaurants/nearby", params={"lat": 17.4, "lon": 78.4, "radius": 0}).status_code == 422
+
+    def test_import_moves_a_restaurant(self):
+        restaurant_id = create("Mover", CHARMINAR)
+        lat, lon = HITECH_CITY
+        rows = [{"id": restaurant_id, "lat": lat, "lon": lon}, {"name": "New Place", "location": "Secunderabad", "lat": SECUNDERABAD[0], "lon": SECUNDERABAD[1]}]
+        assert client.post("/catalog/import", json={"restaurants": rows}).status_code == 200
+
+        assert nearby(CHARMINAR, radius=2) == []
+        assert [hit["id"] for hit in nearby(HITECH_CITY, radius=2)] == [restaurant_id]
+        assert [hit["name"] for hit in nearby(SECUNDERABAD, radius=2)] == ["New Place"]
+
+    def test_reload_keeps_coordinates(self, isolated_storage):
+        restaurant_id = create("Saved", CHARMINAR)
+        catalog.reload(isolated_storage)
+        assert [hit["id"] for hit in nearby(CHARMINAR, radius=1)] == [restaurant_id]
+
+
+class TestGeoIndex:
+    """Test cases for the grid itself"""
+
+    def brute_force(self, restaurants, lat, lon, radius, limit):
+        hits = sorted(
+            (distance_km(lat, lon, restaurant["lat"], restaurant["lon"]), restaurant["id"])
+            for restaurant in restaurants
+        )
+        return [restaurant_id for distance, restaurant_id in hits if distance <= radius][:limit]
+
+    @pytest.mark.parametrize("centre", [(17.4, 78.4), (59.9, 10.7), (-33.9, 151.2), (0.0, 179.99)])
+    def test_matches_brute_force(self, centre):
+        rng = random.Random(7)
+        restaurants = [
+            {"id": number, "lat": centre[0] + rng.uniform(-0.5, 0.5), "lon": (centre[1] + rng.uniform(-0.5, 0.5) + 180) % 360 - 180}
+            for number in range(2000)
+        ]
+        index = GeoIndex()
+        for restaurant in restaurants:
+            index.place(restaurant)
+        for radius, limit in ((0.5, 10), (5, 20), (30, 50), (100, 100)):
+            found = [restaurant["id"] for _, restaurant in index.nearby(*centre, radius, limit)]
+            assert found == self.brute_force(restaurants, *centre, radius, limit)
+
+    @pytest.mark.parametrize("centre", [(-89.58, 0.0), (88.9, -120.0), (89.99, 45.0)])
+    def test_matches_brute_force_near_the_poles(self, centre):
+        rng = random.Random(11)
+        restaurants = [
+            {"id": number, "lat": rng.uniform(88.0, 90.0) * (1 if centre[0] > 0 else -1), "lon": rng.uniform(-180, 180)}
+            for number in range(2000)
+        ]
+        index = GeoIndex()
+        for restaurant in restaurants:
+            index.place(restaurant)
+        for radius, limit in ((5, 5), (20, 5), (50, 20), (100, 100)):
+            found = [restaurant["id"] for _, restaurant in index.nearby(*centre, radius, limit)]
+            assert found == self.brute_force(restaurants, *centre, radius, limit)
+
+    def test_place_moves_and_drops(self):
+        index = GeoIndex()
+        restaurant = {"id": 1, "lat": 17.0, "lon": 78.0}
+        index.place(restaurant)
+        restaurant.update(lat=18.0, lon=79.0)
+        index.place(restaurant)
+        assert index.nearby(17.0, 78.0, 10, 5) == []
+        assert [hit["id"] for _, hit in index.nearby(18.0, 79.0, 10, 5)] == [1]
+
+        restaurant.update(lat=None, lon=None)
+        index.place(restaurant)
+        assert len(index) == 0
+        assert index.nearby(18.0, 79.0, 10, 5) == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
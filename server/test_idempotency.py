@@ -0,0 +1,120 @@
+import threading
+import time
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from main import app
+from catalog import catalog
+from order_store import order_store
+from idempotency import IdempotencyStore
+
+client = TestClient(app)
+
+order_data = {
+    "restaurant_id": 1,
+    "items": [{"item_id": 101, "quantity": 1}],
+    "customer_name": "John Doe",
+    "customer_phone": "+1234567890",
+    "delivery_address": "123 Main St, City, State 12345"
+}
+
+
+class TestIdempotentOrders:
+    """Test cases for Idempotency-Key on POST /orders"""
+
+    def test_retry_returns_first_order(self):
+        """A retry gets the original order and does not take stock again"""
+        stock = catalog.get_item(1, 101)["available_quantity"]
+        orders = len(order_store.ids())
+        headers = {"Idempotency-Key": "retry-1"}
+
+        first = client.post("/orders", json=order_data, headers=headers)
+        retry = client.post("/orders", json=order_data, headers=headers)
+
+        assert retry.status_code == 200
+        assert retry.json() == first.json()
+        assert retry.headers["idempotent-replayed"] == "true"
+        assert "idempotent-replayed" not in first.headers
+        assert catalog.get_item(1, 101)["available_quantity"] == stock - 1
+        assert len(order_store.ids()) == orders + 1
+
+    def test_key_reused_for_other_body(self):
+        headers = {"Idempotency-Key": "retry-2"}
+        client.post("/orders", json=order_data, headers=headers)
+        response = client.post("/orders", json={**order_data, "customer_name": "Someone Else"}, headers=headers)
+        assert response.status_code == 422
+
+    def test_failed_request_can_be_retried(self):
+        """An error is not remembered; the next retry runs again"""
+        headers = {"Idempotency-Key": "retry-3"}
+        catalog.get_item(1, 101)["available_quantity"] = 0
+        assert client.post("/orders", json=order_data, headers=headers).status_code == 404
+
+        catalog.get_item(1, 101)["available_quantity"] = 5
+        assert client.post("/orders", json=order_data, headers=headers).status_code == 200
+
+    def test_without_key_every_post_creates(self):
+        first = client.post("/orders", json=order_data).json()
+        second = client.post("/orders", json=order_data).json()
+        assert first["id"] != second["id"]
+
+
+class TestIdempotencyStore:
+    """Test cases for the key store itself"""
+
+    def test_in_flight_duplicate_waits_for_first(self):
+        """A concurrent duplicate waits and gets the first result"""
+        store = IdempotencyStore()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(2)
+            return "order"
+
+        first = threading.Thread(target=lambda: results.append(store.run("k", "body", slow)))
+        first.start()
+        started.wait(2)
+        second = threading.Thread(target=lambda: results.append(store.run("k", "body", slow)))
+        second.start()
+        time.sleep(0.05)
+        release.set()
+        first.join()
+        second.join()
+
+        assert calls == [1]
+        assert sorted(results) == [("order", False), ("order", True)]
+
+    def test_waiters_see_the_first_error(self):
+        store = IdempotencyStore()
+        future, owner = store.begin("k", "body")
+        waiter, waiter_owner = store.begin("k", "body")
+        assert owner and not waiter_owner
+        store.finish("k", future, error=HTTPException(status_code=404))
+        with pytest.raises(HTTPException):
+            waiter.result()
+        assert len(store) == 0
+
+    def test_entries_expire(self):
+        store = IdempotencyStore(ttl=0.01)
+        store.run("k", "body", lambda: 1)
+        time.sleep(0.02)
+        assert store.run("k", "body", lambda: 2) == (2, False)
+
+    def test_store_is_bounded(self):
+        store = IdempotencyStore(max_keys=3)
+        for key in range(10):
+            store.run(str(key), "body", lambda: key)
+        assert len(store) == 3
+        assert store.run("9", "body", lambda: None) == (9, True)
+
+    def test_rejects_overlong_key(self):
+        with pytest.raises(HTTPException) as error:
+            IdempotencyStore().begin("x" * 300, "body")
+        assert error.value.status_code == 400
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
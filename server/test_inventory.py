@@ -0,0 +1,114 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from catalog import catalog
+from inventory import reserve_stock, release_stock, stock_writer
+from main import app
+from storage import JsonStorage
+from orders import OrderCreate, create_order, get_all_orders
+
+
+def place_order(item_id=101, quantity=1, restaurant_id=1):
+    order = OrderCreate(
+        restaurant_id=restaurant_id,
+        items=[{"item_id": item_id, "quantity": quantity}],
+        customer_name="Load Test",
+        customer_phone="+1000000000",
+        delivery_address="1 Test Lane"
+    )
+    try:
+        return create_order(order)
+    except HTTPException:
+        return None
+
+
+def test_all_lines_reserved_or_none():
+    """A failing line leaves every other line untouched"""
+    catalog.get_item(1, 101)["available_quantity"] = 5
+    catalog.get_item(1, 102)["available_quantity"] = 1
+    
+    with pytest.raises(HTTPException) as error:
+        reserve_stock(1, [(101, 2), (102, 3)])
+    assert error.value.status_code == 404
+    assert catalog.get_item(1, 101)["available_quantity"] == 5
+    assert catalog.get_item(1, 102)["available_quantity"] == 1
+
+
+def test_repeated_lines_are_summed():
+    """Splitting an item across lines cannot oversell it"""
+    catalog.get_item(1, 101)["available_quantity"] = 3
+    
+    with pytest.raises(HTTPException):
+        reserve_stock(1, [(101, 2), (101, 2)])
+    reserve_stock(1, [(101, 2), (101, 1)])
+    assert catalog.get_item(1, 101)["available_quantity"] == 0
+
+
+def test_release_returns_stock():
+    """Released stock is available again"""
+    before = catalog.get_item(1, 101)["available_quantity"]
+    reserve_stock(1, [(101, 4)])
+    release_stock(1, [(101, 4)])
+    assert catalog.get_item(1, 101)["available_quantity"] == before
+
+
+def test_other_restaurants_are_not_blocked():
+    """Holding one restaurant's lock does not stall reservations elsewhere"""
+    done = threading.Event()
+    with catalog.restaurant_lock(1):
+        worker = threading.Thread(target=lambda: reserve_stock(2, [(104, 1)]) and done.set())
+        worker.start()
+        assert done.wait(timeout=5)
+    worker.join()
+
+
+def test_parallel_orders_never_oversell():
+    """Thousands of concurrent orders against a small stock sell exactly that stock"""
+    stock = 25
+    catalog.get_item(1, 101)["available_quantity"] = stock
+    catalog.get_item(2, 104)["available_quantity"] = stock
+    orders_before = len(get_all_orders())
+    
+    # Alternate between a Spice Villa item and a Grill & Chill item
+    jobs = [(101, 1) if n % 2 else (104, 2) for n in range(2000)]
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        results = list(pool.map(lambda job: place_order(job[0], 1, job[1]), jobs))
+    
+    placed = [order for order in results if order is not None]
+    assert len(placed) == 2 * stock
+    assert catalog.get_item(1, 101)["available_quantity"] == 0
+    assert catalog.get_item(2, 104)["available_quantity"] == 0
+    assert len(get_all_orders()) == orders_before + 2 * stock
+    assert len({order.id for order in placed}) == len(placed)
+
+
+def test_failed_stock_write_gives_the_units_back(isolated_storage, monkeypatch):
+    """A sale whose stock write fails is not persisted by the writer's retry"""
+    save = catalog.save
+    failures = [OSError("disk full")]
+
+    def save_failing_once(*args, **kwargs):
+        if failures:
+            raise failures.pop()
+        return save(*args, **kwargs)
+
+    monkeypatch.setattr(catalog, "save", save_failing_once)
+    client = TestClient(app, raise_server_exceptions=False)
+    before = catalog.get_item(1, 101)["available_quantity"]
+    order = {"restaurant_id": 1, "items": [{"item_id": 101, "quantity": 5}], "customer_name": "Load Test",
+             "customer_phone": "+1000000000", "delivery_address": "1 Test Lane"}
+    batch = {"orders": [order, order]}
+
+    assert client.post("/orders", json=order).status_code == 500
+    stock_writer.flush()
+    assert catalog.get_item(1, 101)["available_quantity"] == before
+
+    failures.append(OSError("disk full"))
+    assert client.post("/orders/batch", json=batch).status_code == 500
+    stock_writer.flush()
+    assert catalog.get_item(1, 101)["available_quantity"] == before
+    stored = JsonStorage(isolated_storage.catalog_path).load_catalog()
+    item = next(item for item in stored["rest_list"][0]["items"] if item["id"] == 101)
+    assert item["available_quantity"] == before
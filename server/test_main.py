@@ -4,8 +4,9 @@ import os
 import shutil
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import patch, mock_open
 from main import app
+from catalog import CatalogStore, catalog
+from storage import JsonStorage
 
 client = TestClient(app)
 
@@ -51,32 +52,26 @@ SAMPLE_DATA = {
 }
 
 @pytest.fixture
-def temp_json_file():
+def temp_json_file(isolated_storage):
     """Create a temporary JSON file with sample data for testing"""
     temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False)
     json.dump(SAMPLE_DATA, temp_file, indent=4)
     temp_file.close()
     
-    # Patch the file path in the main module
-    with patch('main.open', side_effect=lambda file, mode: open(temp_file.name, mode)):
-        yield temp_file.name
+    # Point the catalog store at the temporary file
+    catalog.reload(JsonStorage(catalog_path=temp_file.name))
+    yield temp_file.name
     
     # Clean up
     os.unlink(temp_file.name)
 
 @pytest.fixture
-def mock_sample_json():
-    """Mock the sample.json file operations"""
-    def mock_open_func(filename, mode):
-        if 'r' in mode:
-            return mock_open(read_data=json.dumps(SAMPLE_DATA)).return_value
-        else:
-            # For write operations, return a mock that captures the data
-            mock_file = mock_open().return_value
-            return mock_file
-    
-    with patch('builtins.open', side_effect=mock_open_func):
-        yield
+def mock_sample_json(isolated_storage):
+    """Serve the catalog from a scratch copy of SAMPLE_DATA"""
+    with open(isolated_storage.catalog_path, "w") as file:
+        json.dump(SAMPLE_DATA, file, indent=4)
+    catalog.reload()
+    yield
 
 class TestHomeEndpoint:
     """Test cases for the home endpoint"""
@@ -205,6 +200,82 @@ class TestItemsEndpoints:
         assert item["price"] == 250
         assert item["available_quantity"] == 3
 
+class TestMenuEndpoint:
+    """Test cases for the bulk menu endpoint"""
+    
+    def test_menu_returns_restaurants_with_items(self, mock_sample_json):
+        """Test that one call returns every restaurant with its items"""
+        response = client.get("/menu")
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert [rest["id"] for rest in data["rest_list"]] == [1, 2]
+        assert data["rest_list"][0]["name"] == "Spice Villa"
+        assert [item["id"] for item in data["rest_list"][0]["items"]] == [101, 102]
+        assert data["rest_list"][1]["items"][0]["available_quantity"] == 3
+    
+    def test_menu_filters_by_id(self, mock_sample_json):
+        """Test filtering by restaurant ids, ignoring unknown and repeated ones"""
+        response = client.get("/menu", params={"ids": [2, 999, 2]})
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert [rest["id"] for rest in data["rest_list"]] == [2]
+        assert data["rest_list"][0]["items"][0]["name"] == "Chicken Kebab"
+    
+    def test_menu_matches_per_restaurant_items(self, mock_sample_json):
+        """Test that the bulk response agrees with GET /items/{id}"""
+        menu = client.get("/menu").json()["rest_list"]
+        for rest in menu:
+            assert rest["items"] == client.get(f"/items/{rest['id']}").json()["item_list"]
+
+class TestCatalogResponseCache:
+    """Test cases for ETag revalidation of catalog reads"""
+    
+    def test_etag_and_not_modified(self, mock_sample_json):
+        """Test that a matching If-None-Match gets an empty 304"""
+        response = client.get("/restaurants")
+        etag = response.headers["etag"]
+        assert response.headers["cache-control"]
+        
+        revalidated = client.get("/restaurants", headers={"If-None-Match": etag})
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+        assert revalidated.headers["etag"] == etag
+    
+    def test_item_update_changes_etag(self, mock_sample_json):
+        """Test that editing an item invalidates the cached body"""
+        before = client.get("/items/1")
+        client.put("/restaurants/1/items/101", json={"price": 999})
+        
+        after = client.get("/items/1", headers={"If-None-Match": before.headers["etag"]})
+        assert after.status_code == 200
+        assert after.json()["item_list"][0]["price"] == 999
+        assert after.headers["etag"] != before.headers["etag"]
+    
+    def test_order_stock_change_changes_etag(self, mock_sample_json):
+        """Test that stock taken by an order shows up in /items"""
+        before = client.get("/items/2")
+        order = {
+            "restaurant_id": 2,
+            "items": [{"item_id": 104, "quantity": 1}],
+            "customer_name": "Jane",
+            "customer_phone": "+10000000000",
+            "delivery_address": "1 Road"
+        }
+        assert client.post("/orders", json=order).status_code == 200
+        
+        after = client.get("/items/2", headers={"If-None-Match": before.headers["etag"]})
+        assert after.status_code == 200
+        assert after.json()["item_list"][0]["available_quantity"] == 2
+    
+    def test_query_strings_are_cached_separately(self, mock_sample_json):
+        """Test that different query strings get different bodies"""
+        first = client.get("/menu", params={"ids": [1]}).json()
+        second = client.get("/menu", params={"ids": [2]}).json()
+        assert first["rest_list"][0]["id"] == 1
+        assert second["rest_list"][0]["id"] == 2
+
 class TestUpdateItemEndpoint:
     """Test cases for item update endpoint"""
     
@@ -427,5 +498,55 @@ class TestEdgeCases:
         assert data["name"] == unicode_name
         assert data["description"] == unicode_description
 
+class TestCatalogStore:
+    """Test cases for the in-memory catalog store"""
+    
+    def test_reads_are_served_from_memory(self, temp_json_file):
+        """Test that the file is parsed once and then served from memory"""
+        store = CatalogStore(JsonStorage(catalog_path=temp_json_file))
+        first = store.data()
+        assert store.data() is first
+    
+    def test_external_change_is_reloaded(self, temp_json_file):
+        """Test that edits made outside the store are picked up"""
+        store = CatalogStore(JsonStorage(catalog_path=temp_json_file))
+        assert len(store.data()["rest_list"]) == 2
+        
+        changed = {"rest_list": SAMPLE_DATA["rest_list"][:1]}
+        with open(temp_json_file + ".new", "w") as file:
+            json.dump(changed, file)
+        os.replace(temp_json_file + ".new", temp_json_file)
+        
+        assert len(store.data()["rest_list"]) == 1
+    
+    def test_writes_are_persisted(self, mock_sample_json):
+        """Test that mutations through the API reach the file"""
+        response = client.put("/restaurants/1/items/101", json={"available_quantity": 42})
+        assert response.status_code == 200
+        
+        with open(catalog.storage.catalog_path) as file:
+            data = json.load(file)
+        assert data["rest_list"][0]["items"][0]["available_quantity"] == 42
+    
+    def test_indexes_follow_mutations(self, mock_sample_json):
+        """Test that new restaurants and items are reachable by ID"""
+        client.post("/restaurants", json={"name": "Indexed", "location": "Kondapur"})
+        response = client.post("/restaurants/3/items", json={"name": "Dosa", "price": 60, "available_quantity": 4})
+        assert response.status_code == 200
+        item_id = response.json()["id"]
+        
+        assert catalog.get_restaurant(3)["name"] == "Indexed"
+        assert catalog.get_item(3, item_id)["name"] == "Dosa"
+        assert catalog.get_item(1, item_id) is None
+        
+        response = client.put(f"/restaurants/3/items/{item_id}", json={"price": 70})
+        assert response.status_code == 200
+        assert response.json()["price"] == 70
+    
+    def test_missing_file_gives_empty_catalog(self, tmp_path):
+        """Test that a missing catalog file behaves like an empty one"""
+        store = CatalogStore(JsonStorage(catalog_path=str(tmp_path / "missing.json")))
+        assert store.data() == {"rest_list": []}
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,87 @@
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from catalog import catalog
+from metrics import Histogram, operation_seconds, request_seconds, requests_total, storage_bytes
+
+client = TestClient(app)
+
+ORDER = {
+    "restaurant_id": 1,
+    "items": [{"item_id": 101, "quantity": 1}],
+    "customer_name": "Metrics",
+    "customer_phone": "+1234567890",
+    "delivery_address": "1 Main St"
+}
+
+
+def timings(response):
+    """Server-Timing entries as {name: milliseconds}"""
+    entries = {}
+    for part in response.headers["server-timing"].split(","):
+        name, duration = part.strip().split(";dur=")
+        entries[name] = float(duration)
+    return entries
+
+
+class TestMetricsEndpoint:
+    """Test cases for GET /metrics and the Server-Timing header"""
+
+    def test_requests_are_counted_by_route_template(self):
+        before = requests_total.value("GET", "/items/{id}", "200")
+        client.get("/items/1")
+        client.get("/items/2")
+        assert requests_total.value("GET", "/items/{id}", "200") == before + 2
+        assert request_seconds.count("GET", "/items/{id}") >= 2
+
+        client.get("/no/such/page")
+        body = client.get("/metrics").text
+        assert 'delivery_requests_total{method="GET",route="unmatched",status="404"}' in body
+        assert 'delivery_request_duration_seconds_bucket{method="GET",route="/items/{id}",le="+Inf"}' in body
+        assert "/items/1" not in body
+
+    def test_exposition_format(self):
+        client.get("/restaurants")
+        response = client.get("/metrics")
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert "# TYPE delivery_request_duration_seconds histogram" in response.text
+        assert "# TYPE delivery_catalog_cache_hits_total counter" in response.text
+
+    def test_server_timing_shows_where_an_order_spent_its_time(self):
+        response = client.post("/orders", json=ORDER)
+        assert response.status_code == 200
+        entries = timings(response)
+        assert {"stock", "model", "order_write", "app"} <= set(entries)
+        assert entries["app"] >= entries["order_write"]
+
+    def test_storage_reads_and_writes_are_measured(self, isolated_storage):
+        read_before = storage_bytes.value("read")
+        written_before = storage_bytes.value("written")
+        parses = operation_seconds.count("parse")
+
+        catalog.reload(isolated_storage)
+        response = client.put("/restaurants/1/items/101", json={"price": 230})
+        assert storage_bytes.value("read") > read_before
+        assert storage_bytes.value("written") > written_before
+        assert operation_seconds.count("parse") > parses
+        assert {"read", "parse", "app"} <= set(timings(response))
+
+
+class TestHistogram:
+    """Test cases for the histogram itself"""
+
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram("test_seconds", "Test", ("route",), buckets=(0.1, 1.0))
+        for seconds in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(seconds, "/a")
+        assert list(histogram.samples()) == [
+            'test_seconds_bucket{route="/a",le="0.1"} 2',
+            'test_seconds_bucket{route="/a",le="1.0"} 3',
+            'test_seconds_bucket{route="/a",le="+Inf"} 4',
+            'test_seconds_sum{route="/a"} 2.65',
+            'test_seconds_count{route="/a"} 4',
+        ]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -4,6 +4,8 @@ import os
 from fastapi.testclient import TestClient
 from main import app
 from orders import OrderStatus
+from catalog import catalog
+from order_store import order_store
 
 client = TestClient(app)
 
@@ -154,5 +156,132 @@ def test_update_nonexistent_order_status():
     assert response.status_code == 404
     assert "Order not found" in response.json()["detail"]
 
+def test_orders_pagination_walks_every_order_once():
+    """Test paging through orders with limit and next_cursor"""
+    for _ in range(5):
+        client.post("/orders", json=test_order_data)
+    all_ids = [order["id"] for order in client.get("/orders").json()["orders"]]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/orders", params=params).json()
+        assert len(page["orders"]) <= 2
+        seen.extend(order["id"] for order in page["orders"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == sorted(all_ids)
+
+def test_orders_pagination_descending_is_stable_under_inserts():
+    """Test that a descending cursor does not repeat orders created after it was issued"""
+    for _ in range(4):
+        client.post("/orders", json=test_order_data)
+    first = client.get("/orders", params={"limit": 2, "sort": "desc"}).json()
+    ids = [order["id"] for order in first["orders"]]
+    assert ids == sorted(ids, reverse=True)
+
+    client.post("/orders", json=test_order_data)
+    second = client.get("/orders", params={"limit": 2, "sort": "desc", "cursor": first["next_cursor"]}).json()
+    assert all(order["id"] < ids[-1] for order in second["orders"])
+
+def test_orders_field_projection():
+    """Test returning only selected order fields"""
+    client.post("/orders", json=test_order_data)
+    response = client.get("/orders/status/pending", params={"fields": "id,status", "limit": 1})
+    assert response.status_code == 200
+    orders = response.json()["orders"]
+    assert orders and set(orders[0]) == {"id", "status"}
+
+def test_orders_pagination_rejects_bad_input():
+    """Test invalid cursor, unknown field and sort/cursor mismatch"""
+    assert client.get("/orders", params={"cursor": "not-a-cursor"}).status_code == 400
+    response = client.get("/orders", params={"fields": "id,bogus"})
+    assert response.status_code == 400
+    assert "bogus" in response.json()["detail"]
+
+    for _ in range(3):
+        client.post("/orders", json=test_order_data)
+    cursor = client.get("/orders", params={"limit": 1}).json()["next_cursor"]
+    assert client.get("/orders", params={"cursor": cursor, "sort": "desc"}).status_code == 400
+
+def test_restaurants_pagination():
+    """Test paging the restaurant list"""
+    full = client.get("/restaurants").json()
+    page = client.get("/restaurants", params={"limit": 1, "fields": "name"}).json()
+    assert page["rest_list"] == [{"name": full["rest_list"][0]["name"]}]
+    assert (page["next_cursor"] is None) == (len(full["rest_list"]) == 1)
+
+def test_batch_orders_report_per_order_results(isolated_storage):
+    """Test that a batch creates the valid orders and reports the invalid ones"""
+    writes = []
+    original = isolated_storage.write_orders
+    isolated_storage.write_orders = lambda batch: (writes.append(len(batch)), original(batch))
+    bad_item = {**test_order_data, "items": [{"item_id": 999, "quantity": 1}]}
+    
+    response = client.post("/orders/batch", json={"orders": [test_order_data, bad_item, test_order_data]})
+    assert response.status_code == 200
+    
+    body = response.json()
+    assert (body["created"], body["failed"]) == (2, 1)
+    assert [result["index"] for result in body["results"]] == [0, 1, 2]
+    assert body["results"][1]["error"]["status_code"] == 404
+    first, third = body["results"][0]["order"], body["results"][2]["order"]
+    assert third["id"] == first["id"] + 1
+    assert writes == [2]
+    assert client.get(f"/orders/{third['id']}").json()["customer_name"] == "John Doe"
+
+def test_batch_orders_share_stock():
+    """Test that orders in one batch cannot oversell an item between them"""
+    catalog.get_item(1, 101)["available_quantity"] = 3
+    order = {**test_order_data, "items": [{"item_id": 101, "quantity": 2}]}
+    
+    body = client.post("/orders/batch", json={"orders": [order, order]}).json()
+    assert (body["created"], body["failed"]) == (1, 1)
+    assert catalog.get_item(1, 101)["available_quantity"] == 1
+
+def test_batch_orders_give_stock_back_when_a_reservation_errors(isolated_storage, monkeypatch):
+    """Test that an unexpected error while reserving releases the orders reserved before it"""
+    import orders
+    take_stock_async = orders.take_stock_async
+    calls = []
+
+    async def failing_second_time(restaurant_id, lines):
+        calls.append(restaurant_id)
+        if len(calls) == 2:
+            raise RuntimeError("database is locked")
+        return await take_stock_async(restaurant_id, lines)
+
+    monkeypatch.setattr(orders, "take_stock_async", failing_second_time)
+    failing = TestClient(app, raise_server_exceptions=False)
+    before = catalog.get_item(1, 101)["available_quantity"]
+    count = len(order_store.all())
+
+    response = failing.post("/orders/batch", json={"orders": [test_order_data, test_order_data]})
+    assert response.status_code == 500
+    assert catalog.get_item(1, 101)["available_quantity"] == before
+    assert len(order_store.all()) == count
+
+def test_batch_orders_rejects_empty_batch():
+    """Test that an empty batch is a validation error"""
+    assert client.post("/orders/batch", json={"orders": []}).status_code == 422
+
+def test_failed_order_write_leaves_no_order(isolated_storage, monkeypatch):
+    """An order whose write fails is not served afterwards and its stock is back"""
+    def broken_write_orders(writes):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(isolated_storage, "write_orders", broken_write_orders)
+    failing = TestClient(app, raise_server_exceptions=False)
+    before = catalog.get_item(1, 101)["available_quantity"]
+    orders = [order["id"] for order in order_store.all()]
+
+    assert failing.post("/orders", json=test_order_data).status_code == 500
+    assert [order["id"] for order in order_store.all()] == orders
+    assert client.get(f"/orders/{max(orders) + 1}").status_code == 404
+    assert catalog.get_item(1, 101)["available_quantity"] == before
+
 if __name__ == "__main__":
     pytest.main([__file__])
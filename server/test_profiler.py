@@ -0,0 +1,73 @@
+import time
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from profiler import profiler
+
+client = TestClient(app)
+
+ADMIN = {"X-Admin-Token": "secret"}
+ORDER = {
+    "restaurant_id": 1,
+    "items": [{"item_id": 101, "quantity": 1}],
+    "customer_name": "Profiled",
+    "customer_phone": "+1234567890",
+    "delivery_address": "1 Main St"
+}
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr("profiler.ADMIN_TOKEN", "secret")
+    yield
+    client.put("/admin/profile", json={"rate": 0}, headers=ADMIN)
+    profiler.collapsed(reset=True)
+
+
+class TestProfiler:
+    """Test cases for the admin sampling profiler"""
+
+    def test_admin_endpoints_are_hidden_without_a_token(self):
+        assert client.get("/admin/profile").status_code == 404
+        assert client.put("/admin/profile", json={"rate": 1}).status_code == 404
+
+    def test_wrong_token_is_refused(self, admin):
+        assert client.get("/admin/profile").status_code == 403
+        assert client.get("/admin/profile", headers={"X-Admin-Token": "guess"}).status_code == 403
+        assert client.get("/admin/profile", headers=ADMIN).json()["active"] is False
+
+    def test_sampled_orders_show_handler_and_order_stacks(self, admin):
+        response = client.put("/admin/profile", json={"rate": 1, "duration_seconds": 30, "interval_ms": 1}, headers=ADMIN)
+        assert response.json()["active"] is True
+        for _ in range(5):
+            assert client.post("/orders", json=ORDER).status_code == 200
+
+        status = client.get("/admin/profile", headers=ADMIN).json()
+        assert status["sampled_requests"] >= 5
+        assert status["samples"] > 0
+        lines = client.get("/admin/profile/stacks", params={"reset": True}, headers=ADMIN).text.splitlines()
+        stacks = {line.rsplit(" ", 1)[0]: int(line.rsplit(" ", 1)[1]) for line in lines}
+        assert any(stack.startswith("POST /orders;main.create_new_order;orders.create_order_async") for stack in stacks)
+        assert "POST /orders" not in client.get("/admin/profile/stacks", headers=ADMIN).text
+
+    def test_rate_zero_and_expiry_stop_sampling(self, admin):
+        client.put("/admin/profile", json={"rate": 1, "duration_seconds": 30}, headers=ADMIN)
+        assert client.put("/admin/profile", json={"rate": 0}, headers=ADMIN).json()["active"] is False
+        profiler.collapsed(reset=True)
+        client.post("/orders", json=ORDER)
+        assert profiler.status().sampled_requests == 0
+
+        client.put("/admin/profile", json={"rate": 1, "duration_seconds": 0.05}, headers=ADMIN)
+        time.sleep(0.1)
+        profiler.collapsed(reset=True)
+        client.post("/orders", json=ORDER)
+        assert profiler.status().active is False
+        assert profiler.status().sampled_requests == 0
+
+    def test_settings_are_validated(self, admin):
+        assert client.put("/admin/profile", json={"rate": 2}, headers=ADMIN).status_code == 422
+        assert client.put("/admin/profile", json={"rate": 0.5, "duration_seconds": 86400}, headers=ADMIN).status_code == 422
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,156 @@
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from catalog import catalog
+from search import SearchIndex, words, within_one_edit
+
+client = TestClient(app)
+
+
+def search(q, **params):
+    catalog.search_index(wait=True)
+    response = client.get("/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return response.json()
+
+
+def item_ids(body):
+    return [item["id"] for item in body["items"]]
+
+
+class TestSearch:
+    """Test cases for GET /search"""
+
+    def test_finds_items_and_restaurants(self):
+        body = search("paneer")
+        assert set(item_ids(body)) == {101, 109, 119}
+        assert body["items"][0]["restaurant_name"] in ("Spice Villa", "Urban Tadka", "Taste of India")
+        assert [restaurant["id"] for restaurant in search("banjara hills")["restaurants"]] == [1, 7]
+
+    def test_name_matches_rank_above_description_matches(self):
+        ids = item_ids(search("rice"))
+        assert ids[0] == 108
+        assert set(ids) == {103, 108, 113, 117, 120}
+
+    def test_every_word_must_match(self):
+        assert item_ids(search("chicken biryani")) == [117]
+        assert item_ids(search("chicken sushi")) == []
+
+    def test_prefix_and_typo_matching(self):
+        assert set(item_ids(search("pane"))) == {101, 109, 119}
+        assert 103 in item_ids(search("biryni"))
+        assert 104 in item_ids(search("chiken kebab"))
+
+    def test_accents_and_case_are_folded(self):
+        assert words("Crème BRÛLÉE, 2pcs") == ["creme", "brulee", "2pcs"]
+        assert set(item_ids(search("PANÉER"))) == {101, 109, 119}
+
+    def test_price_and_stock_filters(self):
+        body = search("chicken", max_price=200)
+        assert item_ids(body) == [118]
+        assert body["restaurants"] == []
+
+        catalog.get_item(6, 118)["available_quantity"] = 0
+        catalog.touch()
+        assert item_ids(search("chicken", max_price=200, in_stock=True)) == []
+        assert 116 in item_ids(search("chicken", min_price=250))
+
+    def test_limit(self):
+        assert len(search("spices", limit=2)["items"]) == 2
+
+    def test_new_and_edited_records_are_searchable(self):
+        search("naan")
+        created = client.post("/restaurants/1/items", json={"name": "Cheese Kulcha", "price": 80}).json()
+        assert item_ids(search("kulcha")) == [created["id"]]
+
+        client.put("/restaurants/1/items/102", json={"name": "Peshwari Naan"})
+        assert 102 in item_ids(search("peshwari"))
+        assert item_ids(search("butter"))[0] == 101
+
+        client.post("/restaurants", json={"name": "Dosa Plaza", "location": "Ameerpet"})
+        assert [restaurant["name"] for restaurant in search("ameerpet")["restaurants"]] == ["Dosa Plaza"]
+
+    def test_catalog_import_updates_the_index(self):
+        search("naan")
+        rows = [{"id": 3, "name": "Urban Dhaba", "items": [{"id": 108, "name": "Ghee Rice"}, {"name": "Lassi", "price": 60}]}]
+        assert client.post("/catalog/import", json={"restaurants": rows}).status_code == 200
+        assert [restaurant["id"] for restaurant in search("dhaba")["restaurants"]] == [3]
+        assert 108 in item_ids(search("ghee"))
+        assert len(search("lassi")["items"]) == 1
+
+    def test_reload_rebuilds_the_index(self, isolated_storage):
+        search("naan")
+        catalog.reload(isolated_storage)
+        assert set(item_ids(search("naan"))) == {102, 111}
+
+    def test_index_is_built_in_the_background(self, monkeypatch):
+        release = threading.Event()
+        build = SearchIndex.build
+
+        def slow_build(index, restaurants):
+            release.wait(5)
+            build(index, restaurants)
+
+        monkeypatch.setattr(SearchIndex, "build", slow_build)
+        response = client.get("/search", params={"q": "naan"})
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+
+        # The catalog is not locked while the index builds, and edits made
+        # meanwhile reach the new index
+        assert client.get("/items/1").status_code == 200
+        created = client.post("/restaurants/1/items", json={"name": "Cheese Kulcha", "price": 80}).json()
+        client.put("/restaurants/1/items/102", json={"name": "Peshwari Naan"})
+        release.set()
+        assert item_ids(search("kulcha")) == [created["id"]]
+        assert 102 in item_ids(search("peshwari"))
+
+    def test_blank_query_is_rejected(self):
+        assert client.get("/search", params={"q": ""}).status_code == 422
+        assert search("!!!") == {"restaurants": [], "items": []}
+
+
+class TestSearchIndex:
+    """Test cases for the index itself"""
+
+    def test_one_edit(self):
+        assert within_one_edit("biryani", "biryni")
+        assert within_one_edit("paneer", "panner")
+        assert within_one_edit("kebab", "kebba")
+        assert not within_one_edit("kebab", "kabob")
+        assert not within_one_edit("naan", "nanny")
+
+    def test_reindex_drops_old_words(self):
+        restaurant = {"id": 1, "name": "Spice Villa", "location": "Hills", "items": []}
+        item = {"id": 5, "name": "Old Name", "description": "", "price": 10}
+        restaurant["items"].append(item)
+        index = SearchIndex()
+        index.build([restaurant])
+
+        item["name"] = "New Name"
+        index.index_item(restaurant, item)
+        assert index.search("old").items == []
+        assert [hit.id for hit in index.search("new").items] == [5]
+        assert "old" not in index._terms
+
+    def test_broad_queries_return_name_matches_first(self, monkeypatch):
+        monkeypatch.setattr("search.RANK_LIMIT", 5)
+        restaurant = {"id": 1, "name": "R", "location": "L", "items": [
+            {"id": number, "name": "Dish of the Day" if number % 4 == 1 else "Dish" if number % 2 else "Plate",
+             "description": "dish of the day", "price": 1}
+            for number in range(1, 41)
+        ]}
+        index = SearchIndex()
+        index.build([restaurant])
+        hits = index.search("dish", limit=10).items
+        assert len(hits) == 10
+        assert all(hit.name.startswith("Dish") for hit in hits)
+
+        hits = index.search("dish day", limit=10).items
+        assert [hit.name for hit in hits] == ["Dish of the Day"] * 10
+        assert index.search("dish day", limit=30, max_price=0.5).items == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
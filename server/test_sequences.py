@@ -0,0 +1,60 @@
+import json
+import threading
+import pytest
+from sequences import SequenceAllocator
+
+
+@pytest.fixture
+def allocator(tmp_path):
+    return SequenceAllocator(str(tmp_path / "sequences.json"))
+
+
+def test_ids_are_sequential_per_entity(allocator):
+    """Each entity type has its own counter"""
+    assert [allocator.next_id("order") for _ in range(3)] == [1, 2, 3]
+    assert allocator.next_id("item") == 1
+    assert allocator.next_id("order") == 4
+
+
+def test_counter_is_seeded_once(allocator):
+    """A missing counter starts from the registered seed"""
+    calls = []
+    allocator.register("item", lambda: calls.append(1) or 105)
+    assert allocator.next_id("item") == 106
+    assert allocator.next_id("item") == 107
+    assert len(calls) == 1
+
+
+def test_high_water_mark_is_persisted(allocator):
+    """A new allocator on the same file continues where the last one stopped"""
+    allocator.next_id("order")
+    allocator.next_id("order")
+    with open(allocator.path) as file:
+        assert json.load(file) == {"order": 2}
+    assert SequenceAllocator(allocator.path).next_id("order") == 3
+
+
+def test_blocks_are_shared_without_collisions(allocator):
+    """Workers claiming blocks from one file never get the same ID"""
+    first = SequenceAllocator(allocator.path, block_size=10)
+    second = SequenceAllocator(allocator.path, block_size=10)
+    ids = [first.next_id("order"), second.next_id("order"), first.next_id("order")]
+    assert ids == [1, 11, 2]
+    assert allocator.reserve_block("order", 5) == range(21, 26)
+
+
+def test_concurrent_allocation_is_unique(allocator):
+    """Threads hammering one allocator get distinct IDs"""
+    allocator.reset(block_size=7)
+    results = []
+    
+    def worker():
+        ids = [allocator.next_id("order") for _ in range(200)]
+        results.extend(ids)
+    
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(results)) == 1600
@@ -0,0 +1,521 @@
+import asyncio
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from catalog import CatalogStore, catalog
+from order_store import OrderStore, order_store
+from storage import JsonStorage, SqliteStorage, claim_file, migrate_json_to_sqlite
+
+client = TestClient(app)
+
+
+def make_order(order_id, status="pending", restaurant_id=1):
+    return {"id": order_id, "restaurant_id": restaurant_id, "status": status, "created_at": "2025-07-02T12:00:00"}
+
+
+@pytest.fixture
+def journal(tmp_path):
+    storage = JsonStorage(
+        str(tmp_path / "history-catalog.json"),
+        str(tmp_path / "history.json"),
+        str(tmp_path / "history.journal")
+    )
+    return OrderStore(storage)
+
+
+@pytest.fixture
+def sqlite_storage(tmp_path):
+    storage = SqliteStorage(str(tmp_path / "delivery.db"))
+    yield storage
+    storage.close()
+
+
+def journal_lines(store):
+    with open(store.storage.journal_path) as file:
+        return file.readlines()
+
+
+def reopen(store):
+    storage = store.storage
+    return OrderStore(JsonStorage(storage.catalog_path, storage.orders_path, storage.journal_path))
+
+
+class TestJsonOrderJournal:
+    """Test cases for the append-only order journal"""
+    
+    def test_writes_append_to_the_journal(self, journal):
+        """Creates and updates are single appended records, not snapshot rewrites"""
+        journal.add(make_order(1))
+        journal.update(1, {"status": "confirmed"})
+        
+        assert len(journal_lines(journal)) == 2
+        with pytest.raises(FileNotFoundError):
+            open(journal.storage.orders_path)
+    
+    def test_state_is_rebuilt_on_startup(self, journal):
+        """A fresh store replays the journal over the snapshot"""
+        journal.add(make_order(1))
+        journal.add(make_order(2))
+        journal.update(2, {"status": "delivered"})
+        
+        reopened = reopen(journal)
+        assert [order["id"] for order in reopened.all()] == [1, 2]
+        assert reopened.get(2)["status"] == "delivered"
+    
+    def test_update_unknown_order_returns_none(self, journal):
+        """Updating a missing order does not write a record"""
+        assert journal.update(42, {"status": "confirmed"}) is None
+        assert journal.all() == []
+    
+    def test_compaction_runs_off_the_write_path(self, journal):
+        """A journal outgrowing the snapshot is switched out and folded in by a background thread"""
+        storage = journal.storage
+        storage.compact_min_bytes = 200
+        gate = threading.Event()
+        write_snapshot = storage._write_snapshot
+        storage._write_snapshot = lambda orders, journals: gate.wait() and write_snapshot(orders, journals)
+        journal.add(make_order(1))
+        journal.add(make_order(2))
+        assert storage.compaction is not None and not storage.compaction.done()
+
+        # Writes go on while the snapshot is being written
+        journal.add(make_order(3))
+        journal.update(1, {"status": "cancelled"})
+        assert len(journal_lines(journal)) == 2
+        gate.set()
+        storage.compaction.result()
+
+        with open(storage.orders_path) as file:
+            snapshot = json.load(file)
+        assert [order["id"] for order in snapshot["orders"]] == [1, 2]
+        assert storage._renamed_journals() == []
+        reopened = reopen(journal)
+        assert [order["id"] for order in reopened.all()] == [1, 2, 3]
+        assert reopened.get(1)["status"] == "cancelled"
+
+    def test_failed_snapshot_keeps_the_switched_journal(self, journal):
+        """Records in a journal whose snapshot failed are replayed and compacted on load"""
+        storage = journal.storage
+        storage.compact_min_bytes = 200
+
+        def broken_snapshot(orders, journals):
+            raise OSError("disk full")
+
+        storage._write_snapshot = broken_snapshot
+        journal.add(make_order(1))
+        journal.add(make_order(2))
+        with pytest.raises(OSError):
+            storage.compaction.result()
+        journal.update(2, {"status": "delivered"})
+        assert len(storage._renamed_journals()) == 1
+
+        reopened = reopen(journal)
+        assert [order["id"] for order in reopened.all()] == [1, 2]
+        assert reopened.get(2)["status"] == "delivered"
+        assert reopened.storage._renamed_journals() == []
+
+    def test_appends_are_fsynced(self, journal, monkeypatch):
+        """Every flush is on disk before its writes are acknowledged"""
+        synced = []
+        fsync = os.fsync
+        monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd) or fsync(fd))
+        journal.add(make_order(1))
+        assert len(synced) == 1
+
+    def test_failed_write_is_rolled_back(self, journal):
+        """A change whose flush fails does not stay in memory or reach the snapshot"""
+        journal.add(make_order(1))
+        write_orders = journal.storage.write_orders
+
+        def broken_write_orders(writes):
+            raise OSError("disk full")
+
+        journal.storage.write_orders = broken_write_orders
+        with pytest.raises(OSError):
+            journal.add(make_order(2, restaurant_id=2))
+        with pytest.raises(OSError):
+            journal.update(1, {"status": "confirmed"})
+        assert journal.get(2) is None
+        assert journal.ids() == [1]
+        assert journal.ids(restaurant_id=2) == []
+        assert journal.get(1)["status"] == "pending"
+        assert journal.ids(status="pending") == [1] and journal.ids(status="confirmed") == []
+
+        journal.storage.write_orders = write_orders
+        journal.storage.compact()
+        assert [order["id"] for order in reopen(journal).all()] == [1]
+
+    def test_failed_append_leaves_nothing_in_the_journal(self, journal, monkeypatch):
+        """Part of a failed append, or a whole one that was not synced, is cut off again"""
+        import storage
+        journal.add(make_order(1))
+        real_open = open
+
+        class TornFile:
+            def __init__(self, *args, **kwargs):
+                self.file = real_open(*args, **kwargs)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                self.file.close()
+
+            def write(self, data):
+                self.file.write(data[:len(data) // 2])
+                raise OSError("disk full")
+
+            def __getattr__(self, name):
+                return getattr(self.file, name)
+
+        monkeypatch.setattr(storage, "open", TornFile, raising=False)
+        with pytest.raises(OSError):
+            journal.add(make_order(2))
+        monkeypatch.undo()
+
+        fsync = os.fsync
+        def failing_fsync(fd):
+            monkeypatch.setattr(storage.os, "fsync", fsync)
+            raise OSError("I/O error")
+        monkeypatch.setattr(storage.os, "fsync", failing_fsync)
+        with pytest.raises(OSError):
+            journal.add(make_order(3))
+        monkeypatch.undo()
+
+        journal.add(make_order(4))
+        assert [order["id"] for order in reopen(journal).all()] == [1, 4]
+
+    def test_torn_tail_is_dropped(self, journal):
+        """A partially written last record is ignored and cleaned up on load"""
+        journal.add(make_order(1))
+        with open(journal.storage.journal_path, "a") as file:
+            file.write('{"op":"create","order":{"id":2')
+        
+        reopened = reopen(journal)
+        assert [order["id"] for order in reopened.all()] == [1]
+        reopened.add(make_order(3))
+        assert [order["id"] for order in reopen(reopened).all()] == [1, 3]
+
+
+    def test_concurrent_writes_share_a_flush(self, journal):
+        """Writes queued while a flush runs go out together"""
+        batches = []
+        write_orders = journal.storage.write_orders
+        
+        def slow_write_orders(writes):
+            time.sleep(0.02)
+            batches.append(len(writes))
+            write_orders(writes)
+        
+        journal.storage.write_orders = slow_write_orders
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            list(pool.map(lambda n: journal.add(make_order(n)), range(1, 41)))
+        
+        assert sum(batches) == 40
+        assert len(batches) < 10
+        assert len(journal_lines(journal)) == 40
+        assert [order["id"] for order in reopen(journal).all()] == [order["id"] for order in journal.all()]
+
+
+class TestOrderIndexes:
+    """Test cases for the status and restaurant secondary indexes"""
+    
+    def test_filters_use_the_indexes(self, journal):
+        """Filtered IDs come back ascending without scanning the history"""
+        journal.add(make_order(1, "pending", 1))
+        journal.add(make_order(2, "confirmed", 2))
+        journal.add(make_order(3, "pending", 2))
+        
+        assert journal.ids(status="pending") == [1, 3]
+        assert journal.ids(restaurant_id=2) == [2, 3]
+        assert journal.ids(status="pending", restaurant_id=2) == [3]
+        assert journal.ids(status="delivered") == []
+    
+    def test_status_update_moves_the_order(self, journal):
+        """An order leaves its old status bucket when its status changes"""
+        journal.add(make_order(1))
+        journal.add(make_order(2))
+        journal.update(1, {"status": "confirmed"})
+        
+        assert journal.ids(status="pending") == [2]
+        assert journal.ids(status="confirmed") == [1]
+        assert journal.ids(restaurant_id=1) == [1, 2]
+    
+    def test_indexes_are_rebuilt_on_startup(self, journal):
+        """Replaying the journal rebuilds the indexes"""
+        journal.add(make_order(1))
+        journal.update(1, {"status": "delivered"})
+        
+        reopened = reopen(journal)
+        assert reopened.ids(status="delivered") == [1]
+        assert reopened.ids(status="pending") == []
+
+
+class TestSqliteStorage:
+    """Test cases for the SQLite backend"""
+    
+    def test_uses_wal_mode(self, sqlite_storage):
+        """The database is opened in write-ahead-log mode"""
+        mode = sqlite_storage._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == "wal"
+    
+    def test_migration_round_trips_json_data(self, isolated_storage, sqlite_storage):
+        """Migrated data reads back identical to the JSON files"""
+        migrate_json_to_sqlite(isolated_storage, sqlite_storage)
+        
+        assert sqlite_storage.load_catalog() == isolated_storage.load_catalog()
+        assert list(sqlite_storage.load_orders().values()) == list(isolated_storage.load_orders().values())
+    
+    def test_partial_catalog_save_touches_named_rows(self, isolated_storage, sqlite_storage):
+        """Saving one item only rewrites that row, and never its stock"""
+        migrate_json_to_sqlite(isolated_storage, sqlite_storage)
+        store = CatalogStore(sqlite_storage)
+        item = store.get_item(1, 101)
+        stored_quantity = item["available_quantity"]
+        item["price"] = 199
+        item["available_quantity"] = 7
+        store.save(items=[(1, item)])
+        
+        reloaded = CatalogStore(SqliteStorage(sqlite_storage.path))
+        assert reloaded.get_item(1, 101)["price"] == 199
+        assert reloaded.get_item(1, 101)["available_quantity"] == stored_quantity
+        assert reloaded.get_item(1, 102) == store.get_item(1, 102)
+    
+    def test_external_commit_triggers_reload(self, isolated_storage, sqlite_storage):
+        """A change committed by another connection is picked up"""
+        migrate_json_to_sqlite(isolated_storage, sqlite_storage)
+        store = CatalogStore(sqlite_storage)
+        assert store.get_restaurant(1)["name"] == "Spice Villa"
+        
+        other = SqliteStorage(sqlite_storage.path)
+        other._conn.execute("UPDATE restaurants SET name = 'Renamed' WHERE id = 1")
+        other.close()
+        
+        assert store.get_restaurant(1)["name"] == "Renamed"
+    
+    def test_http_contract_is_unchanged(self, isolated_storage, sqlite_storage):
+        """The API behaves the same on top of SQLite"""
+        migrate_json_to_sqlite(isolated_storage, sqlite_storage)
+        catalog.reload(sqlite_storage)
+        order_store.reset(sqlite_storage)
+        
+        restaurants = client.get("/restaurants").json()["rest_list"]
+        assert restaurants[0] == {"id": 1, "name": "Spice Villa", "location": "Banjara Hills"}
+        
+        response = client.post("/orders", json={
+            "restaurant_id": 1,
+            "items": [{"item_id": 101, "quantity": 2}],
+            "customer_name": "John Doe",
+            "customer_phone": "+1234567890",
+            "delivery_address": "123 Main St"
+        })
+        assert response.status_code == 200
+        order_id = response.json()["id"]
+        
+        response = client.put(f"/orders/{order_id}/status", json={"status": "preparing"})
+        assert response.json()["status"] == "preparing"
+        
+        reopened = SqliteStorage(sqlite_storage.path)
+        row = reopened._conn.execute("SELECT status FROM orders WHERE id = ?", (order_id,)).fetchone()
+        assert row == ("preparing",)
+        assert client.get("/orders/status/preparing").json()["orders"][0]["id"] == order_id
+        assert CatalogStore(reopened).get_item(1, 101)["available_quantity"] == 88
+        reopened.close()
+
+
+order_data = {
+    "restaurant_id": 1,
+    "items": [{"item_id": 101, "quantity": 2}],
+    "customer_name": "John Doe",
+    "customer_phone": "+1234567890",
+    "delivery_address": "123 Main St"
+}
+
+
+class TestSeveralWorkers:
+    """Test cases for several server processes sharing one database"""
+    
+    @pytest.fixture
+    def worker(self, isolated_storage, sqlite_storage):
+        """The app's stores on one connection, as one worker"""
+        migrate_json_to_sqlite(isolated_storage, sqlite_storage)
+        catalog.reload(sqlite_storage)
+        order_store.reset(sqlite_storage)
+        return sqlite_storage
+    
+    @pytest.fixture
+    def other(self, worker):
+        """A second worker's connection to the same database"""
+        storage = SqliteStorage(worker.path)
+        yield storage
+        storage.close()
+    
+    def test_orders_from_another_worker_are_visible(self, worker, other):
+        created = client.post("/orders", json=order_data).json()
+        
+        other_orders = OrderStore(other)
+        assert other_orders.get(created["id"])["customer_name"] == "John Doe"
+        
+        other_orders.update(created["id"], {"status": "preparing"})
+        assert client.get(f"/orders/{created['id']}").json()["status"] == "preparing"
+        assert client.get("/orders/status/preparing").json()["orders"][0]["id"] == created["id"]
+    
+    def test_write_racing_a_pull_does_not_reload(self, worker, other, monkeypatch):
+        """A commit between the stamp check and reading the log is pulled without a reload"""
+        other_orders = OrderStore(other)
+        order_store.ids()
+        loads = []
+        monkeypatch.setattr(worker, "load_orders", lambda: loads.append(1))
+        read_stamp = worker.orders_stamp
+        racing = [1002, 1001]
+        
+        def stamp_then_commit():
+            stamp = read_stamp()
+            if racing:
+                other_orders.add(make_order(racing.pop()))
+            return stamp
+        
+        monkeypatch.setattr(worker, "orders_stamp", stamp_then_commit)
+        other_orders.add(make_order(900))
+        for _ in range(4):
+            order_store.ids()
+        assert loads == []
+        assert {900, 1001, 1002} <= set(order_store.ids())
+    
+    def test_checkpoint_does_not_reload(self, worker, other, monkeypatch):
+        """A WAL checkpoint moves data_version without changing any data"""
+        order_store.ids()
+        catalog.restaurant_ids()
+        loads = []
+        monkeypatch.setattr(worker, "load_orders", lambda: loads.append("orders"))
+        monkeypatch.setattr(worker, "load_catalog", lambda: loads.append("catalog"))
+        stamp = worker.orders_stamp()
+        
+        other._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        assert worker.orders_stamp() != stamp
+        order_store.ids()
+        catalog.restaurant_ids()
+        assert loads == []
+    
+    def test_catalog_edits_from_another_worker_are_visible(self, worker, other):
+        other_catalog = CatalogStore(other)
+        item = other_catalog.get_item(1, 101)
+        item["price"] = 321
+        other_catalog.save(items=[(1, item)])
+        
+        items = client.get("/items/1").json()["item_list"]
+        assert [item["price"] for item in items if item["id"] == 101] == [321]
+    
+    def test_menu_edits_do_not_overwrite_other_workers_sales(self, worker, other):
+        """Price and name edits leave stock alone; explicit stock edits go through the stock transaction"""
+        assert catalog.get_item(1, 101)["available_quantity"] == 90
+        with other.stock_transaction(1) as stock:
+            stock.write([(1, {"id": 101, "available_quantity": 83})])
+        
+        assert client.put("/restaurants/1/items/101", json={"price": 250}).status_code == 200
+        rows = {"restaurants": [{"id": 1, "items": [{"id": 101, "name": "Paneer Makhani"}]}]}
+        assert client.post("/catalog/import", json=rows).status_code == 200
+        stored = SqliteStorage(worker.path)
+        assert stored.load_item(1, 101)["available_quantity"] == 83
+        assert stored.load_item(1, 101)["name"] == "Paneer Makhani"
+        
+        assert client.put("/restaurants/1/items/101", json={"available_quantity": 40}).status_code == 200
+        assert stored.load_item(1, 101)["available_quantity"] == 40
+        rows = {"restaurants": [{"id": 1, "items": [{"id": 101, "available_quantity": 30}]}]}
+        assert client.post("/catalog/import", json=rows).status_code == 200
+        assert stored.load_item(1, 101)["available_quantity"] == 30
+        stored.close()
+    
+    def test_failed_import_save_writes_no_stock(self, worker, monkeypatch):
+        """An import's stock levels are committed with its rows or not at all"""
+        def broken_transaction(statements, changes=()):
+            raise sqlite3.OperationalError("database is locked")
+        
+        monkeypatch.setattr(worker, "_transaction", broken_transaction)
+        failing = TestClient(app, raise_server_exceptions=False)
+        rows = {"restaurants": [{"id": 1, "items": [{"id": 101, "price": 275, "available_quantity": 30}]}]}
+        assert failing.post("/catalog/import", json=rows).status_code == 500
+        stored = SqliteStorage(worker.path)
+        assert stored.load_item(1, 101)["available_quantity"] == 90
+        assert stored.load_item(1, 101)["price"] != 275
+        stored.close()
+    
+    def test_waiting_for_a_restaurant_lock_leaves_the_event_loop_free(self, worker):
+        """A held restaurant lock makes item edits wait in a thread, not on the event loop"""
+        from main import ItemUpdateModel, update_item
+        
+        async def scenario():
+            lock = catalog.restaurant_lock(1)
+            lock.acquire()
+            threading.Timer(0.2, lock.release).start()
+            edit = asyncio.create_task(update_item(1, 101, ItemUpdateModel(price=260)))
+            ticks = 0
+            while not edit.done():
+                ticks += 1
+                await asyncio.sleep(0.01)
+            return ticks, edit.result()
+        
+        ticks, updated = asyncio.run(scenario())
+        # The loop kept running while the edit waited for the lock
+        assert ticks > 5 and updated.price == 260
+        assert SqliteStorage(worker.path).load_item(1, 101)["price"] == 260
+    
+    def test_stock_is_checked_against_other_workers(self, worker, other):
+        """A reservation sees stock taken by another worker, even with a stale cache"""
+        with other.stock_transaction(1) as stock:
+            stock.write([(1, {"id": 101, "available_quantity": 1})])
+        
+        response = client.post("/orders", json=order_data)
+        assert response.status_code == 404
+        assert "available_quantity: 1" in response.json()["detail"]
+    
+    def test_concurrent_reservations_do_not_oversell(self, worker, other):
+        with other.stock_transaction(1) as stock:
+            stock.write([(1, {"id": 101, "available_quantity": 10})])
+        
+        
+        def other_worker_order():
+            with other.stock_transaction(1) as stock:
+                if stock.quantities[101] < 2:
+                    return 404
+                stock.write([(1, {"id": 101, "available_quantity": stock.quantities[101] - 2})])
+            return 200
+        
+        def place(attempt):
+            if attempt % 2:
+                return other_worker_order()
+            return client.post("/orders", json=order_data).status_code
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            codes = list(pool.map(place, range(8)))
+        
+        assert codes.count(200) == 5
+        assert CatalogStore(SqliteStorage(worker.path)).get_item(1, 101)["available_quantity"] == 0
+    
+    def test_writes_do_not_block_reservations(self, worker):
+        """Order writes waiting on the database never hold up a stock check"""
+        order_id = client.post("/orders", json=order_data).json()["id"]
+        
+        def place(attempt):
+            if attempt % 2:
+                return client.put(f"/orders/{order_id}/status", json={"status": "preparing"}).status_code
+            return client.post("/orders", json={**order_data, "items": [{"item_id": 102, "quantity": 1}]}).status_code
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            codes = list(pool.map(place, range(150)))
+        assert codes == [200] * 150
+    
+    def test_json_storage_refuses_a_second_process(self, tmp_path):
+        """JSON files are locked to the first process that writes them"""
+        path = str(tmp_path / "shared.json")
+        with open(path + ".lock", "a") as held:
+            fcntl.flock(held.fileno(), fcntl.LOCK_EX)
+            with pytest.raises(RuntimeError, match="DELIVERY_STORAGE=sqlite"):
+                claim_file(path)
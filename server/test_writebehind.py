@@ -0,0 +1,105 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import inventory
+from catalog import catalog
+from inventory import reserve_stock, stock_writer
+from writebehind import WriteBehind
+
+
+class Recorder:
+    """Batch writer that records what it was given"""
+
+    def __init__(self, delay=0.0, failures=0):
+        self.batches = []
+        self.delay = delay
+        self.failures = failures
+
+    def __call__(self, rows):
+        time.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        self.batches.append(rows)
+
+
+def test_changes_within_interval_share_one_write():
+    """Submissions inside one interval go out as a single batch"""
+    recorder = Recorder()
+    writer = WriteBehind(recorder, interval=0.05, threshold=1000)
+    futures = [writer.submit([(key, key)]) for key in range(50)]
+    for future in futures:
+        future.result(timeout=2)
+    assert len(recorder.batches) == 1
+    assert sorted(recorder.batches[0]) == list(range(50))
+
+
+def test_repeated_key_is_written_once_with_latest_row():
+    recorder = Recorder()
+    writer = WriteBehind(recorder, interval=0.05, threshold=1000)
+    writer.submit([("item", 1)])
+    writer.submit([("item", 2)]).result(timeout=2)
+    assert recorder.batches == [[2]]
+
+
+def test_threshold_flushes_before_interval():
+    """Enough dirty rows trigger a flush without waiting out the interval"""
+    recorder = Recorder()
+    writer = WriteBehind(recorder, interval=60, threshold=10)
+    start = time.monotonic()
+    writer.submit([(key, key) for key in range(10)]).result(timeout=2)
+    assert time.monotonic() - start < 1
+
+
+def test_flush_drains_pending_rows():
+    recorder = Recorder()
+    writer = WriteBehind(recorder, interval=60, threshold=1000)
+    writer.submit([("a", 1)])
+    writer.flush()
+    assert recorder.batches == [[1]]
+    assert writer.pending_rows() == 0
+
+
+def test_failed_batch_is_retried():
+    """Rows from a failed write are kept and go out in the next batch"""
+    recorder = Recorder(failures=1)
+    writer = WriteBehind(recorder, interval=0, threshold=1000)
+    with pytest.raises(OSError):
+        writer.submit([("a", 1)]).result(timeout=2)
+    deadline = time.monotonic() + 2
+    while not recorder.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert recorder.batches == [[1]]
+
+
+def test_write_rate_stays_flat_under_order_burst(isolated_storage):
+    """Hundreds of concurrent reservations cost a handful of catalog saves"""
+    catalog.get_item(1, 101)["available_quantity"] = 10 ** 6
+    saves = []
+    original = isolated_storage.save_catalog
+    def counting_save(*args, **kwargs):
+        saves.append(1)
+        return original(*args, **kwargs)
+    isolated_storage.save_catalog = counting_save
+
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        list(pool.map(lambda _: reserve_stock(1, [(101, 1)]), range(500)))
+
+    assert catalog.get_item(1, 101)["available_quantity"] == 10 ** 6 - 500
+    assert len(saves) < 100
+    assert stock_writer.pending_rows() == 0
+
+
+def test_async_durability_does_not_wait(monkeypatch):
+    """In async mode a reservation returns before its batch is written"""
+    release = threading.Event()
+    blocked = WriteBehind(lambda rows: release.wait(2), interval=0, threshold=1)
+    monkeypatch.setattr(inventory, "stock_writer", blocked)
+    monkeypatch.setattr(inventory, "STOCK_DURABILITY", "async")
+
+    start = time.monotonic()
+    reserve_stock(1, [(101, 1)])
+    assert time.monotonic() - start < 1
+    release.set()
+    blocked.flush()
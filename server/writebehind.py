@@ -0,0 +1,103 @@
+"""Write-behind batching of keyed row updates.
+
+Changes are applied in memory by the caller and handed to a WriteBehind
+as (key, row) pairs. A single flusher thread collects them and writes one
+batch once the oldest unwritten change is `interval` seconds old or
+`threshold` distinct rows are dirty, whichever comes first. A row changed
+several times before a flush is written once, so the number of writes per
+second is bounded by the interval no matter how many changes arrive.
+
+submit() returns a future for the batch that will contain the changes.
+Callers that need durability wait on it (group commit); callers that do
+not can drop it and let the batch go out in the background.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehind:
+    """Coalesce keyed row updates into periodic batch writes"""
+
+    def __init__(self, write, interval: float, threshold: int, name: str = "write-behind"):
+        self.write = write
+        self.interval = interval
+        self.threshold = threshold
+        self.flushes = 0
+        self._condition = threading.Condition()
+        self._dirty = {}
+        self._pending = None
+        self._oldest = None
+        self._urgent = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, rows) -> Future:
+        """Mark (key, row) pairs dirty; the future resolves once they are written"""
+        with self._condition:
+            if not self._dirty:
+                self._oldest = time.monotonic()
+            for key, row in rows:
+                self._dirty[key] = row
+            if self._pending is None:
+                self._pending = Future()
+            self._condition.notify()
+            return self._pending
+
+    def flush(self):
+        """Write everything dirty now and wait for it"""
+        with self._condition:
+            if self._pending is None:
+                return
+            pending = self._pending
+            self._urgent = True
+            self._condition.notify()
+        pending.result()
+
+    def pending_rows(self) -> int:
+        with self._condition:
+            return len(self._dirty)
+
+    def _take_batch(self):
+        with self._condition:
+            while not self._dirty:
+                self._condition.wait()
+            # Wait out the interval unless enough rows are dirty to flush early
+            while not self._urgent and len(self._dirty) < self.threshold:
+                remaining = self._oldest + self.interval - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            rows, self._dirty = self._dirty, {}
+            future, self._pending = self._pending, None
+            self._urgent = False
+            return rows, future
+
+    def _run(self):
+        while True:
+            rows, future = self._take_batch()
+            try:
+                self.write(list(rows.values()))
+            except BaseException as error:
+                logger.exception("write-behind flush of %d rows failed, will retry", len(rows))
+                self._requeue(rows)
+                future.set_exception(error)
+                # Do not spin on a failing backend
+                time.sleep(max(self.interval, 0.1))
+                continue
+            self.flushes += 1
+            future.set_result(None)
+
+    def _requeue(self, rows):
+        """Put rows from a failed batch back unless they were changed since"""
+        with self._condition:
+            if not self._dirty:
+                self._oldest = time.monotonic()
+            for key, row in rows.items():
+                self._dirty.setdefault(key, row)
+            if self._pending is None:
+                self._pending = Future()
+            self._condition.notify()